@@ -0,0 +1,79 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from binance_client import PairNotFoundError, PriceClientError, get_default_client
+from pair_index import record_window_miss
+
+DEFAULT_CONCURRENCY = 8
+
+
+def fetch_windows_concurrently(windows, fetch_fn, limiter, concurrency=DEFAULT_CONCURRENCY,
+                               progress_callback=None, log_callback=None, stop_flag=None, counter_callback=None):
+    """
+    Récupère les fenêtres de bougies avec `concurrency` requêtes en vol, sous un TokenBucket commun.
+    fetch_fn(window) est bloquante (requests) et retourne True si l'appel a abouti.
+    Seuls les échecs sont journalisés ; counter_callback(nom, n) cumule les appels et les échecs.
+    Retourne {'calls': nombre d'appels HTTP, 'failed': fenêtres en échec}.
+    """
+    if not windows:
+        return {'calls': 0, 'failed': []}
+    return asyncio.run(_fetch_all(windows, fetch_fn, limiter, concurrency, progress_callback, log_callback, stop_flag, counter_callback))
+
+
+def fetch_kline_window(window, store, client=None, negative_cache=None):
+    """
+    Un seul appel pour toute une fenêtre planifiée, bougies enregistrées dans le store ; False si l'appel a échoué.
+    Les plages sans bougie sont ajoutées au negative_cache de l'exécution s'il est fourni.
+    """
+    client = client if client is not None else get_default_client()
+    pair_missing = False
+    try:
+        data = client.klines(window.symbol, window.start_ms, window.limit, window.interval)
+    except PairNotFoundError:
+        data = []
+        pair_missing = True
+    except PriceClientError:
+        return False
+    candles = [(int(c[0]), float(c[4]), float(c[2]), float(c[3])) for c in data]
+    record_window_miss(negative_cache, window, candles, pair_missing)
+    store.put_many(window.symbol, candles, interval=window.interval)
+    returned = {c[0] for c in candles}
+    # Une page pleine peut être tronquée : on ne conclut à l'absence de prix qu'avant sa dernière bougie
+    truncated = len(candles) >= window.limit
+    last = candles[-1][0] if candles else None
+    missing = [(m, None) for m in window.minutes
+               if m not in returned and (not truncated or m <= last)]
+    store.put_many(window.symbol, missing, interval=window.interval)
+    return True
+
+
+async def _fetch_all(windows, fetch_fn, limiter, concurrency, progress_callback, log_callback, stop_flag, counter_callback):
+    loop = asyncio.get_running_loop()
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    total = len(windows)
+    state = {'done': 0, 'calls': 0, 'failed': []}
+
+    async def run_one(window):
+        async with semaphore:
+            if stop_flag and stop_flag['stop']:
+                return
+            # Le limiteur n'est débité que pour un véritable appel HTTP
+            await limiter.acquire_async()
+            if stop_flag and stop_flag['stop']:
+                return
+            ok = await loop.run_in_executor(pool, fetch_fn, window)
+        state['calls'] += 1
+        state['done'] += 1
+        if counter_callback:
+            counter_callback("Appels API")
+        if not ok:
+            state['failed'].append(window)
+            if counter_callback:
+                counter_callback("Échecs")
+            if log_callback:
+                log_callback(f"Fenêtre {state['done']}/{total} : {window.symbol} {len(window.minutes)} minutes ({window.limit} bougies) ERREUR")
+        if progress_callback:
+            progress_callback(state['done'], total)
+
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool:
+        await asyncio.gather(*(run_one(w) for w in windows))
+    return {'calls': state['calls'], 'failed': state['failed']}
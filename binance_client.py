@@ -0,0 +1,166 @@
+import random
+import threading
+import time
+import requests
+from requests.adapters import HTTPAdapter
+
+BINANCE_API_BASE = "https://api.binance.com"
+BINANCE_API_URL = BINANCE_API_BASE + "/api/v3/klines"
+
+# Code d'erreur Binance renvoyé pour un symbole inconnu
+INVALID_SYMBOL_CODE = -1121
+# Poids d'un appel klines et limite de poids par minute et par IP
+KLINES_WEIGHT = 2
+WEIGHT_LIMIT_1M = 6000
+
+
+class PriceClientError(Exception):
+    """Erreur de l'API de prix non récupérable (requête invalide)"""
+
+
+class PairNotFoundError(PriceClientError):
+    """La paire n'existe pas chez Binance : inutile de réessayer"""
+
+
+class TransientPriceError(PriceClientError):
+    """Échec temporaire (timeout, 5xx, limite de débit) persistant après tous les essais"""
+
+
+class BinancePriceClient:
+    """
+    Client HTTP des prix Binance : connexions keep-alive réutilisées (pool), essais multiples
+    avec attente exponentielle aléatoire sur les timeouts et erreurs serveur.
+    Si rate_limiter est fourni, chaque réponse lui est transmise (en-têtes de poids, 429/418) ; un limiteur
+    passé à un appel remplace celui du client pour cet appel seulement (voir RateLimitedClient).
+    """
+    def __init__(self, base_url=BINANCE_API_BASE, max_retries=3, backoff_factor=0.5, timeout=10, pool_size=10, session=None, rate_limiter=None):
+        self.base_url = base_url.rstrip('/')
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.timeout = timeout
+        self.session = session or requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.rate_limiter = rate_limiter
+        self.request_count = 0
+        self._count_lock = threading.Lock()
+
+    def klines(self, symbol, start_ms, limit=1000, interval='1m', end_ms=None, rate_limiter=None):
+        """
+        Bougies [open_time, open, high, low, close, ...] à partir de start_ms.
+        Sans start_ms et avec end_ms : les `limit` dernières bougies avant end_ms.
+        """
+        params = {
+            "symbol": symbol,
+            "interval": interval,
+            "limit": int(limit)
+        }
+        if start_ms is not None:
+            params["startTime"] = int(start_ms)
+        if end_ms is not None:
+            params["endTime"] = int(end_ms)
+        data = self._get('/api/v3/klines', params, rate_limiter)
+        if not isinstance(data, list):
+            raise TransientPriceError(f"Réponse inattendue pour {symbol} : {data}")
+        return data
+
+    def exchange_info(self, rate_limiter=None):
+        """Liste des paires Binance et de leur statut (TRADING, BREAK...)"""
+        data = self._get('/api/v3/exchangeInfo', {}, rate_limiter)
+        if not isinstance(data, dict) or 'symbols' not in data:
+            raise TransientPriceError(f"Réponse exchangeInfo inattendue : {data}")
+        return data
+
+    def _get(self, path, params, rate_limiter=None):
+        rate_limiter = rate_limiter if rate_limiter is not None else self.rate_limiter
+        url = self.base_url + path
+        last_error = None
+        rate_limited = False
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                if not rate_limited:
+                    self._sleep_backoff(attempt)
+                if rate_limiter is not None:
+                    # Les nouveaux essais consomment aussi du débit (et respectent un éventuel Retry-After)
+                    rate_limiter.acquire()
+            with self._count_lock:
+                self.request_count += 1
+            try:
+                r = self.session.get(url, params=params, timeout=self.timeout)
+            except (requests.Timeout, requests.ConnectionError) as e:
+                last_error = e
+                rate_limited = False
+                continue
+            if rate_limiter is not None:
+                rate_limiter.observe(r.status_code, r.headers)
+            rate_limited = r.status_code in (418, 429)
+            if rate_limited and rate_limiter is None:
+                # Sans limiteur on respecte directement le Retry-After demandé par Binance
+                time.sleep(_retry_after(r.headers))
+            if r.status_code >= 500 or rate_limited:
+                last_error = TransientPriceError(f"HTTP {r.status_code} pour {params.get('symbol')}")
+                continue
+            try:
+                data = r.json()
+            except ValueError as e:
+                last_error = e
+                continue
+            if r.status_code >= 400:
+                if isinstance(data, dict) and data.get('code') == INVALID_SYMBOL_CODE:
+                    raise PairNotFoundError(f"Paire inconnue : {params.get('symbol')}")
+                raise PriceClientError(f"HTTP {r.status_code} : {data}")
+            return data
+        raise TransientPriceError(f"Échec après {self.max_retries + 1} essais : {last_error}")
+
+    def _sleep_backoff(self, attempt):
+        # "Full jitter" : attente aléatoire dans [0, backoff * 2^(essai-1)]
+        time.sleep(random.uniform(0, self.backoff_factor * (2 ** (attempt - 1))))
+
+    def close(self):
+        self.session.close()
+
+
+class RateLimitedClient:
+    """
+    Client d'une exécution : mêmes connexions et même compteur que `client`, avec son propre limiteur passé
+    à chaque appel. Le client partagé n'est jamais modifié : des exécutions simultanées gardent chacune
+    leur débit, et une exception ne laisse aucun limiteur en place.
+    """
+    def __init__(self, client, rate_limiter):
+        self.client = client
+        self.rate_limiter = rate_limiter
+
+    @property
+    def request_count(self):
+        return self.client.request_count
+
+    def klines(self, symbol, start_ms, limit=1000, interval='1m', end_ms=None):
+        return self.client.klines(symbol, start_ms, limit, interval, end_ms=end_ms, rate_limiter=self.rate_limiter)
+
+    def exchange_info(self):
+        return self.client.exchange_info(rate_limiter=self.rate_limiter)
+
+    def close(self):
+        # Les connexions appartiennent au client partagé
+        pass
+
+
+def _retry_after(headers, default=1.0):
+    try:
+        return max(0.0, float(headers.get('Retry-After')))
+    except (TypeError, ValueError):
+        return default
+
+
+_default_client = None
+_default_client_lock = threading.Lock()
+
+
+def get_default_client():
+    """Client partagé par l'application (un seul pool de connexions)"""
+    global _default_client
+    with _default_client_lock:
+        if _default_client is None:
+            _default_client = BinancePriceClient()
+        return _default_client
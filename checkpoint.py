@@ -0,0 +1,120 @@
+import json
+import os
+import time
+import pandas as pd
+from price_planner import leg_pairs
+from normalize import as_datetime, output_frame
+
+# Enregistrement atomique du fichier enrichi : lignes traitées depuis la dernière sauvegarde / secondes écoulées
+DEFAULT_CHECKPOINT_ROWS = 2000
+DEFAULT_CHECKPOINT_SECONDS = 60
+
+
+def write_csv_atomic(df, path):
+    """Écrit le CSV dans un fichier temporaire puis le renomme : jamais de fichier à moitié écrit"""
+    tmp_path = path + '.tmp'
+    output_frame(df).to_csv(tmp_path, index=False)
+    os.replace(tmp_path, path)
+
+
+class EnrichmentCheckpoint:
+    """
+    Sauvegardes périodiques d'un enrichissement en cours : le fichier enrichi est réécrit atomiquement
+    toutes les `every_rows` lignes ou `every_seconds` secondes, et chaque prix trouvé entre deux sauvegardes
+    est ajouté à un journal (ligne, jambe, prix). Une relance reprend à la première ligne non résolue.
+    """
+    def __init__(self, output_path, every_rows=DEFAULT_CHECKPOINT_ROWS, every_seconds=DEFAULT_CHECKPOINT_SECONDS):
+        self.output_path = output_path
+        self.journal_path = os.path.splitext(output_path)[0] + '.journal'
+        self.every_rows = every_rows
+        self.every_seconds = every_seconds
+        self._rows_since = 0
+        self._last_save = time.monotonic()
+
+    def restore(self, df, timestamps_ms):
+        """
+        Recharge les prix d'une exécution précédente (fichier partiel + journal) s'ils portent sur les mêmes lignes.
+        Retourne l'indice de la première ligne non résolue (0 si rien à reprendre).
+        """
+        if not os.path.exists(self.output_path):
+            return 0
+        try:
+            partial = pd.read_csv(self.output_path)
+        except (OSError, ValueError):
+            return 0
+        if not self._same_rows(df, partial):
+            return 0
+        for col in ('Sent Price EUR', 'Received Price EUR'):
+            if col in partial.columns:
+                df[col] = pd.to_numeric(partial[col], errors='coerce')
+        for row, leg, price in self._read_journal():
+            if 0 <= row < len(df):
+                df.iat[row, df.columns.get_loc(f'{leg} Price EUR')] = price
+        unresolved = pd.Series(False, index=df.index)
+        for leg in ('Sent', 'Received'):
+            if f'{leg} Amount' not in df.columns:
+                continue
+            amounts = pd.to_numeric(df[f'{leg} Amount'], errors='coerce')
+            df[f'{leg} Value EUR'] = amounts * df[f'{leg} Price EUR']
+            unresolved |= leg_pairs(df, leg).notna() & timestamps_ms.notna() & df[f'{leg} Price EUR'].isna()
+        positions = unresolved.to_numpy().nonzero()[0]
+        return int(positions[0]) if len(positions) else len(df)
+
+    def _same_rows(self, df, partial):
+        # Le fichier partiel doit provenir du même export : même nombre de lignes, mêmes dates et identifiants
+        if len(partial) != len(df):
+            return False
+        if 'Date' in df.columns:
+            if 'Date' not in partial.columns:
+                return False
+            dates = as_datetime(partial['Date'])
+            if not dates.reset_index(drop=True).equals(as_datetime(df['Date']).reset_index(drop=True)):
+                return False
+        if 'Transaction ID' in df.columns:
+            if 'Transaction ID' not in partial.columns:
+                return False
+            if not (partial['Transaction ID'].astype(str).to_numpy() == df['Transaction ID'].astype(str).to_numpy()).all():
+                return False
+        return True
+
+    def _read_journal(self):
+        if not os.path.exists(self.journal_path):
+            return []
+        entries = []
+        with open(self.journal_path, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                    entries.append((int(entry['row']), entry['leg'], float(entry['price'])))
+                except (ValueError, KeyError, TypeError):
+                    # Dernière ligne tronquée par un arrêt brutal
+                    continue
+        return entries
+
+    def record(self, df, start, end):
+        """Journalise les prix trouvés pour les lignes [start, end) puis sauvegarde si nécessaire"""
+        with open(self.journal_path, 'a', encoding='utf-8') as f:
+            for leg in ('Sent', 'Received'):
+                col = f'{leg} Price EUR'
+                prices = df[col].iloc[start:end]
+                for row, price in zip(range(start, end), prices.tolist()):
+                    if pd.notna(price):
+                        f.write(json.dumps({'row': row, 'leg': leg, 'price': price}) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+        self._rows_since += end - start
+        if self._rows_since >= self.every_rows or time.monotonic() - self._last_save >= self.every_seconds:
+            self.save(df)
+
+    def save(self, df):
+        """Sauvegarde atomique du fichier enrichi ; le journal repart vide"""
+        write_csv_atomic(df, self.output_path)
+        open(self.journal_path, 'w').close()
+        self._rows_since = 0
+        self._last_save = time.monotonic()
+
+    def finish(self, df):
+        """Dernière sauvegarde d'une exécution complète : le journal n'est plus utile"""
+        write_csv_atomic(df, self.output_path)
+        if os.path.exists(self.journal_path):
+            os.remove(self.journal_path)
@@ -0,0 +1,326 @@
+"""
+Mode batch en ligne de commande (sans interface graphique, ni tkinter ni matplotlib).
+
+    python cli.py plan "exports/*.csv" --rate 500
+    python cli.py enrich "exports/*.csv" --jobs 4
+    python cli.py realized-gains "gains/*.csv" --monthly
+    python cli.py validate "bots/*.csv" --stream --max-memory 512M
+    python cli.py export eur "exports/*_enriched.csv" -o eur.csv
+"""
+import argparse
+import glob
+import multiprocessing
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from async_fetcher import DEFAULT_CONCURRENCY
+from load_cache import default_load_cache, format_size
+from schema import concat_frames
+from streaming import (DEFAULT_MAX_MEMORY, parse_size, aggregate_files, eur_totals_aggregator, rewards_aggregator,
+                       income_aggregator, realized_gains_aggregator, DuplicateIdAggregator)
+from price_planner import DEFAULT_RESOLUTION, format_estimate, parse_resolution_policy
+from price_routing import DEFAULT_RATE_PER_MINUTE
+from reports import (read_export_csv, eur_totals_report, rewards_report, income_report, realized_gains_report,
+                     uniqueness_report, eur_transactions, sorted_reward_transactions, income_export,
+                     realized_gains_export)
+
+# Sélections exportables : nom -> fonction (données concaténées -> lignes exportées)
+EXPORTS = {
+    'eur': eur_transactions,
+    'rewards': sorted_reward_transactions,
+    'income': income_export,
+    'realized-gains': realized_gains_export,
+    'all': lambda all_data: all_data,
+}
+
+
+def expand_inputs(patterns):
+    """Fichiers correspondant aux motifs (glob, ** accepté), sans doublon, dans l'ordre des motifs"""
+    paths = []
+    for pattern in patterns:
+        matches = sorted(glob.glob(pattern, recursive=True)) or ([pattern] if os.path.isfile(pattern) else [])
+        if not matches:
+            raise FileNotFoundError(f"Aucun fichier ne correspond à {pattern}")
+        for path in matches:
+            if path not in paths:
+                paths.append(path)
+    return paths
+
+
+class _FileProgress:
+    """Progression d'un fichier affichée par paliers de 10 %"""
+    def __init__(self, name):
+        self.name = name
+        self.last = -1
+
+    def __call__(self, current, total):
+        step = int(current * 10 / total) if total else 10
+        if step != self.last:
+            self.last = step
+            print(f"[{self.name}] {step * 10}%", flush=True)
+
+
+def _make_source(options):
+    # Objets non sérialisables (connexions) : créés dans chaque processus
+    from price_store import PriceStore
+    from binance_client import BinancePriceClient
+    store = PriceStore(options['store']) if options.get('store') else None
+    client = BinancePriceClient(base_url=options['api_url']) if options.get('api_url') else None
+    return store, client
+
+
+def _correct_file(path, options):
+    from enrichment import correct_csv_prices, corrected_path
+    name = os.path.basename(path)
+    store, client = _make_source(options)
+    try:
+        df = correct_csv_prices(
+            path,
+            lambda message: print(f"[{name}] {message}", flush=True),
+            store=store,
+            client=client,
+            offline=options['offline'],
+            concurrency=options['concurrency']
+        )
+    finally:
+        if client is not None:
+            client.close()
+        if store is not None:
+            store.close()
+    return corrected_path(path), len(df)
+
+
+def _run_per_file(worker, paths, options, jobs):
+    """Traite chaque fichier dans un processus ; retourne le nombre d'échecs"""
+    failures = 0
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        futures = {pool.submit(worker, path, options): path for path in paths}
+        for future in as_completed(futures):
+            try:
+                output, rows = future.result()
+                print(f"{futures[future]} -> {output} ({rows} lignes)", flush=True)
+            except Exception as e:
+                failures += 1
+                print(f"ERREUR {futures[future]} : {e}", file=sys.stderr, flush=True)
+    return failures
+
+
+def load_all(paths, jobs):
+    """Lecture des fichiers en parallèle puis concaténation"""
+    if len(paths) == 1 or jobs == 1:
+        frames = [read_export_csv(path) for path in paths]
+    else:
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            frames = list(pool.map(read_export_csv, paths))
+    return concat_frames(frames)
+
+
+def _write_text(text, output):
+    if output:
+        with open(output, 'w', encoding='utf-8') as f:
+            f.write(text)
+    else:
+        print(text)
+
+
+def cmd_enrich(args):
+    from enrichment import enrich_many
+    paths = expand_inputs(args.inputs)
+    store, client = _make_source({'store': args.store, 'api_url': args.api_url})
+    progress = {}
+
+    def progress_callback(name, current, total):
+        if name is not None:
+            progress.setdefault(name, _FileProgress(name))(current, total)
+
+    try:
+        # Un seul budget de requêtes : chaque prix est demandé une fois pour tous les fichiers
+        outputs = enrich_many(paths, args.rate, progress_callback, lambda message: print(message, flush=True),
+                              store=store, client=client, concurrency=args.concurrency, jobs=args.jobs,
+                              offline=args.offline, resume=not args.no_resume,
+                              resolution=args.resolution)
+    finally:
+        if client is not None:
+            client.close()
+        if store is not None:
+            store.close()
+    failures = 0
+    for path, output in outputs.items():
+        if output is None:
+            failures += 1
+            print(f"ERREUR {path} : non enrichi", file=sys.stderr)
+        else:
+            print(f"{path} -> {output}")
+    return 1 if failures else 0
+
+
+def cmd_plan(args):
+    from enrichment import plan_enrichment
+    from price_store import PriceStore
+    store = PriceStore(args.store) if args.store else None
+    try:
+        estimate = plan_enrichment(expand_inputs(args.inputs), args.rate, store=store, resolution=args.resolution)
+    finally:
+        if store is not None:
+            store.close()
+    print(format_estimate(estimate))
+    return 0
+
+
+def cmd_correct(args):
+    paths = expand_inputs(args.inputs)
+    options = {'concurrency': args.concurrency, 'offline': args.offline, 'store': args.store, 'api_url': args.api_url}
+    return 1 if _run_per_file(_correct_file, paths, options, min(args.jobs, len(paths))) else 0
+
+
+def _stream(args, aggregators):
+    """Agrégats calculés bloc par bloc (--stream), sans charger les fichiers entiers"""
+    return aggregate_files(expand_inputs(args.inputs), aggregators, args.max_memory)
+
+
+def cmd_realized_gains(args):
+    if args.stream:
+        text = _stream(args, [realized_gains_aggregator(monthly=args.monthly)])[0]
+    else:
+        text = realized_gains_report(load_all(expand_inputs(args.inputs), args.jobs), monthly=args.monthly)
+    _write_text(text, args.output)
+    return 0
+
+
+def cmd_income(args):
+    if args.stream:
+        text = _stream(args, [income_aggregator()])[0]
+    else:
+        text = income_report(load_all(expand_inputs(args.inputs), args.jobs))
+    _write_text(text, args.output)
+    return 0
+
+
+def cmd_eur_totals(args):
+    if args.stream:
+        aggregators = [eur_totals_aggregator()] + ([rewards_aggregator()] if args.rewards else [])
+        text = ''.join(_stream(args, aggregators))
+    else:
+        all_data = load_all(expand_inputs(args.inputs), args.jobs)
+        text = eur_totals_report(all_data)
+        if args.rewards:
+            text += rewards_report(all_data)
+    _write_text(text, args.output)
+    return 0
+
+
+def cmd_validate(args):
+    if args.stream:
+        text, duplicates = _stream(args, [DuplicateIdAggregator()])[0]
+    else:
+        text, duplicates = uniqueness_report(load_all(expand_inputs(args.inputs), args.jobs))
+    _write_text(text, args.output)
+    # Code de sortie non nul en cas de doublon ou sans colonne d'ID
+    return 0 if duplicates == 0 else 1
+
+
+def cmd_clear_cache(args):
+    cache = default_load_cache()
+    count, freed = cache.clear()
+    print(f"{count} fichier(s) supprimé(s) de {cache.directory} ({format_size(freed)} libérés)")
+    return 0
+
+
+def cmd_export(args):
+    selected = EXPORTS[args.kind](load_all(expand_inputs(args.inputs), args.jobs))
+    if selected.empty:
+        print("Aucune ligne à exporter.", file=sys.stderr)
+        return 1
+    selected.to_csv(args.output, index=False)
+    print(f"{len(selected)} lignes exportées vers {args.output}")
+    return 0
+
+
+def _resolution(text):
+    try:
+        return parse_resolution_policy(text)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+
+def _memory_size(text):
+    try:
+        return parse_size(text)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='cli.py', description="Traitements Crypto Viewer sans interface graphique")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    def add_inputs(sub):
+        sub.add_argument('inputs', nargs='+', help="Fichiers CSV ou motifs glob (ex : 'exports/*.csv')")
+        sub.add_argument('--jobs', '-j', type=int, default=os.cpu_count() or 1, help="Nombre de processus")
+
+    def add_price_source(sub):
+        sub.add_argument('--concurrency', type=int, default=DEFAULT_CONCURRENCY, help="Requêtes simultanées")
+        sub.add_argument('--offline', action='store_true', help="Cache local uniquement, aucun appel réseau")
+        sub.add_argument('--store', help="Fichier du cache de prix (défaut : ~/.crypto_viewer/prices.sqlite)")
+        sub.add_argument('--api-url', help="URL de base de l'API Binance")
+
+    sub = subparsers.add_parser('enrich', help="Ajoute les prix EUR (fichiers _enriched.csv)")
+    add_inputs(sub)
+    add_price_source(sub)
+    sub.add_argument('--rate', type=int, default=DEFAULT_RATE_PER_MINUTE, help="Requêtes par minute au départ, pour tous les fichiers")
+    sub.add_argument('--no-resume', action='store_true', help="Ignore un enrichissement interrompu et recommence")
+    sub.add_argument('--resolution', type=_resolution, default=DEFAULT_RESOLUTION,
+                     help="Bougies de prix : 1m, 1h, 1d, ou par Type/Label (ex : 'Reward=1d,default=1m')")
+    sub.set_defaults(func=cmd_enrich)
+
+    sub = subparsers.add_parser('plan', help="Estime les appels API et la durée d'un enrichissement, sans appel réseau")
+    sub.add_argument('inputs', nargs='+', help="Fichiers CSV ou motifs glob (ex : 'exports/*.csv')")
+    sub.add_argument('--store', help="Fichier du cache de prix (défaut : ~/.crypto_viewer/prices.sqlite)")
+    sub.add_argument('--rate', type=int, default=DEFAULT_RATE_PER_MINUTE, help="Requêtes par minute")
+    sub.add_argument('--resolution', type=_resolution, default=DEFAULT_RESOLUTION,
+                     help="Bougies de prix : 1m, 1h, 1d, ou par Type/Label (ex : 'Reward=1d,default=1m')")
+    sub.set_defaults(func=cmd_plan)
+
+    sub = subparsers.add_parser('correct', help="Corrige les prix EUR manquants (fichiers _corrected.csv)")
+    add_inputs(sub)
+    add_price_source(sub)
+    sub.set_defaults(func=cmd_correct)
+
+    for name, func, help_text in [('realized-gains', cmd_realized_gains, "Gains réalisés par devise et par année"),
+                                  ('income', cmd_income, "Revenus par devise et par année"),
+                                  ('eur-totals', cmd_eur_totals, "Totaux EUR (achats, dépôts, ventes)"),
+                                  ('validate', cmd_validate, "Unicité des transactions (code 1 si doublons)")]:
+        sub = subparsers.add_parser(name, help=help_text)
+        add_inputs(sub)
+        sub.add_argument('--output', '-o', help="Fichier texte du rapport (défaut : sortie standard)")
+        sub.add_argument('--stream', action='store_true',
+                         help="Lecture par blocs agrégés au fil de l'eau, pour les fichiers trop gros pour la mémoire")
+        sub.add_argument('--max-memory', type=_memory_size, default=DEFAULT_MAX_MEMORY,
+                         help="Mémoire visée par bloc avec --stream (ex : 256M, 2G ; défaut : 256M)")
+        sub.set_defaults(func=func)
+    subparsers.choices['realized-gains'].add_argument('--monthly', action='store_true', help="Ajoute les totaux par mois")
+    subparsers.choices['eur-totals'].add_argument('--rewards', action='store_true', help="Ajoute les récompenses par devise")
+
+    sub = subparsers.add_parser('export', help="Exporte une sélection de lignes en CSV")
+    sub.add_argument('kind', choices=sorted(EXPORTS), help="Lignes exportées")
+    add_inputs(sub)
+    sub.add_argument('--output', '-o', required=True, help="Fichier CSV de sortie")
+    sub.set_defaults(func=cmd_export)
+
+    sub = subparsers.add_parser('clear-cache', help="Vide le cache des fichiers CSV déjà analysés")
+    sub.set_defaults(func=cmd_clear_cache)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    try:
+        return args.func(args)
+    except FileNotFoundError as e:
+        print(f"ERREUR : {e}", file=sys.stderr)
+        return 2
+
+
+if __name__ == "__main__":
+    multiprocessing.freeze_support()
+    sys.exit(main())
@@ -0,0 +1,505 @@
+import pandas as pd
+import numpy as np
+import os
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from price_store import INTERVAL_MS, get_default_store, floor_minute
+from normalize import normalize_dates, output_columns, output_frame, sort_chronologically
+from price_planner import (DEFAULT_RESOLUTION, RESOLUTIONS, compute_timestamps_ms, collect_price_needs, plan_kline_windows,
+                           leg_pairs, row_intervals, estimate_requests)
+from price_join import DEVIATION_COLUMNS, PRICE_COLUMNS, apply_eur_prices, unresolved_report
+from incremental import copy_base_prices
+from checkpoint import DEFAULT_CHECKPOINT_ROWS, DEFAULT_CHECKPOINT_SECONDS, EnrichmentCheckpoint
+from rate_limiter import AdaptiveRateLimiter
+from async_fetcher import DEFAULT_CONCURRENCY, fetch_windows_concurrently, fetch_kline_window
+from price_routing import DEFAULT_RATE_PER_MINUTE, PriceRouter, fill_missing_prices
+from pair_index import NegativeCache, PairIndex, filter_needs
+from binance_client import PairNotFoundError, PriceClientError, RateLimitedClient, get_default_client
+
+# Colonnes lues pour planifier les appels (plan à blanc, préchargement de plusieurs fichiers)
+PLAN_COLUMNS = ['Date', 'Type', 'Label', 'Sent Currency', 'Sent Amount', 'Received Currency', 'Received Amount']
+
+# Nouvelle fonction pour obtenir le prix EUR d'une crypto à une date donnée
+def get_binance_price(symbol, timestamp_ms, store=None, client=None, offline=False):
+    # Lecture du cache persistant avant tout appel réseau (aucun appel en mode hors ligne)
+    store = store if store is not None else get_default_store()
+    minute_ms = floor_minute(timestamp_ms)
+    found, price = store.lookup(symbol, minute_ms)
+    if found or offline:
+        return price
+    try:
+        return fetch_binance_price(symbol, minute_ms, store, client)
+    except PriceClientError:
+        return None
+
+def fetch_binance_price(symbol, minute_ms, store, client=None):
+    # Appel réseau pour une minute absente du cache, résultat enregistré dans le cache.
+    # Lève TransientPriceError si l'API est indisponible (rien n'est mis en cache dans ce cas).
+    client = client if client is not None else get_default_client()
+    try:
+        data = client.klines(symbol, minute_ms, limit=1)
+    except PairNotFoundError:
+        data = []
+    if data:
+        candle = data[0]
+        price = float(candle[4])  # close price
+        store.put(symbol, minute_ms, price, float(candle[2]), float(candle[3]))
+        return price
+    # Pas de cotation à cette minute ou paire invalide : on mémorise l'absence de prix
+    store.put(symbol, minute_ms, None)
+    return None
+
+_default_routers = {}
+_default_routers_lock = threading.Lock()
+
+def get_default_router(offline=False):
+    """Routeur partagé (store et client par défaut) : routes, index des paires et limiteur réutilisés d'un appel à l'autre"""
+    with _default_routers_lock:
+        if offline not in _default_routers:
+            store = get_default_store()
+            limiter = AdaptiveRateLimiter(DEFAULT_RATE_PER_MINUTE)
+            client = RateLimitedClient(get_default_client(), limiter)
+            _default_routers[offline] = PriceRouter(store, client, limiter, offline=offline,
+                                                    pair_index=PairIndex.for_store(store, client, offline, limiter))
+        return _default_routers[offline]
+
+# Prix EUR d'une devise à une date : paire directe, sinon routes via USDT, BUSD, FDUSD, BTC ou BNB
+def get_price_eur_with_intermediate(symbol, timestamp_ms, log_callback=None, store=None, client=None, offline=False, router=None):
+    # symbol: ex 'FET' ; router : routeur réutilisé entre les appels (par défaut celui du store et du client partagés)
+    if router is None:
+        if store is None and client is None:
+            router = get_default_router(offline)
+        else:
+            store = store if store is not None else get_default_store()
+            router = PriceRouter(store, client, offline=offline, log_callback=log_callback)
+    price = router.eur_prices(pd.Series([symbol]), pd.Series([timestamp_ms], dtype='Int64')).iloc[0]
+    if pd.isna(price):
+        if log_callback:
+            log_callback(f"Impossible de trouver le prix EUR pour {symbol} à {timestamp_ms}")
+        return None
+    return float(price)
+
+def enrich_csv_with_eur_prices(filepath, requests_per_minute, progress_callback, log_callback, table_viewer=None, stop_flag=None, fast_mode=False, store=None, concurrency=DEFAULT_CONCURRENCY, client=None, rate_limiter=None, offline=False, base_path=None, pair_index=None, provider=None, counter_callback=None, resume=True, checkpoint_rows=DEFAULT_CHECKPOINT_ROWS, checkpoint_seconds=DEFAULT_CHECKPOINT_SECONDS, resolution=DEFAULT_RESOLUTION):
+    base, ext = os.path.splitext(filepath)
+    output_path = f"{base}_enriched{ext}"
+    # Seuls les appels HTTP consomment le débit autorisé ; requests_per_minute n'est que le débit de départ,
+    # ajusté ensuite d'après les en-têtes de poids renvoyés par Binance
+    limiter = rate_limiter if rate_limiter is not None else AdaptiveRateLimiter(requests_per_minute)
+
+    # Dates converties une fois (format fixe, fuseau et heures d'été) ; horodatages ms réutilisés ensuite
+    # Tri chronologique (colonne Date ou datetime) : les lots de fenêtres sont joints dans l'ordre des lignes
+    df = sort_chronologically(normalize_dates(pd.read_csv(filepath), keep_source=True))
+    total_rows = len(df)
+    # Ajouter les colonnes vides si elles n'existent pas
+    for col in PRICE_COLUMNS:
+        if col not in df.columns:
+            df[col] = None
+        df[col] = pd.to_numeric(df[col], errors='coerce')
+    timestamps = compute_timestamps_ms(df)
+    # Résolution des prix de chaque ligne (politique par Type/Label) : les lignes en bougies heure/jour
+    # sont résolues en bloc avant les lignes minute, avec l'écart maximal du prix dans la bougie
+    intervals = row_intervals(df, resolution)
+    coarse = (intervals != DEFAULT_RESOLUTION).to_numpy()
+    if coarse.any():
+        for col in DEVIATION_COLUMNS:
+            df[col] = np.nan
+
+    # Reprise d'une exécution interrompue : fichier partiel + journal des prix trouvés depuis
+    checkpoint = EnrichmentCheckpoint(output_path, checkpoint_rows, checkpoint_seconds)
+    start_row = checkpoint.restore(df, timestamps) if resume else 0
+    if start_row:
+        log_callback(f"Reprise d'un enrichissement interrompu à la ligne {start_row + 1}/{total_rows}")
+    # Enrichissement incrémental : prix repris d'un fichier enrichi précédent, seules les lignes
+    # nouvelles ou sans prix sont interrogées
+    missing_only = bool(base_path) or start_row > 0 or bool(coarse.any())
+    if base_path:
+        copied = copy_base_prices(df, pd.read_csv(base_path))
+        log_callback(f"{copied} lignes reprises de {os.path.basename(base_path)}, {total_rows - copied} nouvelles ou sans prix")
+    checkpoint.save(df)
+
+    # Cache persistant des prix (clé = (symbol, minute)), partagé entre les exécutions
+    store = store if store is not None else get_default_store()
+    store.reset_stats()
+    # Source des bougies (voir price_providers) ; par défaut le client HTTP partagé, dont les connexions
+    # keep-alive sont réutilisées par toutes les requêtes, vu avec le limiteur de cette exécution
+    client = provider if provider is not None else (client if client is not None else get_default_client())
+    client = RateLimitedClient(client, limiter)
+
+    # Planification : toutes les minutes nécessaires sont regroupées en fenêtres de bougies.
+    # Les paires inexistantes ou non cotées à ces dates sont écartées avant tout appel HTTP.
+    pair_index = pair_index if pair_index is not None else PairIndex.for_store(store, client, offline, limiter)
+    negative_cache = NegativeCache()
+    minute_rows = ~coarse[start_row:]
+    needs = collect_price_needs(df.iloc[start_row:][minute_rows], timestamps.iloc[start_row:][minute_rows], missing_only=missing_only)
+    if offline:
+        windows = []
+        log_callback(f"Mode hors ligne : {sum(len(m) for m in needs.values())} prix distincts résolus depuis le cache local")
+    else:
+        needs, skipped = filter_needs(needs, pair_index, negative_cache)
+        windows = sorted(plan_kline_windows(needs, store), key=lambda w: w.start_ms)
+        if skipped:
+            log_callback(f"{skipped} prix ignorés : paire inexistante ou non cotée à cette date")
+        if counter_callback:
+            counter_callback("Prix déjà en cache", sum(len(m) for m in needs.values()) - sum(len(w.minutes) for w in windows))
+        log_callback(f"{sum(len(m) for m in needs.values())} prix distincts nécessaires, {len(windows)} appels API planifiés")
+
+    def fetch(batch):
+        return fetch_windows_concurrently(
+            batch,
+            lambda window: fetch_kline_window(window, store, client, negative_cache),
+            limiter,
+            concurrency=concurrency,
+            log_callback=log_callback,
+            stop_flag=stop_flag,
+            counter_callback=counter_callback
+        )
+
+    if coarse.any():
+        for interval, (rows, calls) in _price_coarse_rows(df, timestamps, intervals, store, None if offline else fetch,
+                                                          pair_index, negative_cache).items():
+            log_callback(f"Résolution {interval} : {rows} lignes, {calls} appels API planifiés")
+
+    # Les fenêtres sont récupérées par lots chronologiques ; dès qu'un lot est terminé, les lignes
+    # antérieures à la prochaine fenêtre ont tous leurs prix : elles sont jointes et journalisées
+    batch_size = max(32, concurrency * 4)
+    # Lignes sans date valide en dernier (tri), jamais résolues
+    ordered_ts = timestamps.fillna(np.iinfo('int64').max).to_numpy(dtype='int64')
+    failed = []
+    unknown = 0
+    row = start_row
+    stopped = False
+    if table_viewer is not None and not fast_mode:
+        # Même ordre de lignes que le traitement (tri par date) : les mises à jour visent la bonne position
+        table_viewer.request_reload(df[output_columns(df)])
+    for first in range(0, len(windows) + 1, batch_size):
+        batch = windows[first:first + batch_size]
+        failed += fetch(batch)['failed']
+        stopped = bool(stop_flag and stop_flag['stop'])
+        if stopped:
+            break
+        pending = windows[first + batch_size:]
+        end = total_rows if not pending else max(row, int(np.searchsorted(ordered_ts, pending[0].start_ms, 'left')))
+        if end > row:
+            chunk = df.iloc[row:end].copy()
+            unknown += apply_eur_prices(chunk, timestamps.iloc[row:end], store, missing_only=missing_only)
+            df.loc[chunk.index, PRICE_COLUMNS] = chunk[PRICE_COLUMNS]
+            checkpoint.record(df, row, end)
+            if table_viewer is not None and not fast_mode:
+                table_viewer.update_rows(row, df.iloc[row:end])
+            row = end
+            progress_callback(row, total_rows)
+
+    if failed and not stopped:
+        # Nouvel essai unique pour les fenêtres en échec (échecs temporaires, jamais mis en cache)
+        log_callback(f"{len(failed)} fenêtres en échec, nouvel essai...")
+        fetch(plan_kline_windows(needs, store))
+        chunk = df.iloc[start_row:].copy()
+        unknown = apply_eur_prices(chunk, timestamps.iloc[start_row:], store, missing_only=missing_only)
+        df.loc[chunk.index, PRICE_COLUMNS] = chunk[PRICE_COLUMNS]
+
+    # Étape 1 : paire EUR directe
+    for leg in ('Sent', 'Received'):
+        needed = leg_pairs(df, leg).notna() & timestamps.notna()
+        resolved = needed & df[f'{leg} Price EUR'].notna()
+        log_callback(f"Étape 1 (paire EUR directe) - {leg} : {int(resolved.sum())}/{int(needed.sum())} prix EUR trouvés")
+    if not stopped:
+        # Étape 2 : routes intermédiaires (USDT, BTC, BNB...) pour les devises sans paire EUR à ces dates
+        def make_router(interval):
+            return PriceRouter(store, client, limiter, concurrency, offline, log_callback, pair_index=pair_index,
+                               negative_cache=negative_cache, counter_callback=counter_callback, interval=interval)
+        for leg, (fixed, missing) in _fill_missing_by_interval(df, timestamps, intervals, make_router).items():
+            log_callback(f"Étape 2 (routes intermédiaires) - {leg} : {fixed}/{missing} prix EUR trouvés")
+    # Étape 3 : rapport des prix introuvables
+    report = unresolved_report(df, timestamps)
+    if report.empty:
+        log_callback("Étape 3 : tous les prix EUR ont été trouvés")
+    else:
+        log_callback(f"Étape 3 : {int(report['Count'].sum())} prix EUR introuvables"
+                     + (" (échec temporaire ou mode hors ligne : relancer pour réessayer)" if unknown else ""))
+        for _, line in report.iterrows():
+            log_callback(f"  {line['Currency']} : {line['Count']} prix manquants du {line['First']:%Y-%m-%d %H:%M} au {line['Last']:%Y-%m-%d %H:%M}")
+
+    # Sauvegarde finale
+    if stopped:
+        checkpoint.save(df)
+    else:
+        checkpoint.finish(df)
+    if table_viewer is not None:
+        table_viewer.request_reload(df[output_columns(df)])
+    if stopped:
+        log_callback(f"Traitement interrompu. Le fichier enrichi est à jour jusqu'à la ligne {row}, relancer pour reprendre.")
+    else:
+        log_callback(f"Fichier enrichi sauvegardé : {output_path}")
+    stats = store.stats()
+    log_callback(f"Cache des prix : {stats['hits']} hits, {stats['misses']} misses, {stats['size']} entrées")
+    log_callback(f"Débit final : {limiter.effective_rate:.0f} requêtes/minute")
+    return df
+
+
+def plan_enrichment(filepaths, requests_per_minute=DEFAULT_RATE_PER_MINUTE, store=None, resolution=DEFAULT_RESOLUTION):
+    """
+    Plan à blanc, sans aucun appel réseau, de l'enrichissement d'un ou plusieurs fichiers (prix communs
+    comptés une fois) : RequestEstimate, à afficher avec price_planner.format_estimate.
+    """
+    filepaths = [filepaths] if isinstance(filepaths, str) else list(filepaths)
+    frames = [normalize_dates(pd.read_csv(path, usecols=lambda col: col in PLAN_COLUMNS)) for path in filepaths]
+    combined = pd.concat(frames, ignore_index=True)
+    store = store if store is not None else get_default_store()
+    # Index des paires lu depuis l'instantané local uniquement
+    pair_index = PairIndex.for_store(store, offline=True)
+    return estimate_requests(combined, compute_timestamps_ms(combined), store, resolution, requests_per_minute, pair_index)
+
+
+def _interval_masks(intervals):
+    """[(résolution, masque des lignes)] des résolutions présentes, minute en premier"""
+    return [(interval, (intervals == interval).to_numpy()) for interval in RESOLUTIONS if (intervals == interval).any()]
+
+
+def _price_coarse_rows(df, timestamps, intervals, store, fetch, pair_index=None, negative_cache=None):
+    """
+    Prix des lignes en bougies heure/jour (en place) : jusqu'à 1000 heures ou jours par appel, puis jointure
+    avec l'écart maximal (DEVIATION_COLUMNS). fetch(fenêtres) récupère les fenêtres, None hors ligne.
+    Retourne {résolution: (lignes, appels planifiés)}.
+    """
+    summary = {}
+    for interval, mask in _interval_masks(intervals):
+        if interval == DEFAULT_RESOLUTION:
+            continue
+        rows, ts = df[mask].copy(), timestamps[mask]
+        windows = []
+        if fetch is not None:
+            needs, _ = filter_needs(collect_price_needs(rows, ts, missing_only=True, interval=interval),
+                                    pair_index, negative_cache, interval)
+            windows = plan_kline_windows(needs, store, interval=interval)
+            fetch(windows)
+        apply_eur_prices(rows, ts, store, interval=interval, tolerance_ms=INTERVAL_MS[interval] - 1,
+                         missing_only=True, deviation=True)
+        df.loc[rows.index, PRICE_COLUMNS + DEVIATION_COLUMNS] = rows[PRICE_COLUMNS + DEVIATION_COLUMNS]
+        summary[interval] = (int(mask.sum()), len(windows))
+    return summary
+
+
+def _fill_missing_by_interval(df, timestamps, intervals, make_router):
+    # Routes intermédiaires à la résolution de chaque ligne ; make_router(résolution) -> PriceRouter
+    counts = {}
+    for interval, mask in _interval_masks(intervals):
+        if mask.all():
+            result = fill_missing_prices(df, timestamps, make_router(interval))
+        else:
+            rows = df[mask].copy()
+            result = fill_missing_prices(rows, timestamps[mask], make_router(interval))
+            df.loc[rows.index, PRICE_COLUMNS] = rows[PRICE_COLUMNS]
+        for leg, (fixed, missing) in result.items():
+            previous = counts.get(leg, (0, 0))
+            counts[leg] = (previous[0] + fixed, previous[1] + missing)
+    return counts
+
+def corrected_path(filepath):
+    """Fichier écrit par correct_csv_prices : tx.csv -> tx_corrected.csv"""
+    base, ext = os.path.splitext(filepath)
+    return f"{base}_corrected{ext}"
+
+# Fonction de correction CSV
+def correct_csv_prices(filepath, log_callback, table_viewer=None, store=None, client=None, offline=False, rate_limiter=None, concurrency=DEFAULT_CONCURRENCY, provider=None, counter_callback=None):
+    output_path = corrected_path(filepath)
+    # Dates converties une fois (format fixe, fuseau et heures d'été) ; horodatages ms réutilisés ensuite
+    # Tri chronologique (colonne Date ou datetime)
+    df = sort_chronologically(normalize_dates(pd.read_csv(filepath), keep_source=True))
+    for col in PRICE_COLUMNS:
+        if col not in df.columns:
+            df[col] = None
+        df[col] = pd.to_numeric(df[col], errors='coerce')
+    timestamps = compute_timestamps_ms(df)
+
+    store = store if store is not None else get_default_store()
+    client = provider if provider is not None else (client if client is not None else get_default_client())
+    rate_limiter = rate_limiter if rate_limiter is not None else AdaptiveRateLimiter(DEFAULT_RATE_PER_MINUTE)
+    client = RateLimitedClient(client, rate_limiter)
+    # Routes calculées une fois par devise, étapes communes (EURUSDT...) partagées par toutes les lignes
+    router = PriceRouter(store, client, rate_limiter, concurrency, offline, log_callback,
+                         pair_index=PairIndex.for_store(store, client, offline, rate_limiter), counter_callback=counter_callback)
+    # Montants EUR manquants (vides ou nuls) des jambes hors EUR
+    for leg, (fixed, missing) in fill_missing_prices(df, timestamps, router, include_zero=True).items():
+        log_callback(f"{leg} : {fixed}/{missing} prix EUR corrigés")
+    # Sauvegarde finale
+    output_frame(df).to_csv(output_path, index=False)
+    if table_viewer is not None:
+        table_viewer.request_reload(df[output_columns(df)])
+    log_callback(f"Fichier corrigé sauvegardé : {output_path}")
+    return df
+
+
+def _enrich_from_store(filepath, store_path, messages, resume=True, resolution=DEFAULT_RESOLUTION):
+    # Processus de travail : enrichissement hors ligne depuis le cache rempli par le processus principal
+    from price_store import PriceStore
+    name = os.path.basename(filepath)
+    store = PriceStore(store_path)
+    try:
+        enrich_csv_with_eur_prices(
+            filepath, DEFAULT_RATE_PER_MINUTE,
+            lambda current, total: messages.put(('progress', name, current, total)),
+            lambda message: messages.put(('log', name, message)),
+            store=store,
+            offline=True,
+            resume=resume,
+            resolution=resolution
+        )
+    finally:
+        store.close()
+    base, ext = os.path.splitext(filepath)
+    return f"{base}_enriched{ext}"
+
+
+def prefetch_prices_for_files(filepaths, store, client, limiter, concurrency=DEFAULT_CONCURRENCY, pair_index=None,
+                              progress_callback=None, log_callback=None, stop_flag=None, counter_callback=None,
+                              resolution=DEFAULT_RESOLUTION):
+    """
+    Remplit le cache avec tous les prix nécessaires à plusieurs fichiers : les minutes de tous les fichiers
+    sont réunies avant la planification, chaque (paire, minute) n'est donc demandée qu'une fois, sous un
+    seul limiteur ; les routes intermédiaires des prix toujours manquants sont ensuite récupérées de même.
+    Les lignes en résolution heure/jour (voir row_intervals) sont récupérées en bougies de cette résolution.
+    Retourne False si le traitement a été interrompu.
+    """
+    frames = []
+    for path in filepaths:
+        frames.append(normalize_dates(pd.read_csv(path, usecols=lambda col: col in PLAN_COLUMNS)))
+    combined = pd.concat(frames, ignore_index=True)
+    for col in PRICE_COLUMNS:
+        combined[col] = np.nan
+    timestamps = compute_timestamps_ms(combined)
+    intervals = row_intervals(combined, resolution)
+
+    def minute_needs(df):
+        # Besoins en bougies minute ; les lignes heure/jour sont planifiées à part
+        keep = (row_intervals(df, resolution) == DEFAULT_RESOLUTION).to_numpy()
+        return collect_price_needs(df[keep], compute_timestamps_ms(df)[keep])
+
+    per_file = sum(sum(len(m) for m in minute_needs(df).values()) for df in frames)
+    needs = minute_needs(combined)
+    negative_cache = NegativeCache()
+    needs, skipped = filter_needs(needs, pair_index, negative_cache)
+    windows = sorted(plan_kline_windows(needs, store), key=lambda w: w.start_ms)
+    if log_callback:
+        log_callback(f"{len(filepaths)} fichiers : {sum(len(m) for m in needs.values())} prix distincts "
+                     f"({per_file} fichier par fichier), {len(windows)} appels API planifiés")
+        if skipped:
+            log_callback(f"{skipped} prix ignorés : paire inexistante ou non cotée à cette date")
+    result = fetch_windows_concurrently(
+        windows,
+        lambda window: fetch_kline_window(window, store, client, negative_cache),
+        limiter,
+        concurrency=concurrency,
+        progress_callback=progress_callback,
+        log_callback=log_callback,
+        stop_flag=stop_flag,
+        counter_callback=counter_callback
+    )
+    if stop_flag and stop_flag['stop']:
+        return False
+    if result['failed']:
+        fetch_windows_concurrently(
+            plan_kline_windows(needs, store),
+            lambda window: fetch_kline_window(window, store, client, negative_cache),
+            limiter, concurrency=concurrency, log_callback=log_callback, counter_callback=counter_callback
+        )
+    if (intervals != DEFAULT_RESOLUTION).any():
+        for col in DEVIATION_COLUMNS:
+            combined[col] = np.nan
+
+        def coarse_fetch(batch):
+            return fetch_windows_concurrently(
+                batch, lambda window: fetch_kline_window(window, store, client, negative_cache), limiter,
+                concurrency=concurrency, log_callback=log_callback, stop_flag=stop_flag, counter_callback=counter_callback)
+        for interval, (rows, calls) in _price_coarse_rows(combined, timestamps, intervals, store, coarse_fetch,
+                                                          pair_index, negative_cache).items():
+            if log_callback:
+                log_callback(f"Résolution {interval} : {rows} lignes, {calls} appels API planifiés")
+    apply_eur_prices(combined, timestamps, store, missing_only=True)
+    # Routes intermédiaires : les étapes communes (EURUSDT...) ne sont récupérées qu'une fois pour tous les fichiers
+    def make_router(interval):
+        return PriceRouter(store, client, limiter, concurrency, False, None, pair_index=pair_index,
+                           negative_cache=negative_cache, counter_callback=counter_callback, interval=interval)
+    for leg, (fixed, missing) in _fill_missing_by_interval(combined, timestamps, intervals, make_router).items():
+        if log_callback:
+            log_callback(f"Routes intermédiaires - {leg} : {fixed}/{missing} prix EUR trouvés")
+    return True
+
+
+def enrich_many(filepaths, requests_per_minute, progress_callback, log_callback, store=None, client=None,
+                rate_limiter=None, concurrency=DEFAULT_CONCURRENCY, jobs=None, offline=False, provider=None,
+                pair_index=None, counter_callback=None, stop_flag=None, resume=True, resolution=DEFAULT_RESOLUTION):
+    """
+    Enrichit plusieurs fichiers avec un seul budget de requêtes : les prix de tous les fichiers sont
+    d'abord récupérés une seule fois dans le cache (prefetch_prices_for_files), puis chaque fichier est
+    enrichi hors ligne depuis le cache, en parallèle dans `jobs` processus.
+    progress_callback(nom du fichier, courant, total) ; nom None pour la progression globale.
+    Retourne {fichier: fichier enrichi, ou None en cas d'échec}.
+    """
+    store = store if store is not None else get_default_store()
+    limiter = rate_limiter if rate_limiter is not None else AdaptiveRateLimiter(requests_per_minute)
+    if not offline:
+        client = provider if provider is not None else (client if client is not None else get_default_client())
+        client = RateLimitedClient(client, limiter)
+        pair_index = pair_index if pair_index is not None else PairIndex.for_store(store, client, rate_limiter=limiter)
+        completed = prefetch_prices_for_files(
+            filepaths, store, client, limiter, concurrency, pair_index,
+            progress_callback=lambda current, total: progress_callback(None, current, total),
+            log_callback=log_callback, stop_flag=stop_flag, counter_callback=counter_callback,
+            resolution=resolution
+        )
+        if not completed:
+            log_callback("Traitement interrompu avant l'écriture des fichiers enrichis.")
+            return {path: None for path in filepaths}
+
+    # Écriture des fichiers : aucun appel réseau, un processus par fichier (le cache SQLite est partagé)
+    outputs = {}
+    total = len(filepaths)
+    progress_callback(None, 0, total)
+    if getattr(store, 'path', ':memory:') == ':memory:' or jobs == 1 or total == 1:
+        # Cache en mémoire : non partageable entre processus, les fichiers sont traités ici
+        for path in filepaths:
+            name = os.path.basename(path)
+            enrich_csv_with_eur_prices(path, requests_per_minute,
+                                       lambda current, count, name=name: progress_callback(name, current, count),
+                                       lambda message, name=name: log_callback(f"[{name}] {message}"),
+                                       store=store, offline=True, pair_index=pair_index, resume=resume,
+                                       resolution=resolution)
+            outputs[path] = f"{os.path.splitext(path)[0]}_enriched{os.path.splitext(path)[1]}"
+            progress_callback(None, len(outputs), total)
+        return outputs
+
+    # Processus lancés en spawn : jamais de fork d'un processus qui fait tourner Tk et des threads de chargement
+    context = multiprocessing.get_context('spawn')
+    manager = context.Manager()
+    messages = manager.Queue()
+
+    def forward():
+        # Messages des processus de travail relayés aux callbacks depuis un thread du processus principal
+        while True:
+            item = messages.get()
+            if item is None:
+                return
+            if item[0] == 'progress':
+                progress_callback(item[1], item[2], item[3])
+            else:
+                log_callback(f"[{item[1]}] {item[2]}")
+
+    forwarder = threading.Thread(target=forward, daemon=True)
+    forwarder.start()
+    try:
+        with ProcessPoolExecutor(max_workers=jobs, mp_context=context) as pool:
+            futures = {pool.submit(_enrich_from_store, path, store.path, messages, resume, resolution): path for path in filepaths}
+            for future in as_completed(futures):
+                path = futures[future]
+                try:
+                    outputs[path] = future.result()
+                except Exception as e:
+                    outputs[path] = None
+                    messages.put(('log', os.path.basename(path), f"ERREUR : {e}"))
+                progress_callback(None, len(outputs), total)
+    finally:
+        messages.put(None)
+        forwarder.join()
+        manager.shutdown()
+    return outputs
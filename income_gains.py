@@ -1,9 +1,13 @@
 import os
 import pandas as pd
+from loader import BackgroundLoader
+from schema import concat_frames
+from streaming import aggregate_frames, income_aggregator
 import tkinter as tk
 from tkinter import filedialog, messagebox, ttk
 from pathlib import Path
 from update_csv import CSVTableViewer
+from reports import read_export_csv, detect_decimal, income_export
 
 class IncomeGainsViewer:
     def __init__(self, parent_frame, summary_widget):
@@ -56,6 +60,12 @@ class IncomeGainsViewer:
         btn_deselect_all = ttk.Button(list_buttons, text="✗ Tout désélectionner", command=self.deselect_all_files)
         btn_deselect_all.pack(side=tk.LEFT, padx=2)
 
+        # Progression du chargement en arrière-plan
+        self.load_status = ttk.Label(list_buttons, text="")
+        self.load_status.pack(side=tk.LEFT, padx=5)
+        self.loader = BackgroundLoader(self.parent_frame, read_export_csv, self._add_file, self._files_loaded,
+                                       self._show_load_progress)
+
         # Liste des fichiers avec cases à cocher
         self.files_listbox = tk.Listbox(left_frame, selectmode=tk.EXTENDED)
         self.files_listbox.pack(fill=tk.BOTH, expand=True, side=tk.LEFT)
@@ -119,9 +129,7 @@ class IncomeGainsViewer:
         return lb
 
     def detect_decimal(self, filepath):
-        with open(filepath, 'r') as f:
-            sample = f.read(2048)
-            return ',' if sample.count(',') > sample.count('.') else '.'
+        return detect_decimal(filepath)
 
     def load_csv(self):
         """Ouvre la boîte de dialogue pour charger des fichiers CSV"""
@@ -130,26 +138,41 @@ class IncomeGainsViewer:
             filetypes=[("CSV files", "*.csv")],
             title="Sélectionner des fichiers CSV"
         )
-        for path in filepaths:
-            self.load_single_file(path)
+        self.load_files(filepaths)
+
+    def load_files(self, filepaths):
+        """Charge des fichiers CSV en parallèle, hors du thread Tk ; filtres et résumé mis à jour une fois le lot chargé"""
+        self.loader.load([path for path in filepaths if os.path.basename(path) not in self.dataframes])
 
     def load_single_file(self, filepath):
         """Charge un seul fichier CSV"""
-        if filepath not in self.dataframes:
+        if os.path.basename(filepath) not in self.dataframes:
             try:
-                decimal = self.detect_decimal(filepath)
-                df = pd.read_csv(filepath, decimal=decimal)
-                name = os.path.basename(filepath)
-                self.dataframes[name] = df
-                
-                # Ajouter le fichier à la liste avec une case à cocher
-                self.create_checkbox(self.files_listbox, name)
-                
+                self._add_file(filepath, read_export_csv(filepath))
                 self.populate_filters()
                 self.update_summary()
             except Exception as e:
                 messagebox.showerror("Erreur de chargement", str(e))
 
+    def _add_file(self, filepath, df):
+        # Dates déjà converties au chargement (format fixe), réutilisées par les calculs
+        name = os.path.basename(filepath)
+        self.dataframes[name] = df
+        # Ajouter le fichier à la liste avec une case à cocher
+        self.create_checkbox(self.files_listbox, name)
+
+    def _show_load_progress(self, done, total, filepath):
+        self.load_status.config(text=f"Chargement {done}/{total} : {os.path.basename(filepath)}")
+
+    def _files_loaded(self, errors):
+        # Filtres et résumé recalculés une seule fois pour tout le lot
+        self.load_status.config(text="")
+        self.populate_filters()
+        self.update_summary()
+        if errors:
+            messagebox.showerror("Erreur de chargement",
+                                 "\n".join(f"{os.path.basename(path)} : {e}" for path, e in errors))
+
     def create_checkbox(self, parent, filename):
         """Crée une case à cocher pour un fichier"""
         frame = ttk.Frame(parent)
@@ -261,7 +284,7 @@ class IncomeGainsViewer:
                 return
 
             # Concaténer tous les dataframes
-            final_df = pd.concat(filtered_dfs, ignore_index=True)
+            final_df = concat_frames(filtered_dfs)
             
             # Exporter vers CSV
             final_df.to_csv(filepath, index=False)
@@ -299,63 +322,10 @@ class IncomeGainsViewer:
             return
 
         try:
-            # Concaténer uniquement les dataframes actifs
-            all_data = pd.concat(self.get_active_dataframes().values(), ignore_index=True)
-            
-            # Convertir la colonne Date en datetime si elle existe
-            if 'Date' in all_data.columns:
-                all_data['Date'] = pd.to_datetime(all_data['Date'], errors='coerce')
-                all_data['Year'] = all_data['Date'].dt.year
-
-            # Convertir les colonnes numériques
-            if 'Amount' in all_data.columns:
-                all_data['Amount'] = pd.to_numeric(all_data['Amount'], errors='coerce')
-            if 'Value (EUR)' in all_data.columns:
-                all_data['Value (EUR)'] = pd.to_numeric(all_data['Value (EUR)'], errors='coerce')
-
-            # Calculer les totaux globaux par devise
+            # Fichiers actifs agrégés un par un, sans les concaténer
+            text = aggregate_frames(self.get_active_dataframes().values(), [income_aggregator()])[0]
             self.summary.delete("1.0", tk.END)
-            self.summary.insert(tk.END, "=== Gains Globaux ===\n\n")
-
-            # Calculer les totaux par devise
-            gains_by_asset = all_data.groupby('Asset').agg({
-                'Amount': 'sum',
-                'Value (EUR)': 'sum'
-            }).round(8)
-
-            for asset, row in gains_by_asset.iterrows():
-                self.summary.insert(tk.END, f"{asset}: {row['Amount']:.8f} (Valeur: {row['Value (EUR)']:.2f} EUR)\n")
-
-            # Calculer le total en EUR
-            total_eur = all_data['Value (EUR)'].sum()
-            self.summary.insert(tk.END, f"\nTotal Value (EUR): {total_eur:.2f} EUR\n")
-
-            # Calculer les totaux par année
-            if 'Year' in all_data.columns:
-                self.summary.insert(tk.END, "\n=== Gains par Année ===\n\n")
-                
-                for year in sorted(all_data['Year'].unique()):
-                    if pd.isna(year):
-                        continue
-                    
-                    year_data = all_data[all_data['Year'] == year]
-                    
-                    # Calculer les totaux par devise pour cette année
-                    year_gains = year_data.groupby('Asset').agg({
-                        'Amount': 'sum',
-                        'Value (EUR)': 'sum'
-                    }).round(8)
-                    
-                    self.summary.insert(tk.END, f"\n=== {int(year)} ===\n")
-                    
-                    # Afficher les gains par devise pour cette année
-                    for asset, row in year_gains.iterrows():
-                        self.summary.insert(tk.END, f"{asset}: {row['Amount']:.8f} (Valeur: {row['Value (EUR)']:.2f} EUR)\n")
-                    
-                    # Afficher le total en EUR pour cette année
-                    year_total_eur = year_data['Value (EUR)'].sum()
-                    self.summary.insert(tk.END, f"Total Value (EUR): {year_total_eur:.2f} EUR\n")
-
+            self.summary.insert(tk.END, text)
         except Exception as e:
             messagebox.showerror("Erreur de calcul", f"Une erreur est survenue lors du calcul des gains :\n{str(e)}")
 
@@ -376,16 +346,8 @@ class IncomeGainsViewer:
             if not filepath:  # L'utilisateur a annulé
                 return
 
-            # Concaténer tous les dataframes actifs
-            all_data = pd.concat(self.get_active_dataframes().values(), ignore_index=True)
-            
-            # Convertir la colonne Date en datetime si elle existe
-            if 'Date' in all_data.columns:
-                all_data['Date'] = pd.to_datetime(all_data['Date'], errors='coerce')
-                # Trier par date
-                all_data = all_data.sort_values('Date')
-                # Reconvertir en format string pour l'export
-                all_data['Date'] = all_data['Date'].dt.strftime('%Y-%m-%d %H:%M:%S')
+            # Concaténer tous les dataframes actifs, triés par date
+            all_data = income_export(concat_frames(self.get_active_dataframes().values()))
 
             # Exporter vers CSV
             all_data.to_csv(filepath, index=False)
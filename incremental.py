@@ -0,0 +1,47 @@
+import pandas as pd
+from normalize import as_datetime
+from price_join import PRICE_COLUMNS
+
+# Colonnes identifiant une transaction sans Transaction ID
+CONTENT_KEY_COLUMNS = ['Date', 'Type', 'Sent Currency', 'Sent Amount', 'Received Currency', 'Received Amount']
+
+
+def row_keys(df):
+    """
+    Clé de rapprochement de chaque ligne : le Transaction ID s'il est renseigné,
+    sinon une empreinte de la date, du type, des devises et des montants.
+    """
+    columns = [c for c in CONTENT_KEY_COLUMNS if c in df.columns]
+    content = pd.DataFrame(index=df.index)
+    for col in columns:
+        if col == 'Date':
+            content[col] = as_datetime(df[col]).astype(str)
+        elif col.endswith('Amount'):
+            content[col] = pd.to_numeric(df[col], errors='coerce').astype(str)
+        else:
+            content[col] = df[col].astype(str).str.upper()
+    keys = 'h:' + pd.util.hash_pandas_object(content, index=False).astype(str)
+    if 'Transaction ID' in df.columns:
+        ids = df['Transaction ID'].astype('string').str.strip()
+        has_id = ids.notna() & (ids != '')
+        keys = ('id:' + ids).where(has_id, keys)
+    return keys.astype(str)
+
+
+def copy_base_prices(df, base_df):
+    """
+    Reprend en bloc les prix EUR d'un fichier enrichi précédent pour les lignes communes
+    (colonnes vides uniquement). Retourne le nombre de lignes reprises.
+    """
+    columns = [c for c in PRICE_COLUMNS if c in base_df.columns]
+    if not columns or df.empty or base_df.empty:
+        return 0
+    base = base_df[columns].apply(pd.to_numeric, errors='coerce')
+    base.index = row_keys(base_df)
+    base = base[~base.index.duplicated(keep='first')]
+    matched = base.reindex(row_keys(df).to_numpy())
+    matched.index = df.index
+    for col in columns:
+        current = pd.to_numeric(df[col], errors='coerce') if col in df.columns else pd.Series(float('nan'), index=df.index)
+        df[col] = current.fillna(matched[col])
+    return int(matched.notna().any(axis=1).sum())
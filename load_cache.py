@@ -0,0 +1,181 @@
+import hashlib
+import os
+import pickle
+import threading
+import time
+from price_store import default_cache_dir
+
+try:
+    import pyarrow.feather as feather
+except ImportError:  # pyarrow absent : entrées en pickle (lecture complète, sans memory-map)
+    feather = None
+
+# Sous-répertoire du cache de l'application contenant les fichiers déjà analysés
+LOAD_CACHE_DIRNAME = 'load_cache'
+# Éviction : entrées inutilisées depuis DEFAULT_MAX_AGE_DAYS, puis les moins récemment lues au-delà de DEFAULT_MAX_BYTES
+DEFAULT_MAX_BYTES = 1024 ** 3
+DEFAULT_MAX_AGE_DAYS = 90
+# À incrémenter quand la lecture/normalisation change : les anciennes entrées ne sont plus jamais lues
+FORMAT_VERSION = 2
+HASH_CHUNK_SIZE = 1024 * 1024
+CACHE_EXTENSIONS = ('.feather', '.pkl')
+
+
+def file_fingerprint(path):
+    """Empreinte d'un fichier : (chemin absolu, taille, mtime ns, hash du contenu)"""
+    stat = os.stat(path)
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return os.path.abspath(path), stat.st_size, stat.st_mtime_ns, digest.hexdigest()
+
+
+class LoadCache:
+    """
+    Cache des fichiers CSV déjà analysés et normalisés, un fichier colonne par CSV, clé = empreinte du fichier
+    (chemin, taille, mtime, hash du contenu). Feather non compressé lu en memory-map si pyarrow est installé,
+    pickle sinon ; les types (dates datetime64, montants float64) sont conservés. Un CSV modifié change de clé :
+    son ancienne entrée n'est plus lue et finit évincée.
+    """
+    def __init__(self, directory=None, max_bytes=DEFAULT_MAX_BYTES, max_age_days=DEFAULT_MAX_AGE_DAYS):
+        self._directory = directory
+        self.max_bytes = max_bytes
+        self.max_age_days = max_age_days
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    @property
+    def directory(self):
+        # Résolu à chaque accès : suit CRYPTO_VIEWER_CACHE_DIR
+        return self._directory or os.path.join(default_cache_dir(), LOAD_CACHE_DIRNAME)
+
+    def _entry_base(self, path):
+        key = '|'.join(str(part) for part in (*file_fingerprint(path), FORMAT_VERSION))
+        return os.path.join(self.directory, hashlib.blake2b(key.encode('utf-8'), digest_size=16).hexdigest())
+
+    def read(self, path, parse_fn):
+        """DataFrame de `path` depuis le cache, sinon parse_fn(path) puis mise en cache"""
+        base = self._entry_base(path)
+        for ext in CACHE_EXTENSIONS:
+            df = self._load_entry(base + ext)
+            if df is not None:
+                with self._lock:
+                    self.hits += 1
+                return df
+        with self._lock:
+            self.misses += 1
+        df = parse_fn(path)
+        self._store_entry(base, df)
+        return df
+
+    def _load_entry(self, entry):
+        if not os.path.exists(entry):
+            return None
+        try:
+            if entry.endswith('.feather'):
+                if feather is None:
+                    return None
+                df = feather.read_table(entry, memory_map=True).to_pandas()
+            else:
+                with open(entry, 'rb') as f:
+                    df = pickle.load(f)
+            os.utime(entry)  # date de dernière utilisation, pour l'éviction
+            return df
+        except Exception:
+            # Entrée illisible (écriture interrompue, version de pandas/pyarrow) : supprimée puis recalculée
+            self._remove(entry)
+            return None
+
+    def _store_entry(self, base, df):
+        # Le cache ne doit jamais empêcher un chargement : toute erreur d'écriture est ignorée
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+        except OSError:
+            return
+        tmp = f'{base}.{os.getpid()}.{threading.get_ident()}.tmp'
+        try:
+            if feather is not None:
+                try:
+                    feather.write_feather(df, tmp, compression='uncompressed')
+                    os.replace(tmp, base + '.feather')
+                    self.evict()
+                    return
+                except (ValueError, TypeError, NotImplementedError):
+                    pass  # colonne objet aux types mélangés : pickle
+            with open(tmp, 'wb') as f:
+                pickle.dump(df, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, base + '.pkl')
+            self.evict()
+        except OSError:
+            self._remove(tmp)
+
+    def _entries(self):
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return []
+        entries = []
+        for name in names:
+            if not name.endswith(CACHE_EXTENSIONS):
+                continue
+            try:
+                stat = os.stat(os.path.join(self.directory, name))
+            except FileNotFoundError:
+                continue  # supprimée par un autre thread/processus
+            entries.append((stat.st_mtime, stat.st_size, os.path.join(self.directory, name)))
+        return sorted(entries)
+
+    @staticmethod
+    def _remove(entry):
+        try:
+            os.remove(entry)
+            return True
+        except OSError:
+            return False
+
+    def evict(self):
+        """Supprime les entrées trop anciennes puis les moins récemment lues au-delà de max_bytes"""
+        entries = self._entries()
+        oldest = time.time() - self.max_age_days * 86400
+        total = sum(size for _, size, _ in entries)
+        removed = 0
+        for mtime, size, entry in entries:
+            if mtime >= oldest and total <= self.max_bytes:
+                break
+            if self._remove(entry):
+                removed += 1
+            total -= size
+        return removed
+
+    def size(self):
+        """(nombre d'entrées, octets occupés)"""
+        entries = self._entries()
+        return len(entries), sum(size for _, size, _ in entries)
+
+    def clear(self):
+        """Vide le cache ; retourne (entrées supprimées, octets libérés)"""
+        count, freed = 0, 0
+        for _, size, entry in self._entries():
+            if self._remove(entry):
+                count += 1
+                freed += size
+        return count, freed
+
+
+_default_cache = LoadCache()
+
+
+def default_load_cache():
+    """Cache de chargement partagé par les onglets et la ligne de commande"""
+    return _default_cache
+
+
+def format_size(num_bytes):
+    """Taille lisible : '512 o', '3.2 Mo', '1.1 Go'"""
+    for unit in ('o', 'Ko', 'Mo'):
+        if num_bytes < 1024:
+            return f"{num_bytes:.0f} {unit}" if unit == 'o' else f"{num_bytes:.1f} {unit}"
+        num_bytes /= 1024
+    return f"{num_bytes:.1f} Go"
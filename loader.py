@@ -0,0 +1,108 @@
+import os
+import queue
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+# Fichiers lus en parallèle (la lecture CSV de pandas libère le GIL) et sondage de la file côté Tk
+DEFAULT_LOAD_WORKERS = min(8, os.cpu_count() or 1)
+DEFAULT_POLL_MS = 50
+
+
+class BackgroundLoader:
+    """
+    Chargement de fichiers hors du thread Tk. read_fn(chemin) est appelée en parallèle dans un pool de
+    threads ; les résultats passent par une file vidée sur le thread Tk (sondage par `after`) :
+    on_progress(faits, total, chemin) à chaque fichier lu, on_file(chemin, résultat) dans l'ordre de la
+    demande, puis on_done(erreurs [(chemin, exception)]) une seule fois quand tout le lot est chargé.
+    Un appel à load() pendant un lot ajoute ses fichiers au lot en cours.
+    """
+    def __init__(self, widget, read_fn, on_file, on_done, on_progress=None,
+                 workers=DEFAULT_LOAD_WORKERS, poll_ms=DEFAULT_POLL_MS):
+        self.widget = widget
+        self.read_fn = read_fn
+        self.on_file = on_file
+        self.on_done = on_done
+        self.on_progress = on_progress
+        self.workers = workers
+        self.poll_ms = poll_ms
+        self._results = queue.Queue()
+        self._pool = None
+        self._pending = deque()  # chemins du lot, dans l'ordre de la demande
+        self._ready = {}
+        self._errors = []
+        self._done = 0
+        self._total = 0
+        self._polling = False
+
+    @property
+    def busy(self):
+        return self._total > 0
+
+    def load(self, paths):
+        """Lance la lecture des fichiers (thread Tk) ; retourne le nombre de fichiers ajoutés au lot"""
+        paths = [p for p in dict.fromkeys(paths) if p not in self._pending]
+        if not paths:
+            return 0
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(max_workers=max(1, self.workers), thread_name_prefix='csv-loader')
+        self._pending.extend(paths)
+        self._total += len(paths)
+        for path in paths:
+            self._pool.submit(self._read, path)
+        if self.widget is not None and not self._polling:
+            self._polling = True
+            self.widget.after(self.poll_ms, self._poll)
+        return len(paths)
+
+    def _read(self, path):
+        # Thread du pool : aucun accès aux widgets
+        try:
+            self._results.put((path, self.read_fn(path), None))
+        except Exception as e:
+            self._results.put((path, None, e))
+
+    def _poll(self):
+        self.drain()
+        if self.busy:
+            self.widget.after(self.poll_ms, self._poll)
+        else:
+            self._polling = False
+
+    def drain(self, block=False, timeout=None):
+        """Publie les fichiers lus depuis le dernier appel (thread Tk) ; block : attend au moins un fichier"""
+        while self.busy:
+            try:
+                path, result, error = self._results.get(block=block, timeout=timeout)
+            except queue.Empty:
+                return
+            block = False
+            self._done += 1
+            self._ready[path] = (result, error)
+            if self.on_progress:
+                self.on_progress(self._done, self._total, path)
+            while self._pending and self._pending[0] in self._ready:
+                path = self._pending.popleft()
+                result, error = self._ready.pop(path)
+                if error is None:
+                    self.on_file(path, result)
+                else:
+                    self._errors.append((path, error))
+            if not self._pending:
+                errors, self._errors = self._errors, []
+                self._done = self._total = 0
+                self.on_done(errors)
+
+    def wait(self, timeout=None):
+        """Attend la fin du lot en cours en publiant ses résultats (thread Tk ; utile hors boucle Tk)"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self.busy:
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                raise TimeoutError("Chargement non terminé")
+            self.drain(block=True, timeout=remaining)
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False)
+            self._pool = None
@@ -1,4 +1,5 @@
 import os
+import multiprocessing
 import pandas as pd
 import tkinter as tk
 from tkinter import filedialog, messagebox, ttk
@@ -6,6 +7,7 @@ from pathlib import Path
 from income_gains import IncomeGainsViewer
 from realized_gains import RealizedGainsViewer
 from transactions import TransactionsViewer
+from load_cache import default_load_cache, format_size
 
 class CryptoBinanceViewer:
     def __init__(self, root):
@@ -31,6 +33,13 @@ class CryptoBinanceViewer:
         self.setup_ui()
 
     def setup_ui(self):
+        # Menu : vidage du cache des fichiers déjà analysés
+        menubar = tk.Menu(self.root)
+        cache_menu = tk.Menu(menubar, tearoff=0)
+        cache_menu.add_command(label="Vider le cache de chargement", command=self.clear_load_cache)
+        menubar.add_cascade(label="Cache", menu=cache_menu)
+        self.root.config(menu=menubar)
+
         # Frame principal avec padding
         main_frame = ttk.Frame(self.root, padding="10")
         main_frame.pack(fill=tk.BOTH, expand=True)
@@ -67,7 +76,13 @@ class CryptoBinanceViewer:
         self.income_gains_viewer = IncomeGainsViewer(self.income_gains_tab, self.summary)
         self.realized_gains_viewer = RealizedGainsViewer(self.capital_gains_tab, self.summary)
 
+    def clear_load_cache(self):
+        count, freed = default_load_cache().clear()
+        messagebox.showinfo("Cache", f"{count} fichier(s) supprimé(s) du cache de chargement ({format_size(freed)} libérés)")
+
 if __name__ == "__main__":
+    # Exécutable PyInstaller (spawn) : les processus de travail ne doivent pas relancer l'application
+    multiprocessing.freeze_support()
     root = tk.Tk()
     app = CryptoBinanceViewer(root)
     root.mainloop()
\ No newline at end of file
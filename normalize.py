@@ -0,0 +1,112 @@
+import numpy as np
+import pandas as pd
+
+# Fuseau des dates sans fuseau des exports Binance Tax
+LOCAL_TIMEZONE = 'Europe/Paris'
+# Colonnes de dates reconnues ; la première présente parmi DATE_COLUMNS[:2] porte l'horodatage de la ligne
+DATE_COLUMNS = ['Date', 'datetime', 'Acquired', 'Sold']
+# Colonne int64 (ms depuis l'epoch, UTC) calculée au chargement et réutilisée par tout l'enrichissement
+EPOCH_MS_COLUMN = 'Timestamp (ms)'
+# Texte d'origine des dates à décalage horaire (converties en UTC), réécrit tel quel dans les fichiers produits
+SOURCE_SUFFIX = ' (source)'
+# Formats essayés sur un échantillon, dans l'ordre ; le premier qui reconnaît le plus de valeurs est retenu
+DATE_FORMATS = [
+    '%Y-%m-%d %H:%M:%S', '%Y-%m-%d %H:%M:%S.%f', '%Y-%m-%dT%H:%M:%S', '%Y-%m-%dT%H:%M:%S.%f',
+    '%Y-%m-%d %H:%M:%S%z', '%Y-%m-%dT%H:%M:%S%z', '%Y-%m-%d %H:%M', '%Y-%m-%d',
+    '%d/%m/%Y %H:%M:%S', '%d/%m/%Y %H:%M', '%d/%m/%Y', '%y-%m-%d %H:%M:%S',
+]
+FORMAT_SAMPLE_SIZE = 200
+
+# Politique explicite pour les changements d'heure (dates locales sans fuseau) :
+# - heure répétée d'octobre (02:00-03:00 deux fois) : 'standard' = heure d'hiver (comme pytz.localize),
+#   'dst' = heure d'été, 'NaT' = date rejetée
+# - heure sautée de mars (02:00-03:00 inexistante) : 'shift_forward' = décalée à 03:00,
+#   'shift_backward' = ramenée à 01:59:59.999, 'NaT' = date rejetée
+AMBIGUOUS_POLICY = 'standard'
+NONEXISTENT_POLICY = 'shift_forward'
+
+
+def detect_date_format(values):
+    """Format strptime reconnaissant le plus de valeurs d'un échantillon, None si aucun"""
+    sample = pd.Series(values).dropna().astype(str).str.strip()
+    sample = sample[sample != ''].head(FORMAT_SAMPLE_SIZE)
+    best, best_count = None, 0
+    for fmt in DATE_FORMATS:
+        count = int(pd.to_datetime(sample, format=fmt, errors='coerce', utc='%z' in fmt).notna().sum())
+        if count > best_count:
+            best, best_count = fmt, count
+            if count == len(sample):
+                break
+    return best
+
+
+def as_datetime(values, fmt=None):
+    """Dates datetime64 : colonne déjà convertie renvoyée telle quelle, sinon format fixe détecté une fois"""
+    values = pd.Series(values) if not isinstance(values, pd.Series) else values
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return values
+    fmt = fmt or detect_date_format(values)
+    if fmt is None:
+        return pd.to_datetime(values, errors='coerce')
+    # Décalages horaires explicites : dates ramenées en UTC (plusieurs décalages possibles dans un fichier)
+    return pd.to_datetime(values, format=fmt, errors='coerce', utc='%z' in fmt)
+
+
+def to_epoch_ms(dates, timezone=LOCAL_TIMEZONE, ambiguous=AMBIGUOUS_POLICY, nonexistent=NONEXISTENT_POLICY):
+    """
+    Timestamps ms UTC (Int64, <NA> si date invalide) d'une colonne de dates.
+    Les dates sans fuseau sont localisées dans `timezone` en une seule opération, selon la politique DST.
+    """
+    dates = as_datetime(dates)
+    if dates.dt.tz is None:
+        if ambiguous in ('standard', 'dst'):
+            ambiguous = np.full(len(dates), ambiguous == 'dst', dtype=bool)
+        dates = dates.dt.tz_localize(timezone, ambiguous=ambiguous, nonexistent=nonexistent)
+    ms = dates.dt.tz_convert('UTC').dt.tz_localize(None).astype('datetime64[ms]').astype('int64')
+    return ms.astype('Int64').mask(dates.isna())
+
+
+def normalize_dates(df, epoch=True, timezone=LOCAL_TIMEZONE, ambiguous=AMBIGUOUS_POLICY, nonexistent=NONEXISTENT_POLICY,
+                    keep_source=False):
+    """
+    Étape de normalisation au chargement (en place) : colonnes de dates converties en datetime64 avec
+    leur format fixe, et si epoch, colonne EPOCH_MS_COLUMN ajoutée pour l'horodatage de la ligne.
+    Si keep_source, le texte des dates à décalage horaire est conservé pour l'écriture (voir output_frame).
+    """
+    for col in DATE_COLUMNS:
+        if col in df.columns:
+            fmt = None
+            if not pd.api.types.is_datetime64_any_dtype(df[col]):
+                fmt = detect_date_format(df[col])
+                if keep_source and fmt is not None and '%z' in fmt:
+                    df[col + SOURCE_SUFFIX] = df[col]
+            df[col] = as_datetime(df[col], fmt)
+    if epoch:
+        date_col = next((col for col in DATE_COLUMNS[:2] if col in df.columns), None)
+        if date_col is None:
+            df[EPOCH_MS_COLUMN] = pd.Series(pd.NA, index=df.index, dtype='Int64')
+        else:
+            df[EPOCH_MS_COLUMN] = to_epoch_ms(df[date_col], timezone, ambiguous, nonexistent)
+    return df
+
+
+def sort_chronologically(df):
+    """
+    Lignes triées par horodatage (EPOCH_MS_COLUMN, quelle que soit la colonne de dates), dates invalides en
+    dernier, ordre du fichier conservé à date égale. Sans colonne EPOCH_MS_COLUMN, df est renvoyé tel quel.
+    """
+    if EPOCH_MS_COLUMN not in df.columns:
+        return df
+    return df.sort_values(EPOCH_MS_COLUMN, kind='stable', na_position='last').reset_index(drop=True)
+
+
+def output_columns(df):
+    """Colonnes écrites dans les fichiers produits : sans les colonnes techniques (EPOCH_MS_COLUMN, texte source)"""
+    sources = {col + SOURCE_SUFFIX for col in DATE_COLUMNS}
+    return [col for col in df.columns if col != EPOCH_MS_COLUMN and col not in sources]
+
+
+def output_frame(df):
+    """Table écrite dans les fichiers produits : colonnes de output_columns, dates à décalage horaire d'origine"""
+    sources = {col: df[col + SOURCE_SUFFIX] for col in DATE_COLUMNS if col + SOURCE_SUFFIX in df.columns}
+    return df[output_columns(df)].assign(**sources)
@@ -0,0 +1,215 @@
+import json
+import os
+import threading
+import time
+from binance_client import PriceClientError, TransientPriceError, get_default_client
+from price_store import INTERVAL_MS, MINUTE_MS
+
+# Durée de validité de l'instantané exchangeInfo (secondes)
+SNAPSHOT_MAX_AGE = 24 * 3600
+SNAPSHOT_NAME = 'exchange_info.json'
+
+
+class PairIndex:
+    """
+    Index local des paires Binance, tiré d'un instantané exchangeInfo mis en cache sur disque.
+    Les dates de cotation (première bougie) et de retrait (dernière bougie des paires qui ne sont
+    plus en TRADING) sont découvertes une fois par paire puis conservées dans l'instantané.
+    Tant qu'aucun instantané n'est disponible, toutes les paires sont considérées possibles.
+    Les appels exchangeInfo et les sondes passent par rate_limiter (par défaut celui du client) comme les fenêtres.
+    """
+    def __init__(self, path=None, client=None, max_age=SNAPSHOT_MAX_AGE, offline=False, rate_limiter=None):
+        self.path = path
+        self.client = client
+        self.rate_limiter = rate_limiter if rate_limiter is not None else getattr(client, 'rate_limiter', None)
+        self.max_age = max_age
+        self.offline = offline
+        self._pairs = None
+        self._fetched_at = 0
+        self._loaded = False
+        self._lock = threading.RLock()
+        self._probe_locks = {}
+
+    @classmethod
+    def for_store(cls, store, client=None, offline=False, rate_limiter=None):
+        """Index dont l'instantané est rangé à côté du cache de prix (en mémoire pour un store ':memory:')"""
+        path = None
+        if getattr(store, 'path', ':memory:') != ':memory:':
+            path = os.path.join(os.path.dirname(os.path.abspath(store.path)), SNAPSHOT_NAME)
+        return cls(path, client, offline=offline, rate_limiter=rate_limiter)
+
+    def _ensure_loaded(self):
+        with self._lock:
+            if self._loaded:
+                return
+            self._loaded = True
+            if self.path and os.path.exists(self.path):
+                try:
+                    with open(self.path, encoding='utf-8') as f:
+                        snapshot = json.load(f)
+                    self._pairs = snapshot['symbols']
+                    self._fetched_at = snapshot.get('fetched_at', 0)
+                except (OSError, ValueError, KeyError):
+                    self._pairs = None
+            if not self.offline and (self._pairs is None or time.time() - self._fetched_at > self.max_age):
+                self.refresh()
+
+    def refresh(self):
+        """Recharge la liste des paires depuis l'API ; conserve l'ancien instantané en cas d'échec"""
+        client = self.client if self.client is not None else get_default_client()
+        self._acquire()
+        try:
+            data = client.exchange_info()
+        except PriceClientError:
+            return False
+        with self._lock:
+            previous = self._pairs or {}
+            pairs = {}
+            for info in data['symbols']:
+                entry = {'status': info.get('status'), 'base': info.get('baseAsset'), 'quote': info.get('quoteAsset')}
+                # Les dates déjà découvertes restent valables
+                for key in ('listed', 'delisted'):
+                    if key in previous.get(info['symbol'], {}):
+                        entry[key] = previous[info['symbol']][key]
+                if entry['status'] == 'TRADING':
+                    entry.pop('delisted', None)
+                pairs[info['symbol']] = entry
+            self._pairs = pairs
+            self._fetched_at = time.time()
+            self._save()
+        return True
+
+    def _save(self):
+        if not self.path:
+            return
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'fetched_at': self._fetched_at, 'symbols': self._pairs}, f)
+        os.replace(tmp_path, self.path)
+
+    def exists(self, pair):
+        """True/False si l'instantané connaît la réponse, None sans instantané"""
+        self._ensure_loaded()
+        if self._pairs is None:
+            return None
+        return pair in self._pairs
+
+    def trading_range(self, pair):
+        """(première bougie, dernière bougie ou None si toujours cotée) ; None si inconnu"""
+        if not self.exists(pair):
+            return None
+        with self._lock:
+            info = dict(self._pairs[pair])
+            probe_lock = self._probe_locks.setdefault(pair, threading.Lock())
+        if not self.offline and self._needs_probe(info):
+            # Sondes HTTP hors du verrou de l'index : seules les recherches de cette paire les attendent
+            with probe_lock:
+                with self._lock:
+                    info = dict(self._pairs.get(pair, info))
+                found = {}
+                if 'listed' not in info:
+                    first = self._probe(pair, start_ms=0)
+                    if first is not None:
+                        found['listed'] = first
+                if info.get('status') != 'TRADING' and 'delisted' not in info:
+                    last = self._probe(pair, end_ms=int(time.time() * 1000))
+                    if last is not None:
+                        found['delisted'] = last
+                if found:
+                    info.update(found)
+                    with self._lock:
+                        if pair in self._pairs:
+                            self._pairs[pair].update(found)
+                            self._save()
+        return info.get('listed'), info.get('delisted')
+
+    @staticmethod
+    def _needs_probe(info):
+        return 'listed' not in info or (info.get('status') != 'TRADING' and 'delisted' not in info)
+
+    def _probe(self, pair, start_ms=None, end_ms=None):
+        # Une bougie suffit : la première après start_ms ou la dernière avant end_ms
+        client = self.client if self.client is not None else get_default_client()
+        self._acquire()
+        try:
+            data = client.klines(pair, start_ms, limit=1, end_ms=end_ms)
+        except TransientPriceError:
+            return None
+        except PriceClientError:
+            data = []
+        return int(data[0][0]) if data else None
+
+    def _acquire(self):
+        if self.rate_limiter is not None:
+            self.rate_limiter.acquire()
+
+    def is_trading(self, pair, minute_ms):
+        """False si la paire n'existe pas ou n'était pas cotée à cette minute"""
+        if self.exists(pair) is False:
+            return False
+        trading_range = self.trading_range(pair)
+        if trading_range is None:
+            return True
+        listed, delisted = trading_range
+        if listed is not None and minute_ms < listed:
+            return False
+        return delisted is None or minute_ms <= delisted
+
+
+class NegativeCache:
+    """Absences de prix constatées pendant une exécution : (paire, plage de temps), jamais redemandées"""
+    def __init__(self):
+        self._ranges = {}
+        self._lock = threading.Lock()
+
+    def add(self, pair, start_ms=None, end_ms=None):
+        """Plage sans bougie ; sans bornes, toute la paire (paire inexistante)"""
+        start = float('-inf') if start_ms is None else start_ms
+        end = float('inf') if end_ms is None else end_ms
+        with self._lock:
+            self._ranges.setdefault(pair, []).append((start, end))
+
+    def covers(self, pair, minute_ms):
+        with self._lock:
+            return any(start <= minute_ms <= end for start, end in self._ranges.get(pair, ()))
+
+    def __len__(self):
+        with self._lock:
+            return sum(len(r) for r in self._ranges.values())
+
+
+def filter_needs(needs, pair_index=None, negative_cache=None, interval='1m'):
+    """
+    Retire des besoins {paire: minutes} les paires inexistantes, les minutes hors période de cotation
+    et les plages déjà constatées sans prix. Retourne (besoins restants, nombre de minutes écartées).
+    Avec des bougies plus longues que la minute, une bougie est gardée si elle recouvre la période de cotation.
+    """
+    span = INTERVAL_MS[interval] - 1
+    kept = {}
+    skipped = 0
+    for pair, minutes in needs.items():
+        if pair_index is not None and pair_index.exists(pair) is False:
+            skipped += len(minutes)
+            continue
+        listed, delisted = (pair_index.trading_range(pair) if pair_index is not None else None) or (None, None)
+        valid = {m for m in minutes
+                 if (listed is None or m + span >= listed) and (delisted is None or m <= delisted)
+                 and (negative_cache is None or not negative_cache.covers(pair, m))}
+        skipped += len(minutes) - len(valid)
+        if valid:
+            kept[pair] = valid
+    return kept, skipped
+
+
+def record_window_miss(negative_cache, window, candles, pair_missing=False):
+    """Mémorise la partie d'une fenêtre sans bougie : toute la paire si elle n'existe pas"""
+    if negative_cache is None:
+        return
+    if pair_missing:
+        negative_cache.add(window.symbol)
+    elif not candles:
+        negative_cache.add(window.symbol, window.start_ms, window.start_ms + (window.limit - 1) * INTERVAL_MS[window.interval])
+    elif candles[0][0] > window.start_ms:
+        # Pas de bougie entre le début de la fenêtre et la première renvoyée
+        negative_cache.add(window.symbol, window.start_ms, candles[0][0] - MINUTE_MS)
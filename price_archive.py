@@ -0,0 +1,71 @@
+import os
+import re
+import zipfile
+import pandas as pd
+
+# Nom des fichiers publiés sur data.binance.vision, ex : BTCEUR-1m-2023-01.zip
+ARCHIVE_NAME_RE = re.compile(r'^([A-Z0-9]+)-(\d+[smhdwM])-(\d{4}-\d{2}(?:-\d{2})?)\.(zip|csv)$')
+# Colonnes utiles d'une ligne kline : open_time, high, low, close
+KLINE_COLUMNS = [0, 2, 3, 4]
+
+
+def find_archive_files(directory):
+    """Liste triée des archives klines d'un dossier : [(chemin, symbol, intervalle)]"""
+    found = []
+    for root, _, files in os.walk(directory):
+        for name in files:
+            match = ARCHIVE_NAME_RE.match(name)
+            if match:
+                found.append((os.path.join(root, name), match.group(1), match.group(2)))
+    return sorted(found)
+
+
+def read_kline_chunks(fileobj, chunk_rows=200_000):
+    """Lit un CSV de klines par blocs ; retourne des DataFrames (open_time, high, low, close)"""
+    reader = pd.read_csv(fileobj, header=None, usecols=KLINE_COLUMNS, chunksize=chunk_rows, dtype=str)
+    for chunk in reader:
+        chunk.columns = ['open_time', 'high', 'low', 'close']
+        chunk = chunk.apply(pd.to_numeric, errors='coerce').dropna(subset=['open_time', 'close'])
+        open_time = chunk['open_time'].astype('int64')
+        # Les archives récentes sont en microsecondes
+        chunk['open_time'] = open_time.where(open_time < 10**14, open_time // 1000)
+        yield chunk
+
+
+def import_kline_archives(directory, store, progress_callback=None, log_callback=None):
+    """
+    Importe dans le store toutes les archives klines (ZIP ou CSV) d'un dossier.
+    Les ZIP sont lus en flux, sans extraction sur disque. Retourne {'files': n, 'rows': n}.
+    """
+    archives = find_archive_files(directory)
+    total_rows = 0
+    for n, (path, symbol, interval) in enumerate(archives, 1):
+        rows = 0
+        if path.endswith('.zip'):
+            with zipfile.ZipFile(path) as zf:
+                for member in zf.namelist():
+                    if member.endswith('.csv'):
+                        with zf.open(member) as fileobj:
+                            rows += _import_stream(fileobj, symbol, interval, store)
+        else:
+            with open(path, 'rb') as fileobj:
+                rows += _import_stream(fileobj, symbol, interval, store)
+        total_rows += rows
+        if log_callback:
+            log_callback(f"Archive {n}/{len(archives)} : {os.path.basename(path)} ({rows} bougies)")
+        if progress_callback:
+            progress_callback(n, len(archives))
+    return {'files': len(archives), 'rows': total_rows}
+
+
+def _import_stream(fileobj, symbol, interval, store):
+    rows = 0
+    for chunk in read_kline_chunks(fileobj):
+        store.put_many(symbol, zip(
+            chunk['open_time'].tolist(),
+            chunk['close'].tolist(),
+            chunk['high'].tolist(),
+            chunk['low'].tolist()
+        ), interval=interval)
+        rows += len(chunk)
+    return rows
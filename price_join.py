@@ -0,0 +1,96 @@
+import numpy as np
+import pandas as pd
+from price_planner import leg_pairs
+from price_store import MINUTE_MS
+from normalize import LOCAL_TIMEZONE
+
+PRICE_COLUMNS = ["Sent Price EUR", "Sent Value EUR", "Received Price EUR", "Received Value EUR"]
+# Écart maximal (%) entre le prix retenu (close de la bougie) et les extrêmes high/low de la bougie
+DEVIATION_COLUMNS = ["Sent Price Deviation %", "Received Price Deviation %"]
+
+
+def join_leg_prices(df, timestamps_ms, leg, store, quote='EUR', interval='1m', tolerance_ms=MINUTE_MS - 1):
+    """
+    Prix d'une jambe (Sent/Received) pour toutes les lignes en une jointure : chaque ligne prend la
+    bougie ouverte au plus tard à son timestamp, à moins de tolerance_ms (merge_asof backward).
+    Retourne (prix, connu, écart) : connu=False si la bougie n'est pas dans le store (à récupérer),
+    écart = pire écart en % entre le close et le high/low de la bougie.
+    """
+    pairs = leg_pairs(df, leg, quote)
+    rows = pd.DataFrame({'row': np.arange(len(df)), 'pair': pairs.to_numpy(), 'ts': timestamps_ms.to_numpy()})
+    rows = rows.dropna()
+    price = pd.Series(np.nan, index=df.index, dtype='float64')
+    known = pd.Series(False, index=df.index)
+    deviation = pd.Series(np.nan, index=df.index, dtype='float64')
+    if rows.empty:
+        return price, known, deviation
+    rows['ts'] = rows['ts'].astype('int64')
+    series = []
+    for pair, group in rows.groupby('pair'):
+        candles = store.load_series(pair, group['ts'].min() - tolerance_ms, group['ts'].max(), interval)
+        candles['pair'] = pair
+        series.append(candles)
+    candles = pd.concat(series, ignore_index=True).sort_values('open_time')
+    joined = pd.merge_asof(
+        rows.sort_values('ts'), candles,
+        left_on='ts', right_on='open_time', by='pair',
+        direction='backward', tolerance=tolerance_ms
+    ).sort_values('row')
+    positions = joined['row'].to_numpy()
+    price.iloc[positions] = joined['close'].to_numpy()
+    known.iloc[positions] = joined['open_time'].notna().to_numpy()
+    spread = np.maximum(joined['high'] - joined['close'], joined['close'] - joined['low'])
+    deviation.iloc[positions] = (spread / joined['close'] * 100).to_numpy()
+    store.record_lookups(known.sum(), len(rows) - known.sum())
+    return price, known, deviation
+
+
+def apply_eur_prices(df, timestamps_ms, store, interval='1m', tolerance_ms=MINUTE_MS - 1, missing_only=False,
+                     deviation=False):
+    """
+    Remplit les colonnes Price/Value EUR des deux jambes par opérations sur colonnes entières.
+    missing_only : les prix déjà renseignés (fichier de base, reprise) sont conservés.
+    deviation : remplit aussi DEVIATION_COLUMNS pour les prix joints.
+    Retourne le nombre de jambes sans prix car absentes du store (à récupérer puis rejoindre).
+    """
+    unknown = 0
+    for leg in ('Sent', 'Received'):
+        cur_col, amt_col = f'{leg} Currency', f'{leg} Amount'
+        if cur_col not in df.columns or amt_col not in df.columns:
+            continue
+        amounts = pd.to_numeric(df[amt_col], errors='coerce')
+        is_eur = (df[cur_col].astype(str).str.upper() == 'EUR') & amounts.notna()
+        price, known, spread = join_leg_prices(df, timestamps_ms, leg, store, interval=interval, tolerance_ms=tolerance_ms)
+        price = price.where(~is_eur, 1.0)
+        if deviation:
+            df[f'{leg} Price Deviation %'] = spread.where(~is_eur, 0.0)
+        if missing_only and f'{leg} Price EUR' in df.columns:
+            existing = pd.to_numeric(df[f'{leg} Price EUR'], errors='coerce')
+            known |= existing.notna()
+            price = existing.fillna(price)
+        df[f'{leg} Price EUR'] = price
+        df[f'{leg} Value EUR'] = amounts * price
+        unknown += int((leg_pairs(df, leg).notna() & timestamps_ms.notna() & ~known).sum())
+    return unknown
+
+
+def unresolved_report(df, timestamps_ms, quote='EUR'):
+    """Jambes hors EUR restées sans prix, par devise : DataFrame (Currency, Count, First, Last)"""
+    frames = []
+    for leg in ('Sent', 'Received'):
+        pairs = leg_pairs(df, leg, quote)
+        if f'{leg} Price EUR' not in df.columns:
+            continue
+        missing = pairs.notna() & timestamps_ms.notna() & pd.to_numeric(df[f'{leg} Price EUR'], errors='coerce').isna()
+        frames.append(pd.DataFrame({
+            'Currency': df.loc[missing, f'{leg} Currency'].astype(str).str.upper(),
+            'Timestamp': timestamps_ms[missing].astype('int64'),
+        }))
+    if not frames:
+        return pd.DataFrame(columns=['Currency', 'Count', 'First', 'Last'])
+    missing = pd.concat(frames, ignore_index=True)
+    report = missing.groupby('Currency')['Timestamp'].agg(['count', 'min', 'max']).reset_index()
+    report.columns = ['Currency', 'Count', 'First', 'Last']
+    for col in ('First', 'Last'):
+        report[col] = pd.to_datetime(report[col], unit='ms', utc=True).dt.tz_convert(LOCAL_TIMEZONE)
+    return report.sort_values('Count', ascending=False).reset_index(drop=True)
@@ -0,0 +1,187 @@
+from collections import namedtuple
+import pandas as pd
+from price_store import INTERVAL_MS
+from normalize import EPOCH_MS_COLUMN, to_epoch_ms
+from pair_index import filter_needs
+
+# Nombre maximal de bougies renvoyées par un appel klines
+KLINES_PAGE_SIZE = 1000
+
+# Résolutions de prix proposées : bougies minute (prix exact), heure ou jour (récupérées en bloc)
+RESOLUTIONS = ['1m', '1h', '1d']
+DEFAULT_RESOLUTION = '1m'
+
+# Fenêtre de bougies à récupérer en un seul appel : minutes = ouvertures de bougies réellement utilisées
+KlineWindow = namedtuple('KlineWindow', ['symbol', 'start_ms', 'limit', 'minutes', 'interval'], defaults=[DEFAULT_RESOLUTION])
+
+
+def compute_timestamps_ms(df):
+    """Timestamps ms (Int64, <NA> si date invalide) de toutes les lignes, heure de Paris si sans fuseau"""
+    if EPOCH_MS_COLUMN in df.columns:
+        # Colonne calculée au chargement (normalize_dates) : réutilisée telle quelle
+        return df[EPOCH_MS_COLUMN]
+    date_col = 'Date' if 'Date' in df.columns else 'datetime'
+    if date_col not in df.columns:
+        return pd.Series(pd.NA, index=df.index, dtype='Int64')
+    return to_epoch_ms(df[date_col])
+
+
+def leg_pairs(df, leg, quote='EUR'):
+    """Paire à interroger pour chaque ligne d'une jambe (Sent/Received), <NA> si aucun prix n'est à chercher"""
+    cur_col, amt_col = f'{leg} Currency', f'{leg} Amount'
+    if cur_col not in df.columns or amt_col not in df.columns:
+        return pd.Series(pd.NA, index=df.index, dtype='object')
+    currencies = df[cur_col].astype(str).str.upper()
+    amounts = pd.to_numeric(df[amt_col], errors='coerce')
+    needed = amounts.notna() & ~currencies.isin(['', 'NAN', 'NONE', quote])
+    return (currencies + quote).where(needed, pd.NA)
+
+
+def parse_resolution_policy(text):
+    """
+    Politique de résolution par type de ligne, ex : "1m" ou "Reward=1d, Staking=1d, default=1m".
+    Retourne une résolution seule ou un dict {Type ou Label: résolution, 'default': résolution}.
+    """
+    text = (text or '').strip()
+    if '=' not in text:
+        resolution = text or DEFAULT_RESOLUTION
+        if resolution not in RESOLUTIONS:
+            raise ValueError(f"Résolution inconnue : {resolution} (valeurs possibles : {', '.join(RESOLUTIONS)})")
+        return resolution
+    policy = {}
+    for item in text.split(','):
+        key, _, resolution = item.partition('=')
+        key, resolution = key.strip(), resolution.strip()
+        if not key or resolution not in RESOLUTIONS:
+            raise ValueError(f"Règle de résolution invalide : {item.strip()}")
+        policy[key] = resolution
+    return policy
+
+
+def row_intervals(df, resolution=DEFAULT_RESOLUTION):
+    """
+    Résolution de prix de chaque ligne. resolution : '1m', '1h', '1d' ou dict de politique
+    (voir parse_resolution_policy) ; une règle sur le Label l'emporte sur une règle sur le Type.
+    """
+    if not isinstance(resolution, dict):
+        return pd.Series(resolution, index=df.index, dtype='object')
+    intervals = pd.Series(resolution.get('default', DEFAULT_RESOLUTION), index=df.index, dtype='object')
+    for col in ('Type', 'Label'):
+        if col not in df.columns:
+            continue
+        values = df[col].astype(str)
+        for key, interval in resolution.items():
+            if key != 'default':
+                intervals[values == key] = interval
+    return intervals
+
+
+def collect_price_needs(df, timestamps_ms, quote='EUR', missing_only=False, interval=DEFAULT_RESOLUTION):
+    """
+    Retourne {paire: ensemble des ouvertures de bougies `interval`} pour les jambes Sent/Received hors EUR.
+    missing_only : ignore les jambes dont la colonne Price EUR est déjà renseignée.
+    """
+    needs = {}
+    step = INTERVAL_MS[interval]
+    minutes = timestamps_ms - timestamps_ms % step
+    for leg in ('Sent', 'Received'):
+        pairs = leg_pairs(df, leg, quote)
+        if missing_only and f'{leg} Price EUR' in df.columns:
+            pairs = pairs.where(pd.to_numeric(df[f'{leg} Price EUR'], errors='coerce').isna(), pd.NA)
+        frame = pd.DataFrame({'pair': pairs, 'minute': minutes}).dropna().drop_duplicates()
+        for pair, group in frame.groupby('pair'):
+            needs.setdefault(pair, set()).update(group['minute'].astype('int64').tolist())
+    return needs
+
+
+def plan_kline_windows(needs, store=None, page_size=KLINES_PAGE_SIZE, interval=DEFAULT_RESOLUTION):
+    """
+    Regroupe les bougies nécessaires par paire en fenêtres tenant dans une page de bougies.
+    Les bougies déjà présentes dans le store ne sont pas replanifiées.
+    """
+    step = INTERVAL_MS[interval]
+    windows = []
+    for symbol in sorted(needs):
+        minutes = sorted(needs[symbol])
+        if store is not None and minutes:
+            known = store.known_times(symbol, minutes[0], minutes[-1], interval)
+            minutes = [m for m in minutes if m not in known]
+        current = []
+        for minute in minutes:
+            if current and minute >= current[0] + page_size * step:
+                windows.append(_make_window(symbol, current, interval))
+                current = []
+            current.append(minute)
+        if current:
+            windows.append(_make_window(symbol, current, interval))
+    return windows
+
+
+def _make_window(symbol, minutes, interval=DEFAULT_RESOLUTION):
+    limit = (minutes[-1] - minutes[0]) // INTERVAL_MS[interval] + 1
+    return KlineWindow(symbol, minutes[0], int(limit), tuple(minutes), interval)
+
+
+# Estimation d'un enrichissement sans appel réseau : calls = {mode de regroupement: appels HTTP}
+RequestEstimate = namedtuple('RequestEstimate', ['rows', 'lookups', 'cached', 'skipped', 'calls', 'requests_per_minute'])
+# Modes de regroupement comparés par l'estimation, avec leur libellé
+BATCHING_MODES = [
+    ('lookup', "un appel par prix (sans regroupement)"),
+    ('1m', "fenêtres de bougies minute (1m)"),
+    ('1h', "bougies heure (1h)"),
+    ('1d', "bougies jour (1d)"),
+    ('policy', "résolution choisie"),
+]
+
+
+def estimate_requests(df, timestamps_ms, store=None, resolution=DEFAULT_RESOLUTION, requests_per_minute=500,
+                      pair_index=None):
+    """
+    Plan à blanc d'un enrichissement : prix distincts (paire, minute), prix déjà en cache, prix écartés
+    (paire inexistante ou non cotée d'après l'index local) et appels HTTP de chaque mode de regroupement.
+    Les routes intermédiaires, connues seulement à l'exécution, ne sont pas comptées.
+    """
+    def windows(frame, ts, interval):
+        needs, skipped = filter_needs(collect_price_needs(frame, ts, interval=interval), pair_index, interval=interval)
+        return plan_kline_windows(needs, store, interval=interval), needs, skipped
+
+    minute_windows, needs, skipped = windows(df, timestamps_ms, DEFAULT_RESOLUTION)
+    lookups = sum(len(m) for m in needs.values())
+    uncached = sum(len(w.minutes) for w in minute_windows)
+    calls = {'lookup': uncached, '1m': len(minute_windows)}
+    for interval in RESOLUTIONS[1:]:
+        calls[interval] = len(windows(df, timestamps_ms, interval)[0])
+    intervals = row_intervals(df, resolution)
+    calls['policy'] = 0
+    for interval in RESOLUTIONS:
+        mask = (intervals == interval).to_numpy()
+        if mask.all():
+            calls['policy'] = calls[interval]
+        elif mask.any():
+            calls['policy'] += len(windows(df[mask], timestamps_ms[mask], interval)[0])
+    return RequestEstimate(len(df), lookups, lookups - uncached, skipped, calls, requests_per_minute)
+
+
+def format_duration(seconds):
+    """Durée lisible : < 1 s, 45 s, 12 min 30 s, 2 h 05"""
+    if 0 < seconds < 1:
+        return "< 1 s"
+    seconds = int(round(seconds))
+    if seconds < 60:
+        return f"{seconds} s"
+    if seconds < 3600:
+        return f"{seconds // 60} min {seconds % 60:02d} s"
+    return f"{seconds // 3600} h {seconds % 3600 // 60:02d}"
+
+
+def format_estimate(estimate):
+    """Texte du plan à blanc : un mode de regroupement par ligne, avec la durée au débit indiqué"""
+    rate = max(1, estimate.requests_per_minute)
+    lines = [f"Plan : {estimate.rows} lignes, {estimate.lookups} prix distincts (paire, minute), "
+             f"{estimate.cached} déjà en cache, {estimate.skipped} écartés (paire inexistante ou non cotée)",
+             f"Appels HTTP estimés à {rate} requêtes/minute :"]
+    for mode, label in BATCHING_MODES:
+        calls = estimate.calls[mode]
+        lines.append(f"  {label} : {calls} appels, {format_duration(calls * 60 / rate)}")
+    lines.append("Hors routes intermédiaires (devises sans paire EUR), déterminées pendant l'enrichissement.")
+    return "\n".join(lines)
@@ -0,0 +1,120 @@
+import json
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
+from binance_client import BinancePriceClient, PairNotFoundError, PriceClientError, TransientPriceError
+from price_store import INTERVAL_MS
+
+
+class PriceProvider(ABC):
+    """
+    Interface des sources de bougies acceptées par l'enrichissement et la correction
+    (paramètre provider) : klines() au format de l'API Binance, exchange_info() facultatif.
+    rate_limiter (limiteur de l'exécution, passé à chaque appel) reçoit les en-têtes de poids des sources
+    HTTP, il est ignoré ailleurs.
+    """
+    rate_limiter = None
+    request_count = 0
+
+    @abstractmethod
+    def klines(self, symbol, start_ms, limit=1000, interval='1m', end_ms=None, rate_limiter=None):
+        """Bougies [open_time, open, high, low, close, ...] comme BinancePriceClient.klines"""
+
+    def exchange_info(self, rate_limiter=None):
+        raise PriceClientError("Liste des paires indisponible pour cette source")
+
+    def close(self):
+        pass
+
+
+# L'API Binance en direct : le client HTTP implémente déjà l'interface
+LiveBinanceProvider = BinancePriceClient
+
+
+class StorePriceProvider(PriceProvider):
+    """Bougies servies depuis un cache de prix local (aucun appel réseau)"""
+    def __init__(self, store):
+        self.store = store
+        self.request_count = 0
+
+    def klines(self, symbol, start_ms, limit=1000, interval='1m', end_ms=None, rate_limiter=None):
+        self.request_count += 1
+        step = INTERVAL_MS[interval]
+        if start_ms is None:
+            end = end_ms
+            start = end - (limit - 1) * step
+        else:
+            start = start_ms
+            end = start + (limit - 1) * step if end_ms is None else min(end_ms, start + (limit - 1) * step)
+        candles = self.store.load_candles(symbol, start, end, interval)
+        return [[t, str(close), str(high), str(low), str(close)] for t, close, high, low in candles][-int(limit):]
+
+
+class RecordReplayProvider(PriceProvider):
+    """
+    Enregistre les réponses d'une autre source dans un fichier fixture (JSON), ou les rejoue sans réseau.
+    Avec `provider`, chaque réponse est transmise puis mémorisée ; sans, elles sont servies depuis la fixture
+    après `latency` secondes (pour simuler l'API et mesurer le débit de l'enrichissement de façon reproductible).
+    """
+    def __init__(self, fixture_path, provider=None, latency=0.0):
+        self.fixture_path = fixture_path
+        self.provider = provider
+        self.latency = latency
+        self.request_count = 0
+        self._lock = threading.Lock()
+        self._responses = {}
+        if os.path.exists(fixture_path):
+            with open(fixture_path, encoding='utf-8') as f:
+                self._responses = json.load(f)
+
+    @property
+    def recording(self):
+        return self.provider is not None
+
+    # En enregistrement, le limiteur de l'exécution est transmis à la vraie source (en-têtes de poids)
+    def klines(self, symbol, start_ms, limit=1000, interval='1m', end_ms=None, rate_limiter=None):
+        key = json.dumps(['klines', symbol, start_ms, int(limit), interval, end_ms])
+        return self._call(key, lambda: self.provider.klines(symbol, start_ms, limit, interval, end_ms=end_ms,
+                                                            rate_limiter=rate_limiter))
+
+    def exchange_info(self, rate_limiter=None):
+        return self._call(json.dumps(['exchange_info']), lambda: self.provider.exchange_info(rate_limiter=rate_limiter))
+
+    def _call(self, key, fetch):
+        with self._lock:
+            self.request_count += 1
+        if not self.recording:
+            if self.latency:
+                time.sleep(self.latency)
+            entry = self._responses.get(key)
+            if entry is None:
+                raise PriceClientError(f"Réponse absente de la fixture : {key}")
+            if entry.get('error') == 'pair_not_found':
+                raise PairNotFoundError(entry.get('message', key))
+            return entry['data']
+        try:
+            data = fetch()
+        except PairNotFoundError as e:
+            with self._lock:
+                self._responses[key] = {'error': 'pair_not_found', 'message': str(e)}
+            raise
+        except TransientPriceError:
+            # Les échecs temporaires ne sont pas rejoués
+            raise
+        with self._lock:
+            self._responses[key] = {'data': data}
+        return data
+
+    def save(self):
+        """Écrit la fixture (atomiquement)"""
+        with self._lock:
+            tmp_path = self.fixture_path + '.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self._responses, f)
+            os.replace(tmp_path, self.fixture_path)
+
+    def close(self):
+        if self.recording:
+            self.save()
+            self.provider.close()
@@ -0,0 +1,193 @@
+from collections import deque, namedtuple
+import numpy as np
+import pandas as pd
+from async_fetcher import DEFAULT_CONCURRENCY, fetch_windows_concurrently, fetch_kline_window
+from pair_index import NegativeCache, filter_needs
+from price_planner import plan_kline_windows
+from price_store import INTERVAL_MS
+from rate_limiter import AdaptiveRateLimiter
+
+# Devises de cotation utilisées comme intermédiaires, par ordre de préférence
+ROUTING_QUOTES = ['EUR', 'USDT', 'BUSD', 'FDUSD', 'BTC', 'BNB']
+# Paires (base, cotation) reliant les devises intermédiaires entre elles et à l'EUR
+BRIDGE_PAIRS = [
+    ('EUR', 'USDT'), ('EUR', 'BUSD'), ('BTC', 'EUR'), ('BNB', 'EUR'),
+    ('FDUSD', 'USDT'), ('BTC', 'USDT'), ('BNB', 'USDT'), ('BNB', 'BTC'),
+    ('BTC', 'BUSD'), ('BTC', 'FDUSD'),
+]
+DEFAULT_RATE_PER_MINUTE = 500
+
+# Une étape de route : prix de la devise courante dans la suivante = close de `pair` (inversé si inverse=True)
+Leg = namedtuple('Leg', ['pair', 'inverse'])
+
+
+def _bridge_paths(bridges, target='EUR'):
+    """Plus court chemin de chaque devise intermédiaire vers `target` : {devise: [(Leg, devise atteinte)]}"""
+    graph = {}
+    for base, quote in bridges:
+        # base -> quote : close de BASEQUOTE ; quote -> base : inverse
+        graph.setdefault(base, []).append((quote, Leg(base + quote, False)))
+        graph.setdefault(quote, []).append((base, Leg(base + quote, True)))
+    paths = {target: []}
+    queue = deque([target])
+    while queue:
+        node = queue.popleft()
+        for neighbour, leg in graph.get(node, []):
+            if neighbour not in paths:
+                # Parcours depuis la cible : l'étape neighbour -> node est l'inverse de node -> neighbour
+                paths[neighbour] = [(Leg(leg.pair, not leg.inverse), node)] + paths[node]
+                queue.append(neighbour)
+    return paths
+
+
+class PriceRouter:
+    """
+    Prix EUR de n'importe quelle devise via un graphe de paires Binance (EUR, USDT, BUSD, FDUSD, BTC, BNB).
+    Les routes de chaque devise sont calculées une fois et essayées de la moins chère à la plus chère ;
+    chaque étape est récupérée en série pour toutes les lignes à la fois, et les étapes communes
+    (EURUSDT, BTCEUR...) sont partagées par toutes les devises grâce au store.
+    """
+    def __init__(self, store, client=None, rate_limiter=None, concurrency=DEFAULT_CONCURRENCY,
+                 offline=False, log_callback=None, quotes=ROUTING_QUOTES, bridges=BRIDGE_PAIRS, quote='EUR',
+                 pair_index=None, negative_cache=None, counter_callback=None, interval='1m'):
+        self.store = store
+        self.client = client
+        self.rate_limiter = rate_limiter if rate_limiter is not None else AdaptiveRateLimiter(DEFAULT_RATE_PER_MINUTE)
+        self.concurrency = concurrency
+        self.offline = offline
+        self.log_callback = log_callback
+        # Index des paires existantes (routes impossibles écartées) et absences constatées pendant l'exécution
+        self.pair_index = pair_index
+        self.negative_cache = negative_cache if negative_cache is not None else NegativeCache()
+        self.counter_callback = counter_callback
+        # Résolution des bougies des étapes : minute, ou heure/jour pour les lignes à prix approché
+        self.interval = interval
+        self.quotes = list(quotes)
+        self.quote = quote
+        self._paths = _bridge_paths(bridges, quote)
+        self._bridges = set(bridges)
+        self._routes = {}
+        self._labels = {}
+
+    def routes(self, asset):
+        """Routes (tuples de Leg) de `asset` vers l'EUR, de la moins chère (moins d'étapes) à la plus chère"""
+        if asset not in self._routes:
+            candidates = []
+            if asset in self._paths and asset != self.quote:
+                candidates.append(self._paths[asset])
+            for quote in self.quotes:
+                # (quote, asset) déjà dans le graphe : la paire ASSETQUOTE n'existe pas, la route directe la couvre
+                if quote == asset or quote not in self._paths or (quote, asset) in self._bridges:
+                    continue
+                path = self._paths[quote]
+                # Inutile de repasser par la devise de départ
+                if any(node == asset for _, node in path):
+                    continue
+                candidates.append([(Leg(asset + quote, False), quote)] + path)
+            routes = []
+            # Tri stable : à nombre d'étapes égal, l'ordre de préférence des cotations est conservé
+            for path in sorted(candidates, key=len):
+                route = tuple(leg for leg, _ in path)
+                if self.pair_index is not None and any(self.pair_index.exists(leg.pair) is False for leg in route):
+                    continue
+                if route not in routes:
+                    routes.append(route)
+                    self._labels[route] = ' -> '.join([asset] + [node for _, node in path])
+            self._routes[asset] = routes
+        return self._routes[asset]
+
+    def route_label(self, route):
+        """Libellé lisible d'une route, ex : FET -> USDT -> EUR"""
+        return self._labels.get(route, ' / '.join(leg.pair for leg in route))
+
+    def eur_prices(self, assets, timestamps_ms):
+        """
+        Prix EUR de chaque ligne (assets : devise ou <NA>, timestamps_ms : Int64).
+        Retourne une Series float alignée sur `assets`, NaN si aucune route n'a de prix.
+        """
+        assets = assets.astype('string').str.upper()
+        prices = pd.Series(np.nan, index=assets.index, dtype='float64')
+        prices[assets == self.quote] = 1.0
+        remaining = assets.notna() & (assets != self.quote) & timestamps_ms.notna()
+        minutes = (timestamps_ms - timestamps_ms % INTERVAL_MS[self.interval])
+        depth = 0
+        while remaining.any():
+            rows = pd.DataFrame({'asset': assets[remaining], 'minute': minutes[remaining].astype('int64')})
+            rows['route'] = rows['asset'].map(lambda a: self.routes(a)[depth] if depth < len(self.routes(a)) else None)
+            rows = rows[rows['route'].notna()]
+            if rows.empty:
+                break
+            resolved = self._resolve(rows)
+            prices[resolved.index] = resolved
+            if self.log_callback:
+                found = resolved.notna()
+                for (asset, route), group in rows[found].groupby(['asset', 'route']):
+                    self.log_callback(f"{self.route_label(route)} : {len(group)} prix")
+            remaining &= prices.isna()
+            depth += 1
+        return prices
+
+    def _resolve(self, rows):
+        # Produit des étapes, étape par étape : l'étape suivante n'est récupérée que pour les lignes
+        # dont les étapes précédentes ont un prix
+        price = pd.Series(1.0, index=rows.index)
+        for step in range(rows['route'].map(len).max()):
+            legs = rows['route'].map(lambda r: r[step] if step < len(r) else None)
+            active = legs.notna() & price.notna()
+            if not active.any():
+                continue
+            pairs = legs[active].map(lambda leg: leg.pair)
+            self._fetch({pair: set(group.tolist()) for pair, group in rows.loc[active, 'minute'].groupby(pairs)})
+            for pair, index in pairs.groupby(pairs).groups.items():
+                closes = self._series(pair, rows.loc[index, 'minute'])
+                inverse = legs[index].map(lambda leg: leg.inverse).to_numpy(dtype=bool)
+                factor = np.where(inverse, 1.0 / closes.to_numpy(), closes.to_numpy())
+                price[index] = price[index] * factor
+        return price
+
+    def _series(self, pair, minutes):
+        """Close de `pair` à chaque minute (NaN si inconnu ou absent chez Binance)"""
+        candles = self.store.load_series(pair, minutes.min(), minutes.max(), self.interval)
+        closes = pd.Series(candles['close'].to_numpy(), index=candles['open_time'].to_numpy())
+        return minutes.map(closes).astype('float64')
+
+    def _fetch(self, needs):
+        # Une série par paire : fenêtres de bougies planifiées, les minutes déjà en cache sont ignorées
+        if self.offline:
+            return
+        needs, _ = filter_needs(needs, self.pair_index, self.negative_cache, self.interval)
+        windows = plan_kline_windows(needs, self.store, interval=self.interval)
+        if not windows:
+            return
+        client = self.client
+        fetch_windows_concurrently(
+            windows,
+            lambda window: fetch_kline_window(window, self.store, client, self.negative_cache),
+            self.rate_limiter,
+            concurrency=self.concurrency,
+            log_callback=self.log_callback,
+            counter_callback=self.counter_callback
+        )
+
+
+def fill_missing_prices(df, timestamps_ms, router, include_zero=False):
+    """
+    Repli par routes intermédiaires pour les jambes hors EUR encore sans prix (ou à 0 si include_zero).
+    Remplit Price/Value EUR en place et retourne {jambe: (prix trouvés, prix manquants)}.
+    """
+    counts = {}
+    for leg in ('Sent', 'Received'):
+        cur_col, amt_col, price_col = f'{leg} Currency', f'{leg} Amount', f'{leg} Price EUR'
+        if cur_col not in df.columns or amt_col not in df.columns:
+            continue
+        amounts = pd.to_numeric(df[amt_col], errors='coerce')
+        currencies = df[cur_col].astype('string').str.upper().str.strip()
+        current = pd.to_numeric(df[price_col], errors='coerce') if price_col in df.columns else pd.Series(np.nan, index=df.index)
+        missing = current.isna() | ((current == 0) if include_zero else False)
+        to_fix = currencies.notna() & (currencies != '') & (currencies != router.quote) & amounts.notna() & missing
+        prices = router.eur_prices(currencies.where(to_fix), timestamps_ms)
+        fixed = to_fix & prices.notna()
+        df.loc[fixed, price_col] = prices[fixed]
+        df.loc[fixed, f'{leg} Value EUR'] = amounts[fixed] * prices[fixed]
+        counts[leg] = (int(fixed.sum()), int(to_fix.sum()))
+    return counts
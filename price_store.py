@@ -0,0 +1,180 @@
+import os
+import sqlite3
+import threading
+from pathlib import Path
+import pandas as pd
+
+# Nombre maximal de bougies conservées avant éviction des plus anciennes
+DEFAULT_MAX_ENTRIES = 10_000_000
+MINUTE_MS = 60_000
+# Durée d'une bougie par intervalle Binance
+INTERVAL_MS = {'1m': MINUTE_MS, '1h': 60 * MINUTE_MS, '1d': 24 * 60 * MINUTE_MS}
+
+
+def default_cache_dir():
+    """Répertoire de cache de l'application (surchargeable via CRYPTO_VIEWER_CACHE_DIR)"""
+    return os.environ.get('CRYPTO_VIEWER_CACHE_DIR') or os.path.join(str(Path.home()), '.crypto_viewer')
+
+
+def floor_minute(timestamp_ms):
+    """Ramène un timestamp (ms) au début de sa minute"""
+    return int(timestamp_ms) - int(timestamp_ms) % MINUTE_MS
+
+
+class PriceStore:
+    """
+    Cache persistant (SQLite) des prix Binance, clé = (symbol, intervalle, ouverture de la bougie).
+    Une entrée avec un prix NULL signifie "pas de prix chez Binance" (paire inexistante ou pas de cotation).
+    """
+    def __init__(self, path=None, max_entries=DEFAULT_MAX_ENTRIES):
+        if path is None:
+            path = os.path.join(default_cache_dir(), 'prices.sqlite')
+        if path != ':memory:':
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._writes_since_check = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS prices ("
+            " symbol TEXT NOT NULL,"
+            " interval TEXT NOT NULL DEFAULT '1m',"
+            " open_time INTEGER NOT NULL,"
+            " close REAL, high REAL, low REAL,"
+            " PRIMARY KEY (symbol, interval, open_time))"
+        )
+        self._conn.commit()
+
+    def lookup(self, symbol, timestamp_ms, interval='1m'):
+        """Retourne (trouvé, prix). Un prix None avec trouvé=True est un échec déjà connu."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT close FROM prices WHERE symbol=? AND interval=? AND open_time=?",
+                (symbol, interval, int(timestamp_ms))
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return False, None
+            self.hits += 1
+        return True, row[0]
+
+    def known_times(self, symbol, start_ms, end_ms, interval='1m'):
+        """Ensemble des ouvertures de bougies déjà en cache entre start_ms et end_ms (inclus)"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT open_time FROM prices WHERE symbol=? AND interval=? AND open_time BETWEEN ? AND ?",
+                (symbol, interval, int(start_ms), int(end_ms))
+            ).fetchall()
+        return {r[0] for r in rows}
+
+    def load_series(self, symbol, start_ms, end_ms, interval='1m'):
+        """
+        Bougies en cache entre start_ms et end_ms : DataFrame (open_time, close, high, low) trié,
+        prix NaN si absence connue ; high/low valent close s'ils n'ont pas été enregistrés.
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT open_time, close, COALESCE(high, close), COALESCE(low, close) FROM prices"
+                " WHERE symbol=? AND interval=? AND open_time BETWEEN ? AND ? ORDER BY open_time",
+                (symbol, interval, int(start_ms), int(end_ms))
+            ).fetchall()
+        series = pd.DataFrame(rows, columns=['open_time', 'close', 'high', 'low'])
+        series['open_time'] = series['open_time'].astype('int64')
+        for col in ('close', 'high', 'low'):
+            series[col] = series[col].astype('float64')
+        return series
+
+    def load_candles(self, symbol, start_ms, end_ms, interval='1m'):
+        """Bougies connues (prix non NULL) entre start_ms et end_ms : [(open_time, close, high, low)]"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT open_time, close, COALESCE(high, close), COALESCE(low, close) FROM prices"
+                " WHERE symbol=? AND interval=? AND open_time BETWEEN ? AND ? AND close IS NOT NULL ORDER BY open_time",
+                (symbol, interval, int(start_ms), int(end_ms))
+            ).fetchall()
+        return rows
+
+    def record_lookups(self, hits, misses):
+        """Comptabilise des recherches faites en bloc (jointures vectorisées)"""
+        with self._lock:
+            self.hits += int(hits)
+            self.misses += int(misses)
+
+    def put(self, symbol, timestamp_ms, close, high=None, low=None, interval='1m'):
+        """Enregistre une bougie (close=None pour mémoriser une absence de prix)"""
+        self.put_many(symbol, [(timestamp_ms, close, high, low)], interval=interval)
+
+    def put_many(self, symbol, candles, interval='1m'):
+        """Enregistre une liste de tuples (open_time, close, high, low) en une seule transaction"""
+        rows = [(symbol, interval, int(c[0]), c[1], c[2] if len(c) > 2 else None, c[3] if len(c) > 3 else None)
+                for c in candles]
+        if not rows:
+            return
+        with self._lock:
+            # INSERT OR REPLACE attribue un nouveau rowid : l'entrée redevient la plus récente
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO prices (symbol, interval, open_time, close, high, low) VALUES (?, ?, ?, ?, ?, ?)",
+                rows
+            )
+            self._conn.commit()
+            self._writes_since_check += len(rows)
+            if self._writes_since_check >= 10_000 or self._writes_since_check >= self.max_entries:
+                self._evict_locked()
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM prices").fetchone()[0]
+
+    def evict(self):
+        """Supprime les entrées les plus anciennes si la taille dépasse max_entries"""
+        with self._lock:
+            self._evict_locked()
+
+    def _evict_locked(self):
+        self._writes_since_check = 0
+        size = self._conn.execute("SELECT COUNT(*) FROM prices").fetchone()[0]
+        if size <= self.max_entries:
+            return
+        # On redescend à 90% de la limite pour ne pas évincer à chaque écriture
+        excess = size - int(self.max_entries * 0.9)
+        self._conn.execute(
+            "DELETE FROM prices WHERE rowid IN (SELECT rowid FROM prices ORDER BY rowid LIMIT ?)",
+            (excess,)
+        )
+        self._conn.commit()
+
+    def stats(self):
+        """Compteurs du cache : hits, misses et nombre d'entrées"""
+        return {'hits': self.hits, 'misses': self.misses, 'size': len(self)}
+
+    def reset_stats(self):
+        with self._lock:
+            self.hits = 0
+            self.misses = 0
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM prices")
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+_default_store = None
+_default_store_lock = threading.Lock()
+
+
+def get_default_store():
+    """Store partagé par l'application, créé à la première utilisation"""
+    global _default_store
+    with _default_store_lock:
+        if _default_store is None:
+            _default_store = PriceStore()
+        return _default_store
@@ -0,0 +1,107 @@
+import asyncio
+import threading
+import time
+from binance_client import KLINES_WEIGHT, WEIGHT_LIMIT_1M
+
+
+class TokenBucket:
+    """
+    Limiteur de débit à jetons, partageable entre threads et coroutines.
+    Chaque requête HTTP consomme un jeton ; le seau se remplit à `rate_per_minute` jetons par minute.
+    """
+    def __init__(self, rate_per_minute, capacity=None):
+        self.rate_per_minute = max(1.0, float(rate_per_minute))
+        # Par défaut on autorise une rafale d'une seconde de débit
+        self.capacity = capacity if capacity is not None else max(1.0, self.rate_per_minute / 60)
+        self._tokens = self.capacity
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    @property
+    def rate_per_second(self):
+        return self.rate_per_minute / 60
+
+    def set_rate(self, rate_per_minute):
+        with self._lock:
+            self._refill_locked()
+            self.rate_per_minute = max(1.0, float(rate_per_minute))
+
+    def _refill_locked(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate_per_second)
+        self._last = now
+
+    def reserve(self, tokens=1):
+        """Réserve des jetons et retourne le temps d'attente (s) avant de pouvoir les utiliser"""
+        with self._lock:
+            self._refill_locked()
+            self._tokens -= tokens
+            if self._tokens >= 0:
+                return 0.0
+            return -self._tokens / self.rate_per_second
+
+    def acquire(self, tokens=1):
+        wait = self.reserve(tokens)
+        if wait > 0:
+            time.sleep(wait)
+
+    async def acquire_async(self, tokens=1):
+        wait = self.reserve(tokens)
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+
+class AdaptiveRateLimiter(TokenBucket):
+    """
+    TokenBucket ajusté d'après les en-têtes Binance : X-MBX-USED-WEIGHT-1M fixe le débit pour rester
+    juste sous la limite de poids de la minute en cours, un 429/418 suspend les requêtes pendant Retry-After.
+    """
+    def __init__(self, rate_per_minute, weight_limit=WEIGHT_LIMIT_1M, request_weight=KLINES_WEIGHT, target_ratio=0.9, min_rate=10):
+        super().__init__(rate_per_minute)
+        self.weight_limit = weight_limit
+        self.request_weight = request_weight
+        self.target_ratio = target_ratio
+        self.min_rate = min_rate
+        self.max_rate = weight_limit * target_ratio / request_weight
+        self.used_weight = 0
+        self._blocked_until = 0.0
+
+    @property
+    def effective_rate(self):
+        """Débit courant en requêtes/minute (0 pendant une suspension)"""
+        if time.monotonic() < self._blocked_until:
+            return 0.0
+        return self.rate_per_minute
+
+    def observe(self, status_code, headers):
+        """Met à jour le débit à partir d'une réponse HTTP"""
+        if status_code in (418, 429):
+            retry_after = _parse_seconds(headers.get('Retry-After'), default=60.0)
+            with self._lock:
+                self._blocked_until = max(self._blocked_until, time.monotonic() + retry_after)
+                self._tokens = min(self._tokens, 0)
+            self.set_rate(max(self.min_rate, self.rate_per_minute / 2))
+            return
+        used = headers.get('X-MBX-USED-WEIGHT-1M')
+        if used is None:
+            return
+        try:
+            self.used_weight = int(used)
+        except ValueError:
+            return
+        # Le poids est remis à zéro à chaque minute calendaire : on répartit le reste sur les secondes restantes
+        seconds_left = max(1.0, 60 - time.time() % 60)
+        remaining = self.weight_limit * self.target_ratio - self.used_weight
+        allowed = remaining / self.request_weight / seconds_left * 60
+        self.set_rate(min(self.max_rate, max(self.min_rate, allowed)))
+
+    def reserve(self, tokens=1):
+        wait = super().reserve(tokens)
+        return max(wait, self._blocked_until - time.monotonic())
+
+
+def _parse_seconds(value, default):
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        return default
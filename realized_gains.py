@@ -1,10 +1,14 @@
 import os
 import pandas as pd
+from loader import BackgroundLoader
+from schema import concat_frames
+from streaming import aggregate_frames, realized_gains_aggregator
 import tkinter as tk
 from tkinter import filedialog, messagebox, ttk
 from pathlib import Path
 from realized_gains_graph import show_graph_window
 from update_csv import CSVTableViewer
+from reports import read_export_csv, detect_decimal, realized_gains_export
 
 class RealizedGainsViewer:
     def __init__(self, parent_frame, summary_widget):
@@ -65,6 +69,12 @@ class RealizedGainsViewer:
         btn_deselect_all = ttk.Button(list_buttons, text="✗ Tout désélectionner", command=self.deselect_all_files)
         btn_deselect_all.pack(side=tk.LEFT, padx=2)
 
+        # Progression du chargement en arrière-plan
+        self.load_status = ttk.Label(list_buttons, text="")
+        self.load_status.pack(side=tk.LEFT, padx=5)
+        self.loader = BackgroundLoader(self.parent_frame, read_export_csv, self._add_file, self._files_loaded,
+                                       self._show_load_progress)
+
         # Liste des fichiers avec cases à cocher
         self.files_listbox = tk.Listbox(left_frame, selectmode=tk.EXTENDED)
         self.files_listbox.pack(fill=tk.BOTH, expand=True, side=tk.LEFT)
@@ -120,9 +130,7 @@ class RealizedGainsViewer:
         return lb
 
     def detect_decimal(self, filepath):
-        with open(filepath, 'r') as f:
-            sample = f.read(2048)
-            return ',' if sample.count(',') > sample.count('.') else '.'
+        return detect_decimal(filepath)
 
     def load_csv(self):
         """Ouvre la boîte de dialogue pour charger des fichiers CSV"""
@@ -131,26 +139,41 @@ class RealizedGainsViewer:
             filetypes=[("CSV files", "*.csv")],
             title="Sélectionner des fichiers CSV"
         )
-        for path in filepaths:
-            self.load_single_file(path)
+        self.load_files(filepaths)
+
+    def load_files(self, filepaths):
+        """Charge des fichiers CSV en parallèle, hors du thread Tk ; filtres et résumé mis à jour une fois le lot chargé"""
+        self.loader.load([path for path in filepaths if os.path.basename(path) not in self.dataframes])
 
     def load_single_file(self, filepath):
         """Charge un seul fichier CSV"""
-        if filepath not in self.dataframes:
+        if os.path.basename(filepath) not in self.dataframes:
             try:
-                decimal = self.detect_decimal(filepath)
-                df = pd.read_csv(filepath, decimal=decimal)
-                name = os.path.basename(filepath)
-                self.dataframes[name] = df
-                
-                # Ajouter le fichier à la liste avec une case à cocher
-                self.create_checkbox(self.files_listbox, name)
-                
+                self._add_file(filepath, read_export_csv(filepath))
                 self.populate_filters()
                 self.update_summary()
             except Exception as e:
                 messagebox.showerror("Erreur de chargement", str(e))
 
+    def _add_file(self, filepath, df):
+        # Dates déjà converties au chargement (format fixe), réutilisées par les calculs
+        name = os.path.basename(filepath)
+        self.dataframes[name] = df
+        # Ajouter le fichier à la liste avec une case à cocher
+        self.create_checkbox(self.files_listbox, name)
+
+    def _show_load_progress(self, done, total, filepath):
+        self.load_status.config(text=f"Chargement {done}/{total} : {os.path.basename(filepath)}")
+
+    def _files_loaded(self, errors):
+        # Filtres et résumé recalculés une seule fois pour tout le lot
+        self.load_status.config(text="")
+        self.populate_filters()
+        self.update_summary()
+        if errors:
+            messagebox.showerror("Erreur de chargement",
+                                 "\n".join(f"{os.path.basename(path)} : {e}" for path, e in errors))
+
     def create_checkbox(self, parent, filename):
         """Crée une case à cocher pour un fichier"""
         frame = ttk.Frame(parent)
@@ -240,86 +263,10 @@ class RealizedGainsViewer:
             return
 
         try:
-            # Concaténer uniquement les dataframes actifs
-            all_data = pd.concat(self.get_active_dataframes().values(), ignore_index=True)
-            
-            # Convertir les colonnes de dates
-            if 'Acquired' in all_data.columns:
-                all_data['Acquired'] = pd.to_datetime(all_data['Acquired'], errors='coerce')
-            if 'Sold' in all_data.columns:
-                all_data['Sold'] = pd.to_datetime(all_data['Sold'], errors='coerce')
-                all_data['Year'] = all_data['Sold'].dt.year
-
-            # Convertir les colonnes numériques
-            numeric_columns = ['Currency amount', 'Proceeds (EUR)', 'Cost basis (EUR)', 'Gains (EUR)', 'Holding period (Days)']
-            for col in numeric_columns:
-                if col in all_data.columns:
-                    all_data[col] = pd.to_numeric(all_data[col], errors='coerce')
-
-            # Calculer les totaux globaux par devise
+            # Fichiers actifs agrégés un par un, sans les concaténer
+            text = aggregate_frames(self.get_active_dataframes().values(), [realized_gains_aggregator()])[0]
             self.summary.delete("1.0", tk.END)
-            self.summary.insert(tk.END, "=== Gains Réalisés Globaux ===\n\n")
-
-            # Calculer les totaux par devise
-            gains_by_currency = all_data.groupby('Currency name').agg({
-                'Currency amount': 'sum',
-                'Proceeds (EUR)': 'sum',
-                'Cost basis (EUR)': 'sum',
-                'Gains (EUR)': 'sum'
-            }).round(8)
-
-            for currency, row in gains_by_currency.iterrows():
-                self.summary.insert(tk.END, f"{currency}:\n")
-                self.summary.insert(tk.END, f"  Montant: {row['Currency amount']:.8f}\n")
-                self.summary.insert(tk.END, f"  Proceeds: {row['Proceeds (EUR)']:.2f} EUR\n")
-                self.summary.insert(tk.END, f"  Cost Basis: {row['Cost basis (EUR)']:.2f} EUR\n")
-                self.summary.insert(tk.END, f"  Gains: {row['Gains (EUR)']:.2f} EUR\n\n")
-
-            # Calculer les totaux globaux
-            total_proceeds = all_data['Proceeds (EUR)'].sum()
-            total_cost_basis = all_data['Cost basis (EUR)'].sum()
-            total_gains = all_data['Gains (EUR)'].sum()
-
-            self.summary.insert(tk.END, "=== Totaux Globaux ===\n")
-            self.summary.insert(tk.END, f"Total Proceeds: {total_proceeds:.2f} EUR\n")
-            self.summary.insert(tk.END, f"Total Cost Basis: {total_cost_basis:.2f} EUR\n")
-            self.summary.insert(tk.END, f"Total Gains: {total_gains:.2f} EUR\n")
-
-            # Calculer les totaux par année (année basée sur 'Sold')
-            if 'Year' in all_data.columns:
-                self.summary.insert(tk.END, "\n=== Gains par Année (année de cession) ===\n\n")
-                
-                for year in sorted(all_data['Year'].dropna().unique()):
-                    year_data = all_data[all_data['Year'] == year]
-                    
-                    # Calculer les totaux par devise pour cette année
-                    year_gains = year_data.groupby('Currency name').agg({
-                        'Currency amount': 'sum',
-                        'Proceeds (EUR)': 'sum',
-                        'Cost basis (EUR)': 'sum',
-                        'Gains (EUR)': 'sum'
-                    }).round(8)
-                    
-                    self.summary.insert(tk.END, f"\n=== {int(year)} ===\n")
-                    
-                    # Afficher les gains par devise pour cette année
-                    for currency, row in year_gains.iterrows():
-                        self.summary.insert(tk.END, f"{currency}:\n")
-                        self.summary.insert(tk.END, f"  Montant: {row['Currency amount']:.8f}\n")
-                        self.summary.insert(tk.END, f"  Proceeds: {row['Proceeds (EUR)']:.2f} EUR\n")
-                        self.summary.insert(tk.END, f"  Cost Basis: {row['Cost basis (EUR)']:.2f} EUR\n")
-                        self.summary.insert(tk.END, f"  Gains: {row['Gains (EUR)']:.2f} EUR\n\n")
-                    
-                    # Afficher les totaux pour cette année
-                    year_total_proceeds = year_data['Proceeds (EUR)'].sum()
-                    year_total_cost_basis = year_data['Cost basis (EUR)'].sum()
-                    year_total_gains = year_data['Gains (EUR)'].sum()
-                    
-                    self.summary.insert(tk.END, f"Totaux {int(year)}:\n")
-                    self.summary.insert(tk.END, f"  Proceeds: {year_total_proceeds:.2f} EUR\n")
-                    self.summary.insert(tk.END, f"  Cost Basis: {year_total_cost_basis:.2f} EUR\n")
-                    self.summary.insert(tk.END, f"  Gains: {year_total_gains:.2f} EUR\n")
-
+            self.summary.insert(tk.END, text)
         except Exception as e:
             messagebox.showerror("Erreur de calcul", f"Une erreur est survenue lors du calcul des gains :\n{str(e)}")
 
@@ -330,99 +277,9 @@ class RealizedGainsViewer:
             return
 
         try:
-            all_data = pd.concat(self.get_active_dataframes().values(), ignore_index=True)
-            # Convertir les colonnes de dates
-            if 'Acquired' in all_data.columns:
-                all_data['Acquired'] = pd.to_datetime(all_data['Acquired'], errors='coerce')
-            if 'Sold' in all_data.columns:
-                all_data['Sold'] = pd.to_datetime(all_data['Sold'], errors='coerce')
-                all_data['Year'] = all_data['Sold'].dt.year
-                all_data['YearMonth'] = all_data['Sold'].dt.strftime('%Y-%m')
-
-            # Convertir les colonnes numériques
-            numeric_columns = ['Currency amount', 'Proceeds (EUR)', 'Cost basis (EUR)', 'Gains (EUR)', 'Holding period (Days)']
-            for col in numeric_columns:
-                if col in all_data.columns:
-                    all_data[col] = pd.to_numeric(all_data[col], errors='coerce')
-
+            text = aggregate_frames(self.get_active_dataframes().values(), [realized_gains_aggregator(monthly=True)])[0]
             self.summary.delete("1.0", tk.END)
-            self.summary.insert(tk.END, "=== Gains Réalisés Globaux ===\n\n")
-
-            # Totaux globaux par devise
-            gains_by_currency = all_data.groupby('Currency name').agg({
-                'Currency amount': 'sum',
-                'Proceeds (EUR)': 'sum',
-                'Cost basis (EUR)': 'sum',
-                'Gains (EUR)': 'sum'
-            }).round(8)
-            for currency, row in gains_by_currency.iterrows():
-                self.summary.insert(tk.END, f"{currency}:\n")
-                self.summary.insert(tk.END, f"  Montant: {row['Currency amount']:.8f}\n")
-                self.summary.insert(tk.END, f"  Proceeds: {row['Proceeds (EUR)']:.2f} EUR\n")
-                self.summary.insert(tk.END, f"  Cost Basis: {row['Cost basis (EUR)']:.2f} EUR\n")
-                self.summary.insert(tk.END, f"  Gains: {row['Gains (EUR)']:.2f} EUR\n\n")
-
-            # Totaux globaux
-            total_proceeds = all_data['Proceeds (EUR)'].sum()
-            total_cost_basis = all_data['Cost basis (EUR)'].sum()
-            total_gains = all_data['Gains (EUR)'].sum()
-            self.summary.insert(tk.END, "=== Totaux Globaux ===\n")
-            self.summary.insert(tk.END, f"Total Proceeds: {total_proceeds:.2f} EUR\n")
-            self.summary.insert(tk.END, f"Total Cost Basis: {total_cost_basis:.2f} EUR\n")
-            self.summary.insert(tk.END, f"Total Gains: {total_gains:.2f} EUR\n")
-
-            # Totaux par année
-            if 'Year' in all_data.columns:
-                self.summary.insert(tk.END, "\n=== Gains par Année (année de cession) ===\n\n")
-                for year in sorted(all_data['Year'].dropna().unique()):
-                    year_data = all_data[all_data['Year'] == year]
-                    year_gains = year_data.groupby('Currency name').agg({
-                        'Currency amount': 'sum',
-                        'Proceeds (EUR)': 'sum',
-                        'Cost basis (EUR)': 'sum',
-                        'Gains (EUR)': 'sum'
-                    }).round(8)
-                    self.summary.insert(tk.END, f"\n=== {int(year)} ===\n")
-                    for currency, row in year_gains.iterrows():
-                        self.summary.insert(tk.END, f"{currency}:\n")
-                        self.summary.insert(tk.END, f"  Montant: {row['Currency amount']:.8f}\n")
-                        self.summary.insert(tk.END, f"  Proceeds: {row['Proceeds (EUR)']:.2f} EUR\n")
-                        self.summary.insert(tk.END, f"  Cost Basis: {row['Cost basis (EUR)']:.2f} EUR\n")
-                        self.summary.insert(tk.END, f"  Gains: {row['Gains (EUR)']:.2f} EUR\n\n")
-                    year_total_proceeds = year_data['Proceeds (EUR)'].sum()
-                    year_total_cost_basis = year_data['Cost basis (EUR)'].sum()
-                    year_total_gains = year_data['Gains (EUR)'].sum()
-                    self.summary.insert(tk.END, f"Totaux {int(year)}:\n")
-                    self.summary.insert(tk.END, f"  Proceeds: {year_total_proceeds:.2f} EUR\n")
-                    self.summary.insert(tk.END, f"  Cost Basis: {year_total_cost_basis:.2f} EUR\n")
-                    self.summary.insert(tk.END, f"  Gains: {year_total_gains:.2f} EUR\n")
-
-            # Totaux par mois (année-mois)
-            if 'YearMonth' in all_data.columns:
-                self.summary.insert(tk.END, "\n=== Gains par Mois (année-mois de cession) ===\n\n")
-                for ym in sorted(all_data['YearMonth'].dropna().unique()):
-                    month_data = all_data[all_data['YearMonth'] == ym]
-                    month_gains = month_data.groupby('Currency name').agg({
-                        'Currency amount': 'sum',
-                        'Proceeds (EUR)': 'sum',
-                        'Cost basis (EUR)': 'sum',
-                        'Gains (EUR)': 'sum'
-                    }).round(8)
-                    self.summary.insert(tk.END, f"\n=== {ym} ===\n")
-                    for currency, row in month_gains.iterrows():
-                        self.summary.insert(tk.END, f"{currency}:\n")
-                        self.summary.insert(tk.END, f"  Montant: {row['Currency amount']:.8f}\n")
-                        self.summary.insert(tk.END, f"  Proceeds: {row['Proceeds (EUR)']:.2f} EUR\n")
-                        self.summary.insert(tk.END, f"  Cost Basis: {row['Cost basis (EUR)']:.2f} EUR\n")
-                        self.summary.insert(tk.END, f"  Gains: {row['Gains (EUR)']:.2f} EUR\n\n")
-                    month_total_proceeds = month_data['Proceeds (EUR)'].sum()
-                    month_total_cost_basis = month_data['Cost basis (EUR)'].sum()
-                    month_total_gains = month_data['Gains (EUR)'].sum()
-                    self.summary.insert(tk.END, f"Totaux {ym}:\n")
-                    self.summary.insert(tk.END, f"  Proceeds: {month_total_proceeds:.2f} EUR\n")
-                    self.summary.insert(tk.END, f"  Cost Basis: {month_total_cost_basis:.2f} EUR\n")
-                    self.summary.insert(tk.END, f"  Gains: {month_total_gains:.2f} EUR\n")
-
+            self.summary.insert(tk.END, text)
         except Exception as e:
             messagebox.showerror("Erreur de calcul", f"Une erreur est survenue lors du calcul mensuel des gains :\n{str(e)}")
 
@@ -443,17 +300,8 @@ class RealizedGainsViewer:
             if not filepath:  # L'utilisateur a annulé
                 return
 
-            # Concaténer tous les dataframes actifs
-            all_data = pd.concat(self.get_active_dataframes().values(), ignore_index=True)
-            
-            # Convertir la colonne Acquired en datetime si elle existe
-            if 'Acquired' in all_data.columns:
-                all_data['Acquired'] = pd.to_datetime(all_data['Acquired'], errors='coerce')
-                # Trier par date d'acquisition
-                all_data = all_data.sort_values('Acquired')
-                # Reconvertir en format string pour l'export
-                all_data['Acquired'] = all_data['Acquired'].dt.strftime('%Y-%m-%d %H:%M:%S')
-                all_data['Sold'] = pd.to_datetime(all_data['Sold'], errors='coerce').dt.strftime('%Y-%m-%d %H:%M:%S')
+            # Concaténer tous les dataframes actifs, triés par date d'acquisition
+            all_data = realized_gains_export(concat_frames(self.get_active_dataframes().values()))
 
             # Exporter vers CSV
             all_data.to_csv(filepath, index=False)
@@ -487,7 +335,7 @@ class RealizedGainsViewer:
     def show_graph_window_action(self):
         """Ouvre la fenêtre de graphes dynamiques pour les données chargées"""
         try:
-            all_data = pd.concat(self.get_active_dataframes().values(), ignore_index=True)
+            all_data = concat_frames(self.get_active_dataframes().values())
             show_graph_window(self.parent_frame, all_data)
         except Exception as e:
             messagebox.showerror("Erreur graphique", f"Impossible d'afficher le graphe :\n{str(e)}")
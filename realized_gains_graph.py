@@ -3,6 +3,7 @@ from tkinter import ttk
 import matplotlib.pyplot as plt
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
 import pandas as pd
+from normalize import as_datetime
 import numpy as np
 
 class RealizedGainsGraphWindow(tk.Toplevel):
@@ -20,7 +21,7 @@ class RealizedGainsGraphWindow(tk.Toplevel):
         # Nettoyage et préparation des données
         if 'Sold' not in self.df.columns or 'Currency name' not in self.df.columns or 'Currency amount' not in self.df.columns:
             raise ValueError("Le fichier doit contenir les colonnes 'Sold', 'Currency name', 'Currency amount'")
-        self.df['Sold'] = pd.to_datetime(self.df['Sold'], errors='coerce')
+        self.df['Sold'] = as_datetime(self.df['Sold'])
         self.df = self.df.dropna(subset=['Sold', 'Currency name', 'Currency amount'])
         self.df['Currency amount'] = pd.to_numeric(self.df['Currency amount'], errors='coerce').fillna(0)
         self.df = self.df.sort_values('Sold')
@@ -85,7 +86,7 @@ class RealizedGainsGraphWindow(tk.Toplevel):
             self.canvas.draw()
             return
         # Grouper par date et currency, puis cumul
-        pivot = df.pivot_table(index='Sold', columns='Currency name', values='Currency amount', aggfunc='sum').fillna(0)
+        pivot = df.pivot_table(index='Sold', columns='Currency name', values='Currency amount', aggfunc='sum', observed=True).fillna(0)
         pivot = pivot.sort_index()
         cum = pivot.cumsum()
         for cur in selected_currencies:
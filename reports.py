@@ -0,0 +1,305 @@
+import pandas as pd
+from normalize import as_datetime, normalize_dates
+from load_cache import default_load_cache
+from schema import apply_schema
+
+# Colonnes d'identifiant reconnues pour la validation d'unicité, par ordre de préférence
+ID_COLUMNS = ['Transaction ID', 'ID', 'TransactionID', 'txid', 'TxID']
+REALIZED_SUM_COLUMNS = {'Currency amount': 'sum', 'Proceeds (EUR)': 'sum', 'Cost basis (EUR)': 'sum', 'Gains (EUR)': 'sum'}
+# Clés de regroupement des parts de chaque rapport (voir reduce_parts)
+EUR_TOTALS_KEYS = ['Year']
+REWARDS_KEYS = ['Year', 'Received Currency']
+INCOME_KEYS = ['Year', 'Asset']
+REALIZED_KEYS = ['Year', 'YearMonth', 'Currency name']
+
+
+def detect_decimal(filepath):
+    """Séparateur décimal d'un export : ',' si l'échantillon contient plus de virgules que de points"""
+    with open(filepath, 'r') as f:
+        sample = f.read(2048)
+        return ',' if sample.count(',') > sample.count('.') else '.'
+
+
+def parse_export_csv(filepath):
+    """Analyse un export Binance Tax (transactions, gains réalisés ou revenus) : dates converties, schéma typé"""
+    return apply_schema(normalize_dates(pd.read_csv(filepath, decimal=detect_decimal(filepath)), epoch=False))
+
+
+def read_export_csv(filepath, cache=True):
+    """Lit un export Binance Tax ; un fichier inchangé est relu depuis le cache de chargement"""
+    if not cache:
+        return parse_export_csv(filepath)
+    return default_load_cache().read(filepath, parse_export_csv)
+
+
+def reduce_parts(parts, keys):
+    """
+    Les rapports sont calculés en deux temps : parts (montants par ligne avec leurs clés, réductibles par
+    somme) puis texte. Réduit des parts à une ligne par clé : le texte obtenu est identique, ce qui permet
+    d'agréger bloc par bloc (streaming.py). Les clés manquantes (NaN) sont conservées pour les totaux.
+    """
+    keys = [key for key in keys if key in parts.columns]
+    if not keys:
+        return parts.sum().to_frame().T
+    return parts.groupby(keys, dropna=False, observed=True, sort=False).sum().reset_index()
+
+
+# --- Transactions ---
+
+def eur_masks(all_data):
+    """Achats payés en EUR, dépôts EUR et ventes vers l'EUR"""
+    buy = (all_data['Type'] == 'Buy') & (all_data['Sent Currency'] == 'EUR')
+    deposit = (all_data['Type'] == 'Deposit') & (all_data['Received Currency'] == 'EUR')
+    sell = (all_data['Type'] == 'Sell') & (all_data['Received Currency'] == 'EUR')
+    return buy, deposit, sell
+
+
+def _eur_totals_lines(parts):
+    sent = parts['Buy EUR'].sum()
+    deposited = parts['Deposit EUR'].sum()
+    sold = parts['Sell EUR'].sum()
+    return (f"EUR spent on Buy orders: {sent:.2f} EUR\n"
+            f"EUR received from Deposits: {deposited:.2f} EUR\n"
+            f"EUR received from Sells: {sold:.2f} EUR\n"
+            f"Total EUR to Binance: {sent + deposited:.2f} EUR\n"
+            f"Real EUR to Binance (minus sells): {sent + deposited - sold:.2f} EUR\n\n")
+
+
+def eur_totals_parts(all_data):
+    """Parts des totaux EUR : montant de chaque achat, dépôt et vente en EUR, avec l'année"""
+    buy, deposit, sell = eur_masks(all_data)
+    sent = pd.to_numeric(all_data['Sent Amount'], errors='coerce').fillna(0)
+    received = pd.to_numeric(all_data['Received Amount'], errors='coerce').fillna(0)
+    parts = pd.DataFrame({'Buy EUR': sent.where(buy, 0.0), 'Deposit EUR': received.where(deposit, 0.0),
+                          'Sell EUR': received.where(sell, 0.0)})
+    if 'Date' in all_data.columns:
+        parts['Year'] = as_datetime(all_data['Date']).dt.year
+    return parts
+
+
+def eur_totals_text(parts):
+    text = "\n=== EUR Spending Analysis ===\n\n" + _eur_totals_lines(parts)
+    if 'Year' in parts.columns:
+        text += "=== Yearly Analysis ===\n\n"
+        for year, year_parts in parts.groupby('Year'):
+            text += f"=== {int(year)} ===\n" + _eur_totals_lines(year_parts)
+    return text
+
+
+def eur_totals_report(all_data):
+    """Texte des totaux EUR (achats, dépôts, ventes), globaux puis par année"""
+    return eur_totals_text(eur_totals_parts(all_data))
+
+
+def reward_transactions(all_data):
+    """Réceptions de type Receive avec le label Reward"""
+    return all_data[(all_data['Type'] == 'Receive') & (all_data['Label'] == 'Reward')]
+
+
+def rewards_parts(all_data):
+    """Parts des récompenses : montant reçu et devise de chaque récompense, avec l'année"""
+    reward_data = reward_transactions(all_data)
+    parts = pd.DataFrame({
+        'Received Currency': reward_data['Received Currency'],
+        'Received Amount': pd.to_numeric(reward_data['Received Amount'], errors='coerce').fillna(0),
+    })
+    if 'Date' in all_data.columns:
+        parts['Year'] = as_datetime(reward_data['Date']).dt.year
+    return parts
+
+
+def rewards_text(parts):
+    if parts.empty:
+        return "Aucune récompense trouvée dans les données."
+
+    text = "\n=== Récompenses Globales ===\n"
+    for currency, amount in parts.groupby('Received Currency', observed=True)['Received Amount'].sum().items():
+        text += f"{currency}: {amount:.8f}\n"
+    if 'Year' in parts.columns:
+        text += "\n=== Récompenses par Année ===\n"
+        for year, year_data in parts.groupby('Year'):
+            text += f"\n=== {int(year)} ===\n"
+            for currency, amount in year_data.groupby('Received Currency', observed=True)['Received Amount'].sum().items():
+                text += f"{currency}: {amount:.8f}\n"
+    return text
+
+
+def rewards_report(all_data):
+    """Texte des récompenses reçues par devise, globales puis par année"""
+    return rewards_text(rewards_parts(all_data))
+
+
+def eur_transactions(all_data):
+    """Transactions en EUR (achats, dépôts, ventes) triées par date"""
+    buy, deposit, sell = eur_masks(all_data)
+    eur_data = all_data[buy | deposit | sell].copy()
+    if 'Date' in eur_data.columns:
+        eur_data['Date'] = as_datetime(eur_data['Date'])
+        eur_data = eur_data.sort_values('Date')
+    return eur_data
+
+
+def sorted_reward_transactions(all_data):
+    """Transactions de récompenses triées par date"""
+    reward_data = reward_transactions(all_data).copy()
+    if 'Date' in reward_data.columns:
+        reward_data['Date'] = as_datetime(reward_data['Date'])
+        reward_data = reward_data.sort_values('Date')
+    return reward_data
+
+
+def find_id_column(columns):
+    """Première colonne d'identifiant de ID_COLUMNS présente, None sinon"""
+    return next((col for col in ID_COLUMNS if col in columns), None)
+
+
+def uniqueness_report(final_df):
+    """
+    Texte de la validation d'unicité des transactions.
+    Retourne (texte, nombre de lignes en double), None au lieu du nombre sans colonne d'ID.
+    """
+    found_id_column = find_id_column(final_df.columns)
+    duplicates = None
+    if found_id_column:
+        duplicates = final_df[final_df.duplicated(subset=[found_id_column], keep=False)]
+    return uniqueness_text(found_id_column, final_df.columns, len(final_df), duplicates)
+
+
+def uniqueness_text(found_id_column, columns, total, duplicates):
+    """Texte de la validation d'unicité à partir des lignes en double (toutes leurs occurrences)"""
+    if not found_id_column:
+        text = "❌ Aucune colonne d'ID trouvée dans les données.\nColonnes disponibles :\n"
+        text += ''.join(f"- {col}\n" for col in columns)
+        return text, None
+
+    if duplicates.empty:
+        text = "✅ Toutes les transactions sont uniques !\n\n"
+        text += f"Nombre total de transactions : {total}\n"
+        return text, 0
+
+    text = "⚠️ Des transactions en double ont été trouvées !\n\n"
+    text += f"Nombre total de transactions : {total}\n"
+    text += f"Nombre de transactions en double : {len(duplicates)}\n\n"
+    text += "Détail des doublons :\n" + "-" * 50 + "\n"
+    for tx_id, group in duplicates.groupby(found_id_column):
+        text += f"\nID : {tx_id}\nNombre d'occurrences : {len(group)}\nDétails :\n"
+        for _, row in group.iterrows():
+            text += f"\n  - Date : {row.get('Date', 'N/A')}\n"
+            text += f"    Type : {row.get('Type', 'N/A')}\n"
+            text += f"    Montant : {row.get('Amount', 'N/A')}\n"
+            text += f"    Devise : {row.get('Currency', 'N/A')}\n"
+        text += "-" * 50 + "\n"
+    return text, len(duplicates)
+
+
+# --- Revenus (Income Gains) ---
+
+def _income_lines(parts):
+    gains = parts.groupby('Asset', observed=True).agg({'Amount': 'sum', 'Value (EUR)': 'sum'}).round(8)
+    return ''.join(f"{asset}: {row['Amount']:.8f} (Valeur: {row['Value (EUR)']:.2f} EUR)\n"
+                   for asset, row in gains.iterrows())
+
+
+def income_parts(all_data):
+    """Parts des revenus : montant et valeur EUR de chaque revenu, avec sa devise et l'année"""
+    parts = pd.DataFrame({
+        'Asset': all_data['Asset'],
+        'Amount': pd.to_numeric(all_data['Amount'], errors='coerce'),
+        'Value (EUR)': pd.to_numeric(all_data['Value (EUR)'], errors='coerce'),
+    })
+    if 'Date' in all_data.columns:
+        parts['Year'] = as_datetime(all_data['Date']).dt.year
+    return parts
+
+
+def income_text(parts):
+    text = "=== Gains Globaux ===\n\n" + _income_lines(parts)
+    text += f"\nTotal Value (EUR): {parts['Value (EUR)'].sum():.2f} EUR\n"
+    if 'Year' in parts.columns:
+        text += "\n=== Gains par Année ===\n\n"
+        for year, year_parts in parts.groupby('Year'):
+            text += f"\n=== {int(year)} ===\n" + _income_lines(year_parts)
+            text += f"Total Value (EUR): {year_parts['Value (EUR)'].sum():.2f} EUR\n"
+    return text
+
+
+def income_report(all_data):
+    """Texte des revenus par devise, globaux puis par année"""
+    return income_text(income_parts(all_data))
+
+
+def income_export(all_data):
+    """Revenus triés par date, dates au format AAAA-MM-JJ HH:MM:SS"""
+    all_data = all_data.copy()
+    if 'Date' in all_data.columns:
+        all_data['Date'] = as_datetime(all_data['Date'])
+        all_data = all_data.sort_values('Date')
+        all_data['Date'] = all_data['Date'].dt.strftime('%Y-%m-%d %H:%M:%S')
+    return all_data
+
+
+# --- Gains réalisés ---
+
+def _realized_lines(parts):
+    gains = parts.groupby('Currency name', observed=True).agg(REALIZED_SUM_COLUMNS).round(8)
+    text = ''
+    for currency, row in gains.iterrows():
+        text += f"{currency}:\n"
+        text += f"  Montant: {row['Currency amount']:.8f}\n"
+        text += f"  Proceeds: {row['Proceeds (EUR)']:.2f} EUR\n"
+        text += f"  Cost Basis: {row['Cost basis (EUR)']:.2f} EUR\n"
+        text += f"  Gains: {row['Gains (EUR)']:.2f} EUR\n\n"
+    return text
+
+
+def _realized_totals(parts, label):
+    return (f"Totaux {label}:\n"
+            f"  Proceeds: {parts['Proceeds (EUR)'].sum():.2f} EUR\n"
+            f"  Cost Basis: {parts['Cost basis (EUR)'].sum():.2f} EUR\n"
+            f"  Gains: {parts['Gains (EUR)'].sum():.2f} EUR\n")
+
+
+def realized_gains_parts(all_data):
+    """Parts des gains réalisés : montants de chaque cession, avec sa devise, son année et son mois (AAAAMM)"""
+    parts = pd.DataFrame({'Currency name': all_data['Currency name']})
+    for col in REALIZED_SUM_COLUMNS:
+        parts[col] = pd.to_numeric(all_data[col], errors='coerce')
+    if 'Sold' in all_data.columns:
+        sold = as_datetime(all_data['Sold'])
+        parts['Year'] = sold.dt.year
+        parts['YearMonth'] = sold.dt.year * 100 + sold.dt.month
+    return parts
+
+
+def realized_gains_text(parts, monthly=False):
+    text = "=== Gains Réalisés Globaux ===\n\n" + _realized_lines(parts)
+    text += "=== Totaux Globaux ===\n"
+    text += f"Total Proceeds: {parts['Proceeds (EUR)'].sum():.2f} EUR\n"
+    text += f"Total Cost Basis: {parts['Cost basis (EUR)'].sum():.2f} EUR\n"
+    text += f"Total Gains: {parts['Gains (EUR)'].sum():.2f} EUR\n"
+    if 'Year' in parts.columns:
+        text += "\n=== Gains par Année (année de cession) ===\n\n"
+        for year, year_parts in parts.groupby('Year'):
+            text += f"\n=== {int(year)} ===\n" + _realized_lines(year_parts) + _realized_totals(year_parts, int(year))
+    if monthly and 'YearMonth' in parts.columns:
+        text += "\n=== Gains par Mois (année-mois de cession) ===\n\n"
+        for year_month, month_parts in parts.groupby('YearMonth'):
+            year_month = f"{int(year_month) // 100}-{int(year_month) % 100:02d}"
+            text += f"\n=== {year_month} ===\n" + _realized_lines(month_parts) + _realized_totals(month_parts, year_month)
+    return text
+
+
+def realized_gains_report(all_data, monthly=False):
+    """Texte des gains réalisés par devise : globaux, par année de cession et, si monthly, par mois"""
+    return realized_gains_text(realized_gains_parts(all_data), monthly)
+
+
+def realized_gains_export(all_data):
+    """Gains réalisés triés par date d'acquisition, dates au format AAAA-MM-JJ HH:MM:SS"""
+    all_data = all_data.copy()
+    if 'Acquired' in all_data.columns:
+        all_data['Acquired'] = as_datetime(all_data['Acquired'])
+        all_data = all_data.sort_values('Acquired')
+        all_data['Acquired'] = all_data['Acquired'].dt.strftime('%Y-%m-%d %H:%M:%S')
+        all_data['Sold'] = as_datetime(all_data['Sold']).dt.strftime('%Y-%m-%d %H:%M:%S')
+    return all_data
@@ -0,0 +1,74 @@
+from collections import namedtuple
+import pandas as pd
+from normalize import as_datetime
+
+# Types déclarés d'un export : colonnes de codes (catégorielles), montants float64, dates datetime64
+ExportSchema = namedtuple('ExportSchema', ['signature', 'categories', 'amounts', 'dates'])
+
+# Exports Binance Tax reconnus ; `signature` : colonnes qui identifient le type d'export
+EXPORT_SCHEMAS = {
+    'realized_gains': ExportSchema(
+        signature=['Currency name', 'Proceeds (EUR)'],
+        categories=['Currency name', 'Transaction type', 'Label'],
+        amounts=['Currency amount', 'Proceeds (EUR)', 'Cost basis (EUR)', 'Gains (EUR)'],
+        dates=['Acquired', 'Sold'],
+    ),
+    'income': ExportSchema(
+        signature=['Asset', 'Value (EUR)'],
+        categories=['Asset', 'Transaction Type', 'Label', 'Taxable'],
+        amounts=['Amount', 'Value (EUR)'],
+        dates=['Date'],
+    ),
+    'transactions': ExportSchema(
+        signature=['Type', 'Sent Currency', 'Received Currency'],
+        categories=['Type', 'Label', 'Sent Currency', 'Received Currency', 'Fee Currency'],
+        amounts=['Sent Amount', 'Received Amount', 'Fee Amount',
+                 'Sent Price EUR', 'Sent Value EUR', 'Received Price EUR', 'Received Value EUR'],
+        dates=['Date'],
+    ),
+}
+
+
+def detect_export_kind(columns):
+    """Type d'export ('transactions', 'realized_gains', 'income') d'après ses colonnes, None si inconnu"""
+    columns = set(columns)
+    return next((kind for kind, schema in EXPORT_SCHEMAS.items() if columns.issuperset(schema.signature)), None)
+
+
+def apply_schema(df, kind=None):
+    """
+    Applique (en place) le schéma de l'export, détecté si kind est None : colonnes de codes en category
+    (filtres et regroupements sur des codes entiers), montants en float64 (valeurs illisibles -> NaN),
+    dates en datetime64. Les colonnes absentes sont ignorées ; un export inconnu est laissé tel quel.
+    """
+    kind = kind or detect_export_kind(df.columns)
+    if kind is None:
+        return df
+    schema = EXPORT_SCHEMAS[kind]
+    for col in schema.categories:
+        if col in df.columns:
+            df[col] = df[col].astype('category')
+    for col in schema.amounts:
+        if col in df.columns:
+            df[col] = pd.to_numeric(df[col], errors='coerce').astype('float64')
+    for col in schema.dates:
+        if col in df.columns:
+            df[col] = as_datetime(df[col])
+    return df
+
+
+def concat_frames(frames, ignore_index=True):
+    """
+    pd.concat conservant les colonnes catégorielles : les catégories de chaque colonne sont réunies avant
+    la concaténation (sinon pandas repasse en object dès que deux fichiers n'ont pas les mêmes valeurs).
+    """
+    frames = list(frames)
+    for col in set().union(*(df.columns for df in frames)):
+        columns = [df[col] for df in frames if col in df.columns]
+        if len(columns) < 2 or not all(isinstance(s.dtype, pd.CategoricalDtype) for s in columns):
+            continue
+        # Réunion des valeurs (une colonne vide d'un fichier a des catégories float sans valeur)
+        categories = pd.Index(sorted(set().union(*(s.cat.categories.tolist() for s in columns)), key=str))
+        frames = [df.assign(**{col: df[col].cat.set_categories(categories)}) if col in df.columns else df
+                  for df in frames]
+    return pd.concat(frames, ignore_index=ignore_index)
@@ -0,0 +1,233 @@
+import re
+from abc import ABC, abstractmethod
+from functools import partial
+import numpy as np
+import pandas as pd
+from normalize import normalize_dates
+from reports import (detect_decimal, reduce_parts, find_id_column, uniqueness_text,
+                     eur_totals_parts, eur_totals_text, EUR_TOTALS_KEYS, rewards_parts, rewards_text, REWARDS_KEYS,
+                     income_parts, income_text, INCOME_KEYS, realized_gains_parts, realized_gains_text, REALIZED_KEYS)
+from schema import apply_schema, concat_frames, detect_export_kind
+
+# Mémoire visée pour le bloc en cours de traitement, quelle que soit la taille des fichiers
+DEFAULT_MAX_MEMORY = 256 * 1024 ** 2
+# Copies d'un bloc présentes à la fois (lecture, conversion des types, parts d'un rapport)
+CHUNK_COPIES = 3
+MIN_CHUNK_ROWS = 1000
+# Lignes lues pour estimer la mémoire d'une ligne
+SAMPLE_ROWS = 1000
+# Parts réduites conservées avant d'être fusionnées en une seule
+MAX_PENDING_PARTS = 32
+SIZE_UNITS = {'': 1, 'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3}
+
+
+def parse_size(text):
+    """Taille mémoire '512M', '2G', '64k' ou en octets -> octets ; ValueError si illisible"""
+    match = re.fullmatch(r'\s*(\d+(?:\.\d+)?)\s*([KMG]?)[oB]?\s*', str(text), re.IGNORECASE)
+    if not match:
+        raise ValueError(f"Taille mémoire invalide : {text!r} (ex : 256M, 2G)")
+    size = int(float(match.group(1)) * SIZE_UNITS[match.group(2).upper()])
+    if size <= 0:
+        raise ValueError(f"Taille mémoire invalide : {text!r} (ex : 256M, 2G)")
+    return size
+
+
+def chunk_rows(filepath, max_memory=DEFAULT_MAX_MEMORY, decimal='.', min_rows=MIN_CHUNK_ROWS):
+    """Lignes par bloc pour rester sous max_memory, d'après la mémoire des premières lignes du fichier"""
+    sample = pd.read_csv(filepath, decimal=decimal, nrows=SAMPLE_ROWS)
+    if sample.empty:
+        return min_rows
+    row_bytes = sample.memory_usage(deep=True).sum() / len(sample)
+    return max(min_rows, int(max_memory // (row_bytes * CHUNK_COPIES)))
+
+
+def iter_export_chunks(filepaths, max_memory=DEFAULT_MAX_MEMORY, min_rows=MIN_CHUNK_ROWS):
+    """
+    Blocs successifs des exports, dates converties et schéma typé appliqués : un seul bloc en mémoire à la fois.
+    Un fichier sans ligne produit un bloc vide (ses colonnes restent visibles des agrégats).
+    """
+    for filepath in filepaths:
+        decimal = detect_decimal(filepath)
+        header = pd.read_csv(filepath, decimal=decimal, nrows=0)
+        kind = detect_export_kind(header.columns)
+        rows = chunk_rows(filepath, max_memory, decimal, min_rows)
+        empty = True
+        for chunk in pd.read_csv(filepath, decimal=decimal, chunksize=rows):
+            empty = False
+            yield apply_schema(normalize_dates(chunk, epoch=False), kind)
+        if empty:
+            yield apply_schema(normalize_dates(header, epoch=False), kind)
+
+
+def export_columns(filepaths):
+    """Colonnes de tous les fichiers, dans l'ordre d'apparition (en-têtes seulement)"""
+    columns = {}
+    for filepath in filepaths:
+        columns.update(dict.fromkeys(pd.read_csv(filepath, decimal=detect_decimal(filepath), nrows=0).columns))
+    return list(columns)
+
+
+class ChunkAggregator(ABC):
+    """
+    Agrégat calculé bloc par bloc. start(colonnes de tous les blocs), update(bloc) pour chaque bloc, puis
+    result(). Si needs_rescan() après la première passe, les blocs sont relus et passés à rescan(bloc).
+    """
+    def start(self, columns):
+        pass
+
+    @abstractmethod
+    def update(self, chunk):
+        """Prend en compte un bloc"""
+
+    def needs_rescan(self):
+        return False
+
+    def rescan(self, chunk):
+        pass
+
+    @abstractmethod
+    def result(self):
+        """Résultat de l'agrégat une fois tous les blocs passés"""
+
+
+class PartsAggregator(ChunkAggregator):
+    """
+    Rapport calculé sur des parts réductibles par somme (reports.py) : chaque bloc est réduit à une ligne par
+    clé (année, devise...), les réductions sont fusionnées au fil de l'eau ; la mémoire dépend du nombre de
+    clés, pas du nombre de lignes. result() donne le même texte que le rapport sur les données concaténées.
+    """
+    def __init__(self, parts_fn, keys, text_fn):
+        self.parts_fn = parts_fn
+        self.keys = keys
+        self.text_fn = text_fn
+        self._parts = []
+
+    def update(self, chunk):
+        self._parts.append(reduce_parts(self.parts_fn(chunk), self.keys))
+        if len(self._parts) >= MAX_PENDING_PARTS:
+            self._parts = [self._reduced()]
+
+    def _reduced(self):
+        # Clés catégorielles de blocs différents : concaténées en object
+        return reduce_parts(pd.concat(self._parts, ignore_index=True), self.keys)
+
+    def result(self):
+        return self.text_fn(self._reduced())
+
+
+def eur_totals_aggregator():
+    return PartsAggregator(eur_totals_parts, EUR_TOTALS_KEYS, eur_totals_text)
+
+
+def rewards_aggregator():
+    return PartsAggregator(rewards_parts, REWARDS_KEYS, rewards_text)
+
+
+def income_aggregator():
+    return PartsAggregator(income_parts, INCOME_KEYS, income_text)
+
+
+def realized_gains_aggregator(monthly=False):
+    return PartsAggregator(realized_gains_parts, REALIZED_KEYS, partial(realized_gains_text, monthly=monthly))
+
+
+class DuplicateIdAggregator(ChunkAggregator):
+    """
+    Validation d'unicité en deux passes. Première passe : un hash 64 bits par ID distinct (8 octets, tableaux
+    triés fusionnés par tailles croissantes) et les hashs vus plusieurs fois. Seconde passe, seulement s'il y
+    en a : les lignes de ces hashs sont gardées et les doublons confirmés sur les ID eux-mêmes.
+    result() : (texte, nombre de lignes en double) comme reports.uniqueness_report.
+    """
+    def __init__(self):
+        self.columns = []
+        self.id_column = None
+        self.total = 0
+        self._runs = []  # hashs déjà vus, tableaux triés disjoints
+        self._candidates = set()
+        self._rows = []
+
+    def start(self, columns):
+        self.columns = list(columns)
+        self.id_column = find_id_column(self.columns)
+
+    def _ids(self, chunk):
+        # ID comparés comme texte : un même ID lu en entier dans un bloc et en texte dans un autre reste égal
+        return chunk[self.id_column].astype('string')
+
+    def _hashes(self, chunk):
+        return pd.util.hash_pandas_object(self._ids(chunk), index=False).to_numpy()
+
+    def _seen(self, values):
+        seen = np.zeros(len(values), dtype=bool)
+        for run in self._runs:
+            positions = np.minimum(np.searchsorted(run, values), len(run) - 1)
+            seen |= run[positions] == values
+        return seen
+
+    def _add_run(self, values):
+        self._runs.append(values)
+        while len(self._runs) > 1 and len(self._runs[-2]) <= 2 * len(self._runs[-1]):
+            last = self._runs.pop()
+            self._runs[-1] = np.sort(np.concatenate([self._runs[-1], last]), kind='stable')
+
+    def update(self, chunk):
+        self.total += len(chunk)
+        if self.id_column is None or self.id_column not in chunk.columns or chunk.empty:
+            return
+        values, counts = np.unique(self._hashes(chunk), return_counts=True)
+        seen = self._seen(values)
+        self._candidates.update(values[seen | (counts > 1)].tolist())
+        if (~seen).any():
+            self._add_run(values[~seen])
+
+    def needs_rescan(self):
+        return bool(self._candidates)
+
+    def rescan(self, chunk):
+        if self.id_column not in chunk.columns or chunk.empty:
+            return
+        candidates = np.fromiter(self._candidates, dtype='uint64', count=len(self._candidates))
+        rows = chunk[np.isin(self._hashes(chunk), candidates)]
+        if not rows.empty:
+            self._rows.append(rows)
+
+    def result(self):
+        if self.id_column is None:
+            return uniqueness_text(None, self.columns, self.total, None)
+        if not self._rows:
+            return uniqueness_text(self.id_column, self.columns, self.total, pd.DataFrame(columns=self.columns))
+        rows = concat_frames(self._rows)
+        rows[self.id_column] = self._ids(rows)
+        duplicates = rows[rows.duplicated(subset=[self.id_column], keep=False)]
+        return uniqueness_text(self.id_column, self.columns, self.total, duplicates)
+
+
+def aggregate_chunks(chunks_fn, aggregators, columns):
+    """
+    Alimente les agrégats avec les blocs de chunks_fn() (rappelée pour une seconde passe si un agrégat la
+    demande). Retourne les résultats, dans l'ordre des agrégats.
+    """
+    for aggregator in aggregators:
+        aggregator.start(columns)
+    for chunk in chunks_fn():
+        for aggregator in aggregators:
+            aggregator.update(chunk)
+    rescans = [aggregator for aggregator in aggregators if aggregator.needs_rescan()]
+    if rescans:
+        for chunk in chunks_fn():
+            for aggregator in rescans:
+                aggregator.rescan(chunk)
+    return [aggregator.result() for aggregator in aggregators]
+
+
+def aggregate_files(filepaths, aggregators, max_memory=DEFAULT_MAX_MEMORY, min_rows=MIN_CHUNK_ROWS):
+    """Agrégats sur des exports lus par blocs, sans jamais matérialiser la table complète"""
+    return aggregate_chunks(lambda: iter_export_chunks(filepaths, max_memory, min_rows), aggregators,
+                            export_columns(filepaths))
+
+
+def aggregate_frames(frames, aggregators):
+    """Agrégats sur des DataFrames déjà chargés (un bloc par fichier), sans les concaténer"""
+    frames = list(frames)
+    columns = list(dict.fromkeys(col for df in frames for col in df.columns))
+    return aggregate_chunks(lambda: iter(frames), aggregators, columns)
@@ -0,0 +1,47 @@
+import numpy as np
+
+
+def sort_order(series, ascending=True):
+    """
+    Positions des lignes triées selon `series` (tri stable, valeurs manquantes en dernier).
+    Les colonnes aux types mélangés sont triées comme du texte.
+    """
+    values = series.reset_index(drop=True)
+    try:
+        ordered = values.sort_values(ascending=ascending, kind='stable', na_position='last')
+    except TypeError:
+        ordered = values.astype('string').sort_values(ascending=ascending, kind='stable', na_position='last')
+    return ordered.index.to_numpy(dtype='int64')
+
+
+def inverse_order(order):
+    """Rang d'affichage de chaque position : inverse de la permutation `order`"""
+    ranks = np.empty(len(order), dtype='int64')
+    ranks[order] = np.arange(len(order), dtype='int64')
+    return ranks
+
+
+class PrefixIndex:
+    """
+    Recherche par préfixe (insensible à la casse) dans une colonne : valeurs texte triées une fois,
+    chaque recherche est une recherche dichotomique.
+    """
+    def __init__(self, series):
+        keys = series.reset_index(drop=True).astype('string').fillna('').str.lower().to_numpy(dtype=object)
+        self._order = np.argsort(keys, kind='stable')
+        self._keys = keys[self._order]
+
+    def find(self, prefix, after=None):
+        """
+        Positions des lignes dont la valeur commence par `prefix`, dans l'ordre des valeurs.
+        Avec `after` (rang d'une correspondance précédente), la suivante ; retourne (rang, position) ou None.
+        """
+        prefix = prefix.lower()
+        first = int(np.searchsorted(self._keys, prefix, side='left'))
+        rank = first if after is None else max(first, after + 1)
+        if rank >= len(self._keys) or not self._keys[rank].startswith(prefix):
+            # Après la dernière correspondance : retour à la première
+            if after is None or first >= len(self._keys) or not self._keys[first].startswith(prefix):
+                return None
+            rank = first
+        return rank, int(self._order[rank])
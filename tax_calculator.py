@@ -1,6 +1,7 @@
 import tkinter as tk
 from tkinter import ttk
 import pandas as pd
+from normalize import as_datetime
 import matplotlib.pyplot as plt
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
 import numpy as np
@@ -24,7 +25,7 @@ class TaxCalculatorWindow(tk.Toplevel):
             raise ValueError("Le fichier doit contenir la colonne 'Date'")
         
         # Convertir les dates et trier chronologiquement
-        self.df['Date'] = pd.to_datetime(self.df['Date'], errors='coerce')
+        self.df['Date'] = as_datetime(self.df['Date'])
         self.df = self.df.dropna(subset=['Date'])
         self.df = self.df.sort_values('Date')
         
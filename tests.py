@@ -5,9 +5,41 @@ from pathlib import Path
 import tempfile
 import os
 import shutil
+import json
+import zipfile
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
 from transactions import TransactionsViewer
 from income_gains import IncomeGainsViewer
 from realized_gains import RealizedGainsViewer
+from price_store import PriceStore
+from price_planner import plan_kline_windows, KlineWindow, compute_timestamps_ms, format_estimate
+from price_join import apply_eur_prices
+from price_routing import PriceRouter
+from pair_index import PairIndex, NegativeCache, filter_needs
+from price_providers import PriceProvider, RecordReplayProvider, StorePriceProvider
+from ui_channel import UIChannel
+from table_index import PrefixIndex, inverse_order, sort_order
+from loader import BackgroundLoader
+from load_cache import LoadCache
+import load_cache
+from schema import apply_schema, concat_frames, detect_export_kind
+from streaming import (ChunkAggregator, DuplicateIdAggregator, aggregate_files, eur_totals_aggregator,
+                       iter_export_chunks, realized_gains_aggregator, rewards_aggregator)
+from reports import eur_totals_report, read_export_csv, realized_gains_report, rewards_report, uniqueness_report
+from normalize import EPOCH_MS_COLUMN, detect_date_format, normalize_dates, to_epoch_ms
+from rate_limiter import TokenBucket, AdaptiveRateLimiter
+from async_fetcher import fetch_windows_concurrently
+from price_archive import import_kline_archives
+from binance_client import BinancePriceClient, PairNotFoundError, RateLimitedClient, TransientPriceError
+import threading
+import time
+import io
+import subprocess
+import sys
+from contextlib import redirect_stdout
+import update_csv
+import cli
 
 class TestBase(unittest.TestCase):
     def setUp(self):
@@ -15,6 +47,9 @@ class TestBase(unittest.TestCase):
         self.root = tk.Tk()
         self.summary = tk.Text(self.root)
         self.temp_dir = tempfile.mkdtemp()
+        # Cache de chargement dans le répertoire temporaire
+        self._cache_dir = os.environ.get('CRYPTO_VIEWER_CACHE_DIR')
+        os.environ['CRYPTO_VIEWER_CACHE_DIR'] = self.temp_dir
         
         # Créer des fichiers CSV de test
         self.create_test_files()
@@ -22,6 +57,10 @@ class TestBase(unittest.TestCase):
     def tearDown(self):
         """Nettoyage après chaque test"""
         self.root.destroy()
+        if self._cache_dir is None:
+            os.environ.pop('CRYPTO_VIEWER_CACHE_DIR', None)
+        else:
+            os.environ['CRYPTO_VIEWER_CACHE_DIR'] = self._cache_dir
         shutil.rmtree(self.temp_dir)
         
     def create_test_files(self):
@@ -82,6 +121,7 @@ class TestTransactionsViewer(TestBase):
         """Test le chargement des fichiers CSV"""
         self.viewer.current_directory = self.temp_dir
         self.viewer.load_csv()
+        self.viewer.loader.wait()
         self.assertGreater(len(self.viewer.dataframes), 0)
         
     def test_filter_df(self):
@@ -89,6 +129,7 @@ class TestTransactionsViewer(TestBase):
         # Charger les données
         self.viewer.current_directory = self.temp_dir
         self.viewer.load_csv()
+        self.viewer.loader.wait()
         
         # Sélectionner un type
         self.viewer.type_filter.selection_set(0)  # Sélectionne 'Buy'
@@ -101,6 +142,7 @@ class TestTransactionsViewer(TestBase):
         """Test le calcul des totaux EUR"""
         self.viewer.current_directory = self.temp_dir
         self.viewer.load_csv()
+        self.viewer.loader.wait()
         self.viewer.calculate_eur_totals()
         
         # Vérifier que le résumé contient les informations attendues
@@ -117,12 +159,14 @@ class TestIncomeGainsViewer(TestBase):
         """Test le chargement des fichiers CSV"""
         self.viewer.current_directory = self.temp_dir
         self.viewer.load_csv()
+        self.viewer.loader.wait()
         self.assertGreater(len(self.viewer.dataframes), 0)
         
     def test_calculate_income_gains(self):
         """Test le calcul des gains de revenus"""
         self.viewer.current_directory = self.temp_dir
         self.viewer.load_csv()
+        self.viewer.loader.wait()
         self.viewer.calculate_income_gains()
         
         # Vérifier que le résumé contient les informations attendues
@@ -140,12 +184,14 @@ class TestRealizedGainsViewer(TestBase):
         """Test le chargement des fichiers CSV"""
         self.viewer.current_directory = self.temp_dir
         self.viewer.load_csv()
+        self.viewer.loader.wait()
         self.assertGreater(len(self.viewer.dataframes), 0)
         
     def test_calculate_realized_gains(self):
         """Test le calcul des gains réalisés"""
         self.viewer.current_directory = self.temp_dir
         self.viewer.load_csv()
+        self.viewer.loader.wait()
         self.viewer.calculate_realized_gains()
         
         # Vérifier que le résumé contient les informations attendues
@@ -158,6 +204,7 @@ class TestRealizedGainsViewer(TestBase):
         """Vérifie que les totaux globaux et par année/crypto sont corrects (année basée sur 'Sold')"""
         self.viewer.current_directory = self.temp_dir
         self.viewer.load_csv()
+        self.viewer.loader.wait()
         self.viewer.calculate_realized_gains()
 
         # Charger le CSV de test manuellement
@@ -209,6 +256,7 @@ class TestExportFunctionality(TestBase):
         """Test l'export des transactions"""
         self.transactions_viewer.current_directory = self.temp_dir
         self.transactions_viewer.load_csv()
+        self.transactions_viewer.loader.wait()
         
         # Créer un fichier temporaire pour l'export
         export_path = os.path.join(self.temp_dir, 'export_transactions.csv')
@@ -221,6 +269,7 @@ class TestExportFunctionality(TestBase):
         """Test l'export des gains de revenus"""
         self.income_viewer.current_directory = self.temp_dir
         self.income_viewer.load_csv()
+        self.income_viewer.loader.wait()
         
         # Créer un fichier temporaire pour l'export
         export_path = os.path.join(self.temp_dir, 'export_income.csv')
@@ -233,6 +282,7 @@ class TestExportFunctionality(TestBase):
         """Test l'export des gains réalisés"""
         self.realized_viewer.current_directory = self.temp_dir
         self.realized_viewer.load_csv()
+        self.realized_viewer.loader.wait()
         
         # Créer un fichier temporaire pour l'export
         export_path = os.path.join(self.temp_dir, 'export_realized.csv')
@@ -241,5 +291,1119 @@ class TestExportFunctionality(TestBase):
         # Vérifier que le fichier a été créé
         self.assertTrue(os.path.exists(export_path))
 
+class TestPriceStore(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.store = PriceStore(os.path.join(self.temp_dir, 'prices.sqlite'))
+
+    def tearDown(self):
+        self.store.close()
+        shutil.rmtree(self.temp_dir)
+
+    def test_lookup_hit_and_miss(self):
+        """Un prix enregistré est retrouvé, une absence de prix est mémorisée"""
+        self.store.put('BTCEUR', 60_000, 20000.0)
+        self.store.put('FOOEUR', 60_000, None)
+        self.assertEqual(self.store.lookup('BTCEUR', 60_000), (True, 20000.0))
+        self.assertEqual(self.store.lookup('FOOEUR', 60_000), (True, None))
+        self.assertEqual(self.store.lookup('ETHEUR', 60_000), (False, None))
+        stats = self.store.stats()
+        self.assertEqual((stats['hits'], stats['misses'], stats['size']), (2, 1, 2))
+
+    def test_eviction_keeps_most_recent(self):
+        """Au-delà de la limite, les entrées les plus anciennes sont évincées"""
+        self.store.max_entries = 100
+        self.store.put_many('BTCEUR', [(i * 60_000, float(i)) for i in range(150)])
+        self.assertLessEqual(len(self.store), 100)
+        self.assertEqual(self.store.lookup('BTCEUR', 149 * 60_000), (True, 149.0))
+        self.assertFalse(self.store.lookup('BTCEUR', 0)[0])
+
+    def test_get_binance_price_reads_store_first(self):
+        """Un second appel pour la même minute ne fait aucune requête réseau"""
+        server = MockBinanceServer()
+        client = BinancePriceClient(base_url=server.url)
+        try:
+            self.assertEqual(update_csv.get_binance_price('BTCEUR', 60_500, self.store, client), 1.0)
+            self.assertEqual(update_csv.get_binance_price('BTCEUR', 60_900, self.store, client), 1.0)
+        finally:
+            client.close()
+            server.close()
+        self.assertEqual(len(server.requests), 1)
+
+class MockBinanceServer:
+    """Serveur HTTP local imitant l'endpoint klines de Binance (close = minute d'ouverture depuis l'epoch)"""
+    def __init__(self):
+        self.requests = []
+        self.client_ports = set()
+        self.script = []  # réponses (status, body, headers) servies avant la réponse par défaut
+        self.unknown_symbols = set()
+        self.headers = {}  # en-têtes ajoutés aux réponses par défaut
+        self.exchange_symbols = None  # {paire: statut} servi par exchangeInfo (404 si None)
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                parsed = urlparse(self.path)
+                params = {k: v[0] for k, v in parse_qs(parsed.query).items()}
+                server.requests.append((parsed.path, params))
+                server.client_ports.add(self.client_address[1])
+                status, body, headers = server.respond(params, parsed.path)
+                payload = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(payload)))
+                for key, value in headers.items():
+                    self.send_header(key, value)
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f"http://127.0.0.1:{self.httpd.server_address[1]}"
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+    def respond(self, params, path='/api/v3/klines'):
+        if path == '/api/v3/exchangeInfo':
+            if self.exchange_symbols is None:
+                return 404, {'code': -1, 'msg': 'Not found.'}, {}
+            return 200, {'symbols': [{'symbol': k, 'status': v} for k, v in self.exchange_symbols.items()]}, {}
+        if self.script:
+            return self.script.pop(0)
+        if params.get('symbol') in self.unknown_symbols:
+            return 400, {'code': -1121, 'msg': 'Invalid symbol.'}, {}
+        start = int(params['startTime'])
+        step = {'1m': 60_000, '1h': 3_600_000, '1d': 86_400_000}[params.get('interval', '1m')]
+        candles = []
+        for n in range(int(params.get('limit', 500))):
+            open_time = start + n * step
+            close = open_time / 60_000
+            candles.append([open_time, str(close), str(close + 1), str(close - 1), str(close)])
+        return 200, candles, dict(self.headers)
+
+    def klines_requests(self):
+        return [params for path, params in self.requests if path == '/api/v3/klines']
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+class TestKlinePlanner(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.store = PriceStore(os.path.join(self.temp_dir, 'prices.sqlite'))
+
+    def tearDown(self):
+        self.store.close()
+        shutil.rmtree(self.temp_dir)
+
+    def test_windows_fit_in_one_page(self):
+        """Les minutes proches partagent une fenêtre, les minutes déjà en cache sont ignorées"""
+        minutes = {0, 60_000, 999 * 60_000, 1000 * 60_000, 5000 * 60_000}
+        self.store.put('ETHEUR', 0, 1.0)
+        windows = plan_kline_windows({'BTCEUR': minutes, 'ETHEUR': {0}}, self.store)
+        self.assertEqual([(w.symbol, w.start_ms, w.limit) for w in windows],
+                         [('BTCEUR', 0, 1000), ('BTCEUR', 1000 * 60_000, 1), ('BTCEUR', 5000 * 60_000, 1)])
+
+    def test_enrichment_batches_api_calls(self):
+        """Un fichier dense est enrichi avec un seul appel klines par fenêtre"""
+        dates = pd.date_range('2023-01-02 10:00', periods=300, freq='min')
+        path = os.path.join(self.temp_dir, 'tx.csv')
+        pd.DataFrame({
+            'Date': dates.strftime('%Y-%m-%d %H:%M:%S'),
+            'Sent Currency': ['EUR'] * 300,
+            'Sent Amount': [10.0] * 300,
+            'Received Currency': ['BTC'] * 300,
+            'Received Amount': [2.0] * 300,
+        }).to_csv(path, index=False)
+        server = MockBinanceServer()
+        client = BinancePriceClient(base_url=server.url)
+        try:
+            df = update_csv.enrich_csv_with_eur_prices(path, 60000, lambda c, t: None, lambda m: None,
+                                                       store=self.store, client=client)
+        finally:
+            client.close()
+            server.close()
+        self.assertEqual(len(server.klines_requests()), 1)
+        self.assertTrue(df['Received Price EUR'].notna().all())
+        first_ts = int(pd.Timestamp('2023-01-02 10:00', tz='Europe/Paris').timestamp() * 1000)
+        self.assertAlmostEqual(df.loc[0, 'Received Value EUR'], 2.0 * first_ts / 60_000)
+        self.assertNotIn(EPOCH_MS_COLUMN, pd.read_csv(path.replace('.csv', '_enriched.csv')).columns)
+
+    def test_unsorted_datetime_file_resolved_in_first_pass(self):
+        """Export à colonne datetime seule, non trié : lignes triées par horodatage, tout résolu à l'étape 1"""
+        dates = pd.date_range('2023-01-02 10:00', periods=80, freq='D').strftime('%Y-%m-%d %H:%M:%S')
+        order = [(i * 37) % 80 for i in range(80)]
+        path = os.path.join(self.temp_dir, 'tx.csv')
+        pd.DataFrame({
+            'datetime': [dates[i] for i in order],
+            'Sent Currency': ['EUR'] * 80,
+            'Sent Amount': [10.0] * 80,
+            'Received Currency': ['BTC'] * 80,
+            'Received Amount': [1.0] * 80,
+        }).to_csv(path, index=False)
+        server = MockBinanceServer()
+        client = BinancePriceClient(base_url=server.url)
+        logs = []
+        try:
+            df = update_csv.enrich_csv_with_eur_prices(path, 60000, lambda c, t: None, logs.append,
+                                                       store=self.store, client=client)
+        finally:
+            client.close()
+            server.close()
+        self.assertIn("Étape 1 (paire EUR directe) - Received : 80/80 prix EUR trouvés", logs)
+        self.assertTrue(df[EPOCH_MS_COLUMN].is_monotonic_increasing)
+        self.assertTrue(df['Received Price EUR'].notna().all())
+
+    def test_dry_run_plan_counts_cache_and_calls(self):
+        """Plan à blanc : prix distincts, prix en cache et appels de chaque mode, sans appel réseau"""
+        dates = pd.date_range('2023-01-02 10:00', periods=1500, freq='min')
+        path = os.path.join(self.temp_dir, 'plan.csv')
+        pd.DataFrame({
+            'Date': dates.strftime('%Y-%m-%d %H:%M:%S'),
+            'Type': ['Receive'] * 1500,
+            'Label': ['Reward'] * 1500,
+            'Received Currency': ['BTC'] * 1500,
+            'Received Amount': [1.0] * 1500,
+        }).to_csv(path, index=False)
+        first = int(dates[0].tz_localize('Europe/Paris').timestamp() * 1000)
+        self.store.put_many('BTCEUR', [(first + i * 60_000, 1.0) for i in range(500)])
+        estimate = update_csv.plan_enrichment(path, 600, store=self.store, resolution={'Reward': '1d'})
+        self.assertEqual((estimate.rows, estimate.lookups, estimate.cached), (1500, 1500, 500))
+        self.assertEqual(estimate.calls, {'lookup': 1000, '1m': 1, '1h': 1, '1d': 1, 'policy': 1})
+        self.assertIn("1000 appels, 1 min 40 s", format_estimate(estimate))
+
+    def test_daily_resolution_for_rewards(self):
+        """Récompenses en bougies jour (un appel pour tous les jours), écart au high/low renseigné ; achats à la minute"""
+        dates = pd.date_range('2023-01-02 10:00', periods=72, freq='h')
+        path = os.path.join(self.temp_dir, 'rewards.csv')
+        pd.DataFrame({
+            'Date': list(dates.strftime('%Y-%m-%d %H:%M:%S')) + ['2023-01-02 10:00:00'],
+            'Type': ['Receive'] * 72 + ['Buy'],
+            'Label': ['Reward'] * 72 + [''],
+            'Sent Currency': [''] * 72 + ['EUR'],
+            'Sent Amount': [None] * 72 + [10.0],
+            'Received Currency': ['DOT'] * 72 + ['BTC'],
+            'Received Amount': [0.01] * 72 + [1.0],
+        }).to_csv(path, index=False)
+        server = MockBinanceServer()
+        client = BinancePriceClient(base_url=server.url)
+        try:
+            df = update_csv.enrich_csv_with_eur_prices(path, 60000, lambda c, t: None, lambda m: None,
+                                                       store=self.store, client=client, resolution={'Reward': '1d'})
+        finally:
+            client.close()
+            server.close()
+        requests = sorted((r['symbol'], r['interval']) for r in server.klines_requests())
+        self.assertEqual(requests, [('BTCEUR', '1m'), ('DOTEUR', '1d')])
+        rewards = df[df['Type'] == 'Receive']
+        day_open = int(pd.Timestamp('2023-01-02', tz='UTC').timestamp() * 1000)
+        self.assertEqual(rewards['Received Price EUR'].iloc[0], day_open / 60_000)
+        self.assertEqual(rewards['Received Price EUR'].nunique(), 4)
+        self.assertAlmostEqual(rewards['Received Price Deviation %'].iloc[0], 100 / (day_open / 60_000))
+        buy = df[df['Type'] == 'Buy'].iloc[0]
+        self.assertTrue(pd.isna(buy['Received Price Deviation %']))
+        self.assertEqual(buy['Received Price EUR'] * 60_000, int(pd.Timestamp('2023-01-02 09:00', tz='UTC').timestamp() * 1000))
+
+    def test_multi_file_enrichment_fetches_each_price_once(self):
+        """Plusieurs fichiers aux minutes communes : un seul appel par fenêtre, fichiers écrits par des processus"""
+        dates = pd.date_range('2023-01-02 10:00', periods=50, freq='min').strftime('%Y-%m-%d %H:%M:%S')
+        paths = []
+        for name, currency in (('a.csv', 'BTC'), ('b.csv', 'BTC'), ('c.csv', 'ETH')):
+            paths.append(os.path.join(self.temp_dir, name))
+            pd.DataFrame({
+                'Date': dates,
+                'Sent Currency': ['EUR'] * 50,
+                'Sent Amount': [10.0] * 50,
+                'Received Currency': [currency] * 50,
+                'Received Amount': [2.0] * 50,
+            }).to_csv(paths[-1], index=False)
+        progress = {}
+        server = MockBinanceServer()
+        client = BinancePriceClient(base_url=server.url)
+        try:
+            outputs = update_csv.enrich_many(paths, 60000, lambda name, c, t: progress.__setitem__(name, (c, t)),
+                                             lambda m: None, store=self.store, client=client, jobs=2)
+        finally:
+            client.close()
+            server.close()
+        self.assertEqual(sorted(r['symbol'] for r in server.klines_requests()), ['BTCEUR', 'ETHEUR'])
+        self.assertEqual(progress[None], (3, 3))
+        self.assertEqual(progress['c.csv'], (50, 50))
+        for path in paths:
+            df = pd.read_csv(outputs[path])
+            self.assertTrue(df['Received Price EUR'].notna().all())
+
+    def test_join_uses_candle_of_the_minute(self):
+        """La jointure prend la bougie ouverte dans la minute de la transaction, EUR vaut 1"""
+        df = pd.DataFrame({
+            'Date': ['2023-01-02 10:00:30', '2023-01-02 10:02:59', 'invalide'],
+            'Sent Currency': ['EUR', 'BTC', 'BTC'],
+            'Sent Amount': [10.0, 1.0, 1.0],
+            'Received Currency': ['BTC', 'EUR', 'EUR'],
+            'Received Amount': [2.0, 5.0, 5.0],
+        })
+        timestamps = compute_timestamps_ms(df)
+        minute = timestamps[0] - timestamps[0] % 60_000
+        self.store.put_many('BTCEUR', [(minute, 100.0), (minute + 60_000, 200.0)])
+        unknown = apply_eur_prices(df, timestamps, self.store)
+        self.assertEqual(df['Received Price EUR'].tolist()[0], 100.0)
+        self.assertEqual(df['Sent Price EUR'].tolist()[0], 1.0)
+        # 10:02 absent du store : pas de prix de 10:01 réutilisé
+        self.assertTrue(pd.isna(df.loc[1, 'Sent Price EUR']))
+        self.assertEqual(unknown, 1)
+
+    def test_enrichment_updates_preview_rows_by_position(self):
+        """L'aperçu reçoit les lignes triées, puis des mises à jour par position, sans toucher aux widgets"""
+        class FakeViewer:
+            def __init__(self):
+                self.reloads, self.updated = [], set()
+            def request_reload(self, df):
+                self.reloads.append(df['Date'].tolist())
+            def update_rows(self, start, df_rows):
+                self.updated.update(range(start, start + len(df_rows)))
+        path = os.path.join(self.temp_dir, 'tx.csv')
+        pd.DataFrame({
+            'Date': ['2023-01-02 10:05:00', '2023-01-02 10:00:00', '2023-01-02 10:02:00'],
+            'Sent Currency': ['EUR'] * 3,
+            'Sent Amount': [10.0] * 3,
+            'Received Currency': ['BTC'] * 3,
+            'Received Amount': [2.0] * 3,
+        }).to_csv(path, index=False)
+        viewer = FakeViewer()
+        server = MockBinanceServer()
+        client = BinancePriceClient(base_url=server.url)
+        try:
+            update_csv.enrich_csv_with_eur_prices(path, 60000, lambda c, t: None, lambda m: None,
+                                                  table_viewer=viewer, store=self.store, client=client)
+        finally:
+            client.close()
+            server.close()
+        self.assertEqual(viewer.reloads[0], sorted(viewer.reloads[0]))
+        self.assertEqual(len(viewer.reloads), 2)
+        self.assertEqual(viewer.updated, {0, 1, 2})
+
+class TestPriceRouting(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.store = PriceStore(os.path.join(self.temp_dir, 'prices.sqlite'))
+
+    def tearDown(self):
+        self.store.close()
+        shutil.rmtree(self.temp_dir)
+
+    def test_routes_prefer_fewest_legs(self):
+        """Paire directe d'abord, puis une cotation intermédiaire, puis deux"""
+        router = PriceRouter(self.store)
+        labels = [router.route_label(r) for r in router.routes('FET')]
+        self.assertEqual(labels[:2], ['FET -> EUR', 'FET -> USDT -> EUR'])
+        self.assertIn('FET -> FDUSD -> USDT -> EUR', labels)
+        self.assertEqual(router.route_label(router.routes('USDT')[0]), 'USDT -> EUR')
+
+    def test_correction_shares_quote_legs(self):
+        """Les étapes communes sont récupérées une fois pour toutes les lignes, pas une fois par ligne"""
+        dates = pd.date_range('2023-01-02 10:00', periods=50, freq='min')
+        path = os.path.join(self.temp_dir, 'tx_enriched.csv')
+        pd.DataFrame({
+            'Date': dates.strftime('%Y-%m-%d %H:%M:%S'),
+            'Sent Currency': ['FET'] * 25 + ['ARB'] * 25,
+            'Sent Amount': [3.0] * 50,
+            'Received Currency': ['EUR'] * 50,
+            'Received Amount': [1.0] * 50,
+        }).to_csv(path, index=False)
+        server = MockBinanceServer()
+        server.unknown_symbols = {'FETEUR', 'ARBEUR'}
+        client = BinancePriceClient(base_url=server.url)
+        try:
+            df = update_csv.correct_csv_prices(path, lambda m: None, store=self.store, client=client)
+        finally:
+            client.close()
+            server.close()
+        symbols = sorted(params['symbol'] for params in server.klines_requests())
+        self.assertEqual(symbols, ['ARBEUR', 'ARBUSDT', 'EURUSDT', 'FETEUR', 'FETUSDT'])
+        # Le mock renvoie close = minute pour toutes les paires : FET/USDT / EUR/USDT = 1
+        self.assertTrue(((df['Sent Price EUR'] - 1.0).abs() < 1e-9).all())
+        self.assertTrue(((df['Sent Value EUR'] - 3.0).abs() < 1e-9).all())
+
+    def test_enrichment_falls_back_to_routes(self):
+        """Un seul passage : paire EUR directe, puis route intermédiaire, puis rapport des manquants"""
+        path = os.path.join(self.temp_dir, 'tx.csv')
+        pd.DataFrame({
+            'Date': ['2023-01-02 10:00:00', '2023-01-02 10:01:00', '2023-01-02 10:02:00'],
+            'Sent Currency': ['EUR', 'EUR', 'EUR'],
+            'Sent Amount': [10.0, 10.0, 10.0],
+            'Received Currency': ['BTC', 'FET', 'FOO'],
+            'Received Amount': [1.0, 2.0, 3.0],
+        }).to_csv(path, index=False)
+        server = MockBinanceServer()
+        server.unknown_symbols = {'FETEUR', 'FOOEUR', 'FOOUSDT', 'FOOBUSD', 'FOOFDUSD', 'FOOBTC', 'FOOBNB'}
+        client = BinancePriceClient(base_url=server.url)
+        logs = []
+        try:
+            df = update_csv.enrich_csv_with_eur_prices(path, 60000, lambda c, t: None, logs.append,
+                                                       store=self.store, client=client)
+        finally:
+            client.close()
+            server.close()
+        self.assertTrue(df.loc[:1, 'Received Price EUR'].notna().all())
+        self.assertTrue(pd.isna(df.loc[2, 'Received Price EUR']))
+        self.assertFalse(os.path.exists(os.path.join(self.temp_dir, 'tx_enriched_corrected.csv')))
+        self.assertIn("Étape 1 (paire EUR directe) - Received : 1/3 prix EUR trouvés", logs)
+        self.assertIn("Étape 2 (routes intermédiaires) - Received : 1/2 prix EUR trouvés", logs)
+        self.assertTrue(any(line.startswith("  FOO : 1 prix manquants") for line in logs))
+
+    def test_single_price_lookups_reuse_router(self):
+        """Les appels successifs avec le même routeur ne redemandent pas une paire inexistante"""
+        server = MockBinanceServer()
+        server.unknown_symbols = {'FETEUR'}
+        client = BinancePriceClient(base_url=server.url)
+        router = PriceRouter(self.store, client)
+        try:
+            prices = [update_csv.get_price_eur_with_intermediate('FET', minute * 60_000, router=router)
+                      for minute in (1000, 2000)]
+        finally:
+            client.close()
+            server.close()
+        self.assertTrue(all(abs(price - 1.0) < 1e-9 for price in prices))
+        symbols = [params['symbol'] for params in server.klines_requests()]
+        self.assertEqual(symbols.count('FETEUR'), 1)
+
+class TestPairIndex(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.store = PriceStore(os.path.join(self.temp_dir, 'prices.sqlite'))
+
+    def tearDown(self):
+        self.store.close()
+        shutil.rmtree(self.temp_dir)
+
+    def test_needs_outside_trading_range_are_skipped(self):
+        """Paires inexistantes, minutes hors cotation et plages déjà vides sont écartées"""
+        with open(os.path.join(self.temp_dir, 'exchange_info.json'), 'w') as f:
+            json.dump({'fetched_at': time.time(), 'symbols': {
+                'BTCEUR': {'status': 'TRADING', 'listed': 60_000},
+                'OLDEUR': {'status': 'BREAK', 'listed': 0, 'delisted': 120_000},
+            }}, f)
+        index = PairIndex.for_store(self.store, offline=True)
+        negative = NegativeCache()
+        negative.add('BTCEUR', 300_000, 360_000)
+        needs, skipped = filter_needs({
+            'BTCEUR': {0, 60_000, 300_000, 420_000},
+            'OLDEUR': {60_000, 180_000},
+            'FETEUR': {60_000},
+        }, index, negative)
+        self.assertEqual(needs, {'BTCEUR': {60_000, 420_000}, 'OLDEUR': {60_000}})
+        self.assertEqual(skipped, 4)
+
+    def test_missing_pairs_are_never_requested(self):
+        """Avec l'instantané exchangeInfo, la route FET/EUR inexistante n'est jamais interrogée"""
+        path = os.path.join(self.temp_dir, 'tx_enriched.csv')
+        pd.DataFrame({
+            'Date': ['2023-01-02 10:00:00', '2023-01-02 10:01:00'],
+            'Sent Currency': ['FET', 'FET'],
+            'Sent Amount': [3.0, 3.0],
+        }).to_csv(path, index=False)
+        server = MockBinanceServer()
+        server.exchange_symbols = {'FETUSDT': 'TRADING', 'EURUSDT': 'TRADING'}
+        client = BinancePriceClient(base_url=server.url)
+        try:
+            df = update_csv.correct_csv_prices(path, lambda m: None, store=self.store, client=client)
+        finally:
+            client.close()
+            server.close()
+        symbols = [params['symbol'] for params in server.klines_requests()]
+        self.assertNotIn('FETEUR', symbols)
+        # Une sonde de date de cotation par paire, puis une fenêtre par paire
+        self.assertEqual(sorted(symbols), ['EURUSDT', 'EURUSDT', 'FETUSDT', 'FETUSDT'])
+        self.assertTrue(df['Sent Price EUR'].notna().all())
+
+    def test_snapshot_and_probes_are_throttled(self):
+        """exchangeInfo et chaque sonde de cotation consomment un jeton du limiteur"""
+        server = MockBinanceServer()
+        server.exchange_symbols = {'BTCEUR': 'TRADING'}
+        client = BinancePriceClient(base_url=server.url)
+        acquired = []
+        limiter = TokenBucket(60_000)
+        limiter.acquire = lambda tokens=1: acquired.append(tokens)
+        try:
+            index = PairIndex.for_store(self.store, client, rate_limiter=limiter)
+            index.trading_range('BTCEUR')
+        finally:
+            client.close()
+            server.close()
+        self.assertEqual(len(server.requests), 2)
+        self.assertEqual(len(acquired), 2)
+
+    def test_probe_does_not_block_other_lookups(self):
+        """Une sonde de cotation en cours ne bloque pas les recherches des autres paires"""
+        release = threading.Event()
+
+        class SlowClient:
+            def exchange_info(self):
+                return {'symbols': [{'symbol': 'BTCEUR', 'status': 'TRADING'}, {'symbol': 'ETHEUR', 'status': 'TRADING'}]}
+
+            def klines(self, symbol, start_ms, limit=1000, interval='1m', end_ms=None):
+                release.wait(5)
+                return [[60_000, '1', '1', '1', '1']]
+
+        index = PairIndex(client=SlowClient())
+        index.exists('BTCEUR')
+        probe = threading.Thread(target=index.trading_range, args=('BTCEUR',))
+        probe.start()
+        try:
+            start = time.monotonic()
+            self.assertTrue(index.exists('ETHEUR'))
+            self.assertLess(time.monotonic() - start, 1)
+        finally:
+            release.set()
+            probe.join()
+        self.assertEqual(index.trading_range('BTCEUR'), (60_000, None))
+
+class TestPriceProviders(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.temp_dir, 'tx.csv')
+        dates = pd.date_range('2023-01-02 10:00', periods=20, freq='min')
+        pd.DataFrame({
+            'Date': dates.strftime('%Y-%m-%d %H:%M:%S'),
+            'Sent Currency': ['EUR'] * 20,
+            'Sent Amount': [10.0] * 20,
+            'Received Currency': ['BTC'] * 10 + ['FET'] * 10,
+            'Received Amount': [2.0] * 20,
+        }).to_csv(self.path, index=False)
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def enrich(self, provider, name):
+        store = PriceStore(os.path.join(self.temp_dir, name))
+        try:
+            return update_csv.enrich_csv_with_eur_prices(self.path, 60000, lambda c, t: None, lambda m: None,
+                                                         store=store, provider=provider, resume=False)
+        finally:
+            store.close()
+
+    def test_record_then_replay_without_network(self):
+        """Une exécution enregistrée est rejouée à l'identique, sans serveur"""
+        fixture = os.path.join(self.temp_dir, 'fixture.json')
+        server = MockBinanceServer()
+        server.unknown_symbols = {'FETEUR'}
+        recorder = RecordReplayProvider(fixture, BinancePriceClient(base_url=server.url))
+        try:
+            recorded = self.enrich(recorder, 'first.sqlite')
+        finally:
+            recorder.close()
+            server.close()
+        replay = RecordReplayProvider(fixture, latency=0.001)
+        replayed = self.enrich(replay, 'second.sqlite')
+        self.assertEqual(replay.request_count, recorder.request_count)
+        pd.testing.assert_frame_equal(recorded, replayed)
+        self.assertTrue(replayed['Received Price EUR'].notna().all())
+
+    def test_store_provider_serves_local_candles(self):
+        """Le store sert les bougies au format klines, sans appel réseau"""
+        store = PriceStore(os.path.join(self.temp_dir, 'reference.sqlite'))
+        store.put_many('BTCEUR', [(0, 10.0, 11.0, 9.0), (60_000, 12.0), (120_000, None)])
+        provider = StorePriceProvider(store)
+        self.assertEqual(provider.klines('BTCEUR', 0, limit=3),
+                         [[0, '10.0', '11.0', '9.0', '10.0'], [60_000, '12.0', '12.0', '12.0', '12.0']])
+        self.assertEqual([c[0] for c in provider.klines('BTCEUR', None, limit=2, end_ms=120_000)], [60_000])
+        store.close()
+        # Une source sans klines() est refusée dès sa création
+        self.assertRaises(TypeError, PriceProvider)
+
+class FakeText:
+    """Widget Text minimal (lignes complètes uniquement) pour tester le canal sans affichage"""
+    def __init__(self):
+        self.lines = []
+        self.inserts = 0
+
+    def insert(self, index, text):
+        self.inserts += 1
+        self.lines += text.split('\n')[:-1]
+
+    def index(self, index):
+        return f"{len(self.lines) + 1}.0"
+
+    def delete(self, start, end):
+        del self.lines[:int(end.split('.')[0]) - 1]
+
+    def see(self, index):
+        pass
+
+class TestTableIndex(unittest.TestCase):
+    def test_sort_order_is_stable_with_missing_last(self):
+        """Tri stable dans les deux sens, valeurs manquantes en dernier, types mélangés triés comme du texte"""
+        values = pd.Series([3.0, None, 1.0, 3.0])
+        self.assertEqual(sort_order(values).tolist(), [2, 0, 3, 1])
+        self.assertEqual(sort_order(values, ascending=False).tolist(), [0, 3, 2, 1])
+        self.assertEqual(sort_order(pd.Series(['b', 1, 'a'])).tolist(), [1, 2, 0])
+        order = sort_order(values)
+        self.assertEqual(inverse_order(order)[order].tolist(), [0, 1, 2, 3])
+
+    def test_prefix_search_cycles_through_matches(self):
+        """Recherche insensible à la casse ; `after` passe à la correspondance suivante puis revient à la première"""
+        index = PrefixIndex(pd.Series(['Bob', 'alice', 'Alan', 'bo', None]))
+        first = index.find('AL')
+        self.assertEqual(first, (1, 2))
+        second = index.find('al', after=first[0])
+        self.assertEqual(second[1], 1)
+        self.assertEqual(index.find('al', after=second[0]), first)
+        self.assertIsNone(index.find('z'))
+
+class TestNormalize(unittest.TestCase):
+    def test_dst_policy_for_ambiguous_and_missing_hours(self):
+        """Heure répétée d'octobre : heure d'hiver par défaut ; heure sautée de mars : décalée à 03:00"""
+        dates = pd.Series(['2023-10-29 02:30:00', '2023-03-26 02:30:00', 'invalide'])
+        ms = to_epoch_ms(dates)
+        self.assertEqual(ms.iloc[0], int(pd.Timestamp('2023-10-29 01:30:00', tz='UTC').timestamp() * 1000))
+        self.assertEqual(ms.iloc[1], int(pd.Timestamp('2023-03-26 01:00:00', tz='UTC').timestamp() * 1000))
+        self.assertTrue(pd.isna(ms.iloc[2]))
+        self.assertEqual(to_epoch_ms(dates, ambiguous='dst').iloc[0], ms.iloc[0] - 3600_000)
+        self.assertTrue(to_epoch_ms(dates, ambiguous='NaT', nonexistent='NaT').iloc[:2].isna().all())
+
+    def test_fixed_format_and_reused_epoch_column(self):
+        """Format détecté sur un échantillon, colonne ms ajoutée au chargement et réutilisée par le planificateur"""
+        self.assertEqual(detect_date_format(['05/01/2023 10:00', None, '13/01/2023 11:00']), '%d/%m/%Y %H:%M')
+        df = normalize_dates(pd.DataFrame({'Date': ['2023-01-02 10:00:00', '2023-07-02 10:00:00'], 'Type': ['Buy', 'Sell']}))
+        self.assertTrue(pd.api.types.is_datetime64_any_dtype(df['Date']))
+        self.assertEqual(df[EPOCH_MS_COLUMN].tolist(), [1672650000000, 1688284800000])
+        df[EPOCH_MS_COLUMN] = pd.Series([1, 2], dtype='Int64')
+        self.assertEqual(compute_timestamps_ms(df).tolist(), [1, 2])
+
+    def test_written_files_keep_source_offsets(self):
+        """Dates à décalage horaire triées en UTC, mais réécrites avec leur décalage d'origine"""
+        temp_dir = tempfile.mkdtemp()
+        path = os.path.join(temp_dir, 'tx.csv')
+        pd.DataFrame({
+            'Date': ['2023-06-01 10:30:00+02:00', '2023-06-01 09:00:00+00:00'],
+            'Sent Currency': ['EUR', 'EUR'],
+            'Sent Amount': [1.0, 2.0],
+        }).to_csv(path, index=False)
+        store = PriceStore(os.path.join(temp_dir, 'prices.sqlite'))
+        try:
+            df = update_csv.correct_csv_prices(path, lambda m: None, store=store, offline=True)
+            written = pd.read_csv(os.path.join(temp_dir, 'tx_corrected.csv'))
+        finally:
+            store.close()
+            shutil.rmtree(temp_dir)
+        self.assertEqual(df['Sent Amount'].tolist(), [1.0, 2.0])
+        self.assertEqual(written['Date'].tolist(), ['2023-06-01 10:30:00+02:00', '2023-06-01 09:00:00+00:00'])
+        self.assertEqual(list(written.columns), ['Date', 'Sent Currency', 'Sent Amount', 'Sent Price EUR',
+                                                 'Sent Value EUR', 'Received Price EUR', 'Received Value EUR'])
+
+
+class TestBackgroundLoader(unittest.TestCase):
+    def test_files_published_in_order_then_done_once(self):
+        """Lectures parallèles : fichiers publiés dans l'ordre demandé, une seule fin de lot avec les erreurs"""
+        def read(path):
+            time.sleep(0.05 if path == 'a' else 0.0)
+            if path == 'bad':
+                raise ValueError('illisible')
+            return path.upper()
+        files, done, progress = [], [], []
+        loader = BackgroundLoader(None, read, lambda path, df: files.append((path, df)), done.append,
+                                  lambda current, total, path: progress.append((current, total)), workers=4)
+        self.assertEqual(loader.load(['a', 'b', 'bad', 'a']), 3)
+        self.assertEqual(loader.load(['c']), 1)
+        loader.wait(timeout=5)
+        loader.close()
+        self.assertEqual(files, [('a', 'A'), ('b', 'B'), ('c', 'C')])
+        self.assertEqual(len(done), 1)
+        self.assertEqual([(path, str(e)) for path, e in done[0]], [('bad', 'illisible')])
+        self.assertEqual(progress[-1], (4, 4))
+        self.assertFalse(loader.busy)
+
+
+class TestSchema(unittest.TestCase):
+    def test_codes_are_categorical_and_survive_concat(self):
+        """Colonnes de codes en category, montants float64 ; la concaténation de fichiers garde les codes"""
+        first = pd.DataFrame({'Date': ['2024-01-01 10:00:00'] * 1000, 'Type': ['Buy', 'Receive'] * 500,
+                              'Sent Currency': [None] * 1000, 'Received Currency': ['BTC'] * 1000,
+                              'Received Amount': ['0.5'] * 1000})
+        second = first.assign(**{'Sent Currency': ['EUR'] * 1000, 'Received Currency': ['ETH'] * 1000})
+        self.assertEqual(detect_export_kind(first.columns), 'transactions')
+        before = first.memory_usage(deep=True).sum()
+        typed = [apply_schema(df.copy()) for df in (first, second)]
+        self.assertLess(typed[0].memory_usage(deep=True).sum() * 3, before)
+        self.assertEqual(typed[0]['Received Amount'].dtype, 'float64')
+        self.assertTrue(pd.api.types.is_datetime64_any_dtype(typed[0]['Date']))
+        all_data = concat_frames(typed)
+        for col in ('Type', 'Sent Currency', 'Received Currency'):
+            self.assertIsInstance(all_data[col].dtype, pd.CategoricalDtype)
+        self.assertEqual(list(all_data['Received Currency'].cat.categories), ['BTC', 'ETH'])
+        self.assertEqual(all_data['Sent Currency'].isna().sum(), 1000)
+        self.assertIsNone(detect_export_kind(['Foo']))
+
+
+class TestStreaming(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.paths = []
+        for year in (2023, 2024):
+            rows = 2500
+            path = os.path.join(self.temp_dir, f'tx_{year}.csv')
+            pd.DataFrame({
+                'Date': pd.date_range(f'{year}-01-01', periods=rows, freq='3h').strftime('%Y-%m-%d %H:%M:%S'),
+                'Type': ['Buy', 'Deposit', 'Sell', 'Receive', 'Receive'] * (rows // 5),
+                'Label': ['Trade', 'Trade', 'Trade', 'Reward', 'Staking'] * (rows // 5),
+                'Sent Currency': ['EUR', None, 'BTC', None, None] * (rows // 5),
+                'Received Currency': ['BTC', 'EUR', 'EUR', 'ETH', 'BNB'] * (rows // 5),
+                'Sent Amount': [100.0, 0.0, 0.25, 0.0, 0.0] * (rows // 5),
+                'Received Amount': [0.5, 50.0, 25.0, 0.125, 1.0] * (rows // 5),
+                # ID répété dans le même fichier et d'un fichier à l'autre
+                'Transaction ID': [f'{year}-{i}' for i in range(rows - 1)] + ['2023-7'],
+            }).to_csv(path, index=False)
+            self.paths.append(path)
+        pd.DataFrame({
+            'Currency name': ['BTC', 'ETH', 'BTC'], 'Currency amount': [0.5, 1.0, 0.25],
+            'Acquired': ['2023-01-01', '2023-02-01', '2023-03-01'], 'Sold': ['2023-04-01', '2023-04-15', '2024-01-01'],
+            'Proceeds (EUR)': [500.0, 2000.0, 300.0], 'Cost basis (EUR)': [400.0, 1500.0, 250.0],
+            'Gains (EUR)': [100.0, 500.0, 50.0],
+        }).to_csv(os.path.join(self.temp_dir, 'realized.csv'), index=False)
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_chunked_reports_match_full_table(self):
+        """Rapports par blocs de 500 lignes identiques aux rapports sur la table concaténée"""
+        self.assertEqual(len(list(iter_export_chunks(self.paths, max_memory=1, min_rows=500))), 10)
+        eur, rewards, (text, duplicates) = aggregate_files(
+            self.paths, [eur_totals_aggregator(), rewards_aggregator(), DuplicateIdAggregator()],
+            max_memory=1, min_rows=500)
+        all_data = concat_frames(read_export_csv(path, cache=False) for path in self.paths)
+        self.assertEqual(eur, eur_totals_report(all_data))
+        self.assertEqual(rewards, rewards_report(all_data))
+        self.assertEqual((text, duplicates), uniqueness_report(all_data))
+        self.assertEqual(duplicates, 3)
+        realized = os.path.join(self.temp_dir, 'realized.csv')
+        self.assertEqual(aggregate_files([realized], [realized_gains_aggregator(monthly=True)], min_rows=1)[0],
+                         realized_gains_report(read_export_csv(realized, cache=False), monthly=True))
+        self.assertRaises(TypeError, ChunkAggregator)
+
+
+class TestLoadCache(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.csv_path = os.path.join(self.temp_dir, 'tx.csv')
+        pd.DataFrame({'Date': ['2024-01-01 10:00:00'], 'Sent Amount': [1.5]}).to_csv(self.csv_path, index=False)
+        self.cache = LoadCache(os.path.join(self.temp_dir, 'cache'))
+        self.parses = 0
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def parse(self, path):
+        self.parses += 1
+        return normalize_dates(pd.read_csv(path), epoch=False)
+
+    def test_unchanged_file_is_read_back_typed(self):
+        """Second chargement depuis le cache, types conservés ; un fichier modifié est analysé à nouveau"""
+        first = self.cache.read(self.csv_path, self.parse)
+        second = self.cache.read(self.csv_path, self.parse)
+        self.assertEqual((self.parses, self.cache.hits), (1, 1))
+        pd.testing.assert_frame_equal(first, second)
+        self.assertTrue(pd.api.types.is_datetime64_any_dtype(second['Date']))
+        with open(self.csv_path, 'a') as f:
+            f.write('2024-01-02 10:00:00,2.5\n')
+        self.assertEqual(len(self.cache.read(self.csv_path, self.parse)), 2)
+        self.assertEqual(self.parses, 2)
+
+    @unittest.skipIf(load_cache.feather is None, "pyarrow absent : entrées en pickle")
+    def test_feather_entry_keeps_schema_types(self):
+        """Entrée Feather relue en memory-map : catégories, montants float64 et dates datetime64 conservés"""
+        pd.DataFrame({
+            'Date': ['2024-01-01 10:00:00', '2024-01-02 10:00:00'],
+            'Type': ['Buy', 'Sell'],
+            'Sent Currency': ['EUR', 'BTC'],
+            'Received Currency': ['BTC', 'EUR'],
+            'Sent Amount': [1000.0, 0.1],
+        }).to_csv(self.csv_path, index=False)
+        parse = lambda path: apply_schema(self.parse(path))
+        first = self.cache.read(self.csv_path, parse)
+        second = self.cache.read(self.csv_path, parse)
+        self.assertEqual((self.parses, self.cache.hits), (1, 1))
+        self.assertEqual([name.rsplit('.', 1)[1] for name in os.listdir(self.cache.directory)], ['feather'])
+        pd.testing.assert_frame_equal(first, second)
+        self.assertIsInstance(second['Type'].dtype, pd.CategoricalDtype)
+        self.assertEqual(second['Sent Amount'].dtype, 'float64')
+        self.assertTrue(pd.api.types.is_datetime64_any_dtype(second['Date']))
+
+    def test_eviction_and_clear(self):
+        """Au-delà de max_bytes les entrées les moins récemment lues sont supprimées ; clear vide le cache"""
+        self.cache.read(self.csv_path, self.parse)
+        count, size = self.cache.size()
+        self.assertEqual(count, 1)
+        other = os.path.join(self.temp_dir, 'other.csv')
+        shutil.copy(self.csv_path, other)
+        self.cache.max_bytes = size
+        self.cache.read(other, self.parse)
+        self.assertEqual(self.cache.size()[0], 1)
+        self.cache.read(other, self.parse)
+        self.assertEqual(self.parses, 2)
+        self.assertEqual(self.cache.clear(), (1, size))
+        self.assertEqual(self.cache.size(), (0, 0))
+
+
+class TestUIChannel(unittest.TestCase):
+    def test_messages_are_batched_and_capped(self):
+        """Une rafale de messages donne une seule insertion, le log garde les dernières lignes"""
+        widget = FakeText()
+        shown = []
+        channel = UIChannel(None, widget, lambda p, c: shown.append((p, c)), max_log_lines=100)
+        for i in range(1000):
+            channel.log(f"ligne {i}")
+            channel.progress(i + 1, 1000)
+        channel.count("Appels API", 3)
+        channel.drain()
+        self.assertEqual(widget.inserts, 1)
+        self.assertEqual(widget.lines[-1], "ligne 999")
+        self.assertEqual(len(widget.lines), 100)
+        # Seule la dernière progression est affichée, avec les compteurs cumulés
+        self.assertEqual(shown, [((1000, 1000), {"Appels API": 3})])
+        for i in range(150):
+            channel.log(f"suite {i}")
+        channel.drain()
+        self.assertEqual(len(widget.lines), 100)
+        self.assertEqual(widget.lines[0], "suite 50")
+
+    def test_progress_is_rate_limited(self):
+        """La progression n'est pas réaffichée avant l'intervalle minimal"""
+        shown = []
+        channel = UIChannel(None, FakeText(), lambda p, c: shown.append(p), progress_hz=1)
+        channel.progress(1, 10)
+        channel.drain()
+        channel.progress(2, 10)
+        channel.drain()
+        self.assertEqual(shown, [(1, 10)])
+        channel.drain(force_progress=True)
+        self.assertEqual(shown, [(1, 10), (2, 10)])
+
+class TestConcurrentFetcher(unittest.TestCase):
+    def test_token_bucket_waits_when_empty(self):
+        """Au-delà de la rafale autorisée, le seau impose une attente proportionnelle au débit"""
+        bucket = TokenBucket(600, capacity=2)  # 10 requêtes/s
+        self.assertEqual(bucket.reserve(), 0.0)
+        self.assertEqual(bucket.reserve(), 0.0)
+        self.assertAlmostEqual(bucket.reserve(), 0.1, places=2)
+
+    def test_requests_run_concurrently(self):
+        """Plusieurs fenêtres sont récupérées en parallèle et chaque appel débite le limiteur"""
+        windows = [KlineWindow('BTCEUR', i * 60_000, 1, (i * 60_000,)) for i in range(8)]
+        in_flight = {'now': 0, 'max': 0}
+        lock = threading.Lock()
+
+        def fetch(window):
+            with lock:
+                in_flight['now'] += 1
+                in_flight['max'] = max(in_flight['max'], in_flight['now'])
+            time.sleep(0.05)
+            with lock:
+                in_flight['now'] -= 1
+            return window.start_ms != 0
+
+        progress = []
+        bucket = TokenBucket(60000, capacity=8)
+        stats = fetch_windows_concurrently(windows, fetch, bucket, concurrency=4,
+                                           progress_callback=lambda c, t: progress.append((c, t)))
+        self.assertEqual(stats['calls'], 8)
+        self.assertEqual([w.start_ms for w in stats['failed']], [0])
+        self.assertEqual(in_flight['max'], 4)
+        self.assertEqual(progress[-1], (8, 8))
+
+class TestBinancePriceClient(unittest.TestCase):
+    def setUp(self):
+        self.server = MockBinanceServer()
+        self.client = BinancePriceClient(base_url=self.server.url, max_retries=2, backoff_factor=0.01)
+
+    def tearDown(self):
+        self.client.close()
+        self.server.close()
+
+    def test_retries_server_errors(self):
+        """Les erreurs 5xx sont réessayées puis la réponse valide est renvoyée"""
+        self.server.script = [(500, {}, {}), (503, {}, {})]
+        candles = self.client.klines('BTCEUR', 60_000, limit=1)
+        self.assertEqual(candles[0][0], 60_000)
+        self.assertEqual(len(self.server.requests), 3)
+
+    def test_transient_and_missing_pairs_are_distinguished(self):
+        """Une paire inconnue lève PairNotFoundError, une panne persistante TransientPriceError"""
+        self.server.unknown_symbols.add('FOOEUR')
+        with self.assertRaises(PairNotFoundError):
+            self.client.klines('FOOEUR', 60_000)
+        self.server.script = [(502, {}, {})] * 3
+        with self.assertRaises(TransientPriceError):
+            self.client.klines('BTCEUR', 60_000)
+
+    def test_transient_failure_is_not_cached(self):
+        """Un échec temporaire n'est pas mémorisé : la minute sera réinterrogée"""
+        temp_dir = tempfile.mkdtemp()
+        store = PriceStore(os.path.join(temp_dir, 'prices.sqlite'))
+        try:
+            self.server.script = [(500, {}, {})] * 3
+            self.assertIsNone(update_csv.get_binance_price('BTCEUR', 60_000, store, self.client))
+            self.assertEqual(store.lookup('BTCEUR', 60_000), (False, None))
+            self.assertEqual(update_csv.get_binance_price('BTCEUR', 60_000, store, self.client), 1.0)
+        finally:
+            store.close()
+            shutil.rmtree(temp_dir)
+
+    def test_connections_are_reused(self):
+        """Les requêtes successives passent par la même connexion keep-alive"""
+        for minute in range(5):
+            self.client.klines('BTCEUR', minute * 60_000, limit=1)
+        self.assertEqual(len(self.server.client_ports), 1)
+
+class TestAdaptiveRateLimiter(unittest.TestCase):
+    def setUp(self):
+        self.server = MockBinanceServer()
+        self.limiter = AdaptiveRateLimiter(500)
+        self.client = BinancePriceClient(base_url=self.server.url, backoff_factor=0.01, rate_limiter=self.limiter)
+
+    def tearDown(self):
+        self.client.close()
+        self.server.close()
+
+    def test_rate_follows_used_weight(self):
+        """Le débit monte quand le poids consommé est faible et chute à l'approche de la limite"""
+        self.server.headers = {'X-MBX-USED-WEIGHT-1M': '10'}
+        self.client.klines('BTCEUR', 0, limit=1)
+        self.assertGreater(self.limiter.effective_rate, 500)
+        self.server.headers = {'X-MBX-USED-WEIGHT-1M': '5990'}
+        self.client.klines('BTCEUR', 0, limit=1)
+        self.assertEqual(self.limiter.effective_rate, self.limiter.min_rate)
+
+    def test_backs_off_on_429(self):
+        """Un 429 suspend les requêtes pendant Retry-After puis la requête est rejouée à débit réduit"""
+        self.server.script = [(429, {'code': -1003}, {'Retry-After': '0.3'})]
+        start = time.monotonic()
+        candles = self.client.klines('BTCEUR', 0, limit=1)
+        self.assertGreaterEqual(time.monotonic() - start, 0.3)
+        self.assertEqual(candles[0][0], 0)
+        self.assertEqual(self.limiter.rate_per_minute, 250)
+
+    def test_run_limiter_leaves_shared_client_untouched(self):
+        """Le limiteur d'une exécution reçoit les réponses sans remplacer celui du client partagé"""
+        run_limiter = AdaptiveRateLimiter(500)
+        self.server.headers = {'X-MBX-USED-WEIGHT-1M': '5990'}
+        RateLimitedClient(self.client, run_limiter).klines('BTCEUR', 0, limit=1)
+        self.assertIs(self.client.rate_limiter, self.limiter)
+        self.assertEqual(run_limiter.effective_rate, run_limiter.min_rate)
+        self.assertEqual(self.limiter.effective_rate, 500)
+
+class TestPriceArchive(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.store = PriceStore(os.path.join(self.temp_dir, 'prices.sqlite'))
+        self.start = int(pd.Timestamp('2023-01-02 10:00', tz='Europe/Paris').timestamp() * 1000)
+        lines = [f"{self.start + n * 60_000},1,{20 + n},{18 + n},{19 + n},5,0,0,0,0,0,0" for n in range(3)]
+        with zipfile.ZipFile(os.path.join(self.temp_dir, 'BTCEUR-1m-2023-01.zip'), 'w') as zf:
+            zf.writestr('BTCEUR-1m-2023-01.csv', "\n".join(lines) + "\n")
+        # Archive récente : en-tête et timestamps en microsecondes
+        with open(os.path.join(self.temp_dir, 'ETHEUR-1m-2025-01.csv'), 'w') as f:
+            f.write("open_time,open,high,low,close,volume,close_time,qav,trades,tbb,tbq,ignore\n")
+            f.write(f"{self.start * 1000},1,2,0.5,1.5,5,0,0,0,0,0,0\n")
+
+    def tearDown(self):
+        self.store.close()
+        shutil.rmtree(self.temp_dir)
+
+    def test_import_zip_and_csv(self):
+        """Les archives ZIP et CSV sont importées, timestamps en microsecondes compris"""
+        result = import_kline_archives(self.temp_dir, self.store)
+        self.assertEqual(result, {'files': 2, 'rows': 4})
+        self.assertEqual(self.store.lookup('BTCEUR', self.start + 60_000), (True, 20.0))
+        self.assertEqual(self.store.lookup('ETHEUR', self.start), (True, 1.5))
+
+    def test_offline_enrichment_uses_local_prices_only(self):
+        """En mode hors ligne, l'enrichissement n'utilise que le cache local"""
+        import_kline_archives(self.temp_dir, self.store)
+        path = os.path.join(self.temp_dir, 'tx.csv')
+        pd.DataFrame({
+            'Date': ['2023-01-02 10:01:30', '2023-01-02 12:00:00'],
+            'Sent Currency': ['EUR', 'EUR'],
+            'Sent Amount': [100.0, 100.0],
+            'Received Currency': ['BTC', 'BTC'],
+            'Received Amount': [2.0, 1.0],
+        }).to_csv(path, index=False)
+        client = BinancePriceClient(base_url='http://127.0.0.1:9', max_retries=0)
+        df = update_csv.enrich_csv_with_eur_prices(path, 500, lambda c, t: None, lambda m: None,
+                                                   store=self.store, client=client, offline=True)
+        self.assertEqual(client.request_count, 0)
+        self.assertEqual(df.loc[0, 'Received Price EUR'], 20.0)
+        self.assertTrue(pd.isna(df.loc[1, 'Received Price EUR']))
+
+class TestEnrichmentCheckpoint(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.temp_dir, 'tx.csv')
+        self.dates = pd.date_range('2023-01-02 10:00', periods=300, freq='min')
+        pd.DataFrame({
+            'Date': self.dates.strftime('%Y-%m-%d %H:%M:%S'),
+            'Sent Currency': ['EUR'] * 300,
+            'Sent Amount': [10.0] * 300,
+            'Received Currency': ['BTC'] * 300,
+            'Received Amount': [2.0] * 300,
+        }).to_csv(self.path, index=False)
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def enrich(self, store):
+        server = MockBinanceServer()
+        client = BinancePriceClient(base_url=server.url)
+        try:
+            df = update_csv.enrich_csv_with_eur_prices(self.path, 60000, lambda c, t: None, lambda m: None,
+                                                       store=store, client=client)
+        finally:
+            client.close()
+            server.close()
+            store.close()
+        return df, server.klines_requests()
+
+    def test_restart_continues_from_first_unresolved_row(self):
+        """Une relance repart du fichier partiel et du journal, sans refaire les lignes déjà résolues"""
+        self.enrich(PriceStore(os.path.join(self.temp_dir, 'first.sqlite')))
+        output = os.path.join(self.temp_dir, 'tx_enriched.csv')
+        journal = os.path.join(self.temp_dir, 'tx_enriched.journal')
+        self.assertFalse(os.path.exists(journal))
+        # Simule un arrêt brutal : prix absents à partir de la ligne 150, la ligne 150 seulement journalisée
+        partial = pd.read_csv(output)
+        partial.loc[150:, ['Received Price EUR', 'Received Value EUR']] = None
+        partial.to_csv(output, index=False)
+        with open(journal, 'w') as f:
+            f.write(json.dumps({'row': 150, 'leg': 'Received', 'price': 42.0}) + '\n{"row": 151, "le')
+
+        df, requests = self.enrich(PriceStore(os.path.join(self.temp_dir, 'second.sqlite')))
+        self.assertEqual(len(requests), 1)
+        first_ts = int(self.dates[151].tz_localize('Europe/Paris').timestamp() * 1000)
+        self.assertEqual(int(requests[0]['startTime']), first_ts)
+        self.assertEqual(df.loc[150, 'Received Value EUR'], 84.0)
+        self.assertTrue(df['Received Price EUR'].notna().all())
+        self.assertFalse(os.path.exists(journal))
+
+    def test_incremental_enrichment_fetches_only_new_rows(self):
+        """Avec un fichier de base, seules les lignes nouvelles sont interrogées"""
+        self.enrich(PriceStore(os.path.join(self.temp_dir, 'first.sqlite')))
+        base = os.path.join(self.temp_dir, 'previous_enriched.csv')
+        os.replace(os.path.join(self.temp_dir, 'tx_enriched.csv'), base)
+        # Nouvel export : les mêmes lignes plus 10 transactions un jour plus tard
+        new_dates = pd.date_range('2023-01-03 10:00', periods=10, freq='min')
+        previous = pd.read_csv(self.path)
+        pd.concat([previous, pd.DataFrame({
+            'Date': new_dates.strftime('%Y-%m-%d %H:%M:%S'),
+            'Sent Currency': ['EUR'] * 10,
+            'Sent Amount': [10.0] * 10,
+            'Received Currency': ['BTC'] * 10,
+            'Received Amount': [2.0] * 10,
+        })]).to_csv(self.path, index=False)
+
+        server = MockBinanceServer()
+        client = BinancePriceClient(base_url=server.url)
+        store = PriceStore(os.path.join(self.temp_dir, 'second.sqlite'))
+        try:
+            df = update_csv.enrich_csv_with_eur_prices(self.path, 60000, lambda c, t: None, lambda m: None,
+                                                       store=store, client=client, base_path=base)
+        finally:
+            client.close()
+            server.close()
+            store.close()
+        self.assertEqual(len(server.klines_requests()), 1)
+        self.assertEqual(int(server.klines_requests()[0]['limit']), 10)
+        self.assertTrue(df['Received Price EUR'].notna().all())
+
+class TestCommandLine(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        # Cache de chargement dans le répertoire temporaire
+        self._cache_dir = os.environ.get('CRYPTO_VIEWER_CACHE_DIR')
+        os.environ['CRYPTO_VIEWER_CACHE_DIR'] = self.temp_dir
+        for year in (2023, 2024):
+            pd.DataFrame({
+                'Date': [f'{year}-01-01 10:00:00', f'{year}-01-02 10:00:00'],
+                'Type': ['Buy', 'Receive'],
+                'Label': ['Trade', 'Reward'],
+                'Sent Currency': ['EUR', ''],
+                'Received Currency': ['BTC', 'ETH'],
+                'Sent Amount': [1000.0, 0.0],
+                'Received Amount': [0.05, 1.0],
+                'Transaction ID': [f'A{year}', 'B'],
+            }).to_csv(os.path.join(self.temp_dir, f'tx_{year}.csv'), index=False)
+        self.pattern = os.path.join(self.temp_dir, 'tx_*.csv')
+
+    def tearDown(self):
+        if self._cache_dir is None:
+            os.environ.pop('CRYPTO_VIEWER_CACHE_DIR', None)
+        else:
+            os.environ['CRYPTO_VIEWER_CACHE_DIR'] = self._cache_dir
+        shutil.rmtree(self.temp_dir)
+
+    def run_cli(self, *argv):
+        out = io.StringIO()
+        with redirect_stdout(out):
+            code = cli.main(list(argv))
+        return code, out.getvalue()
+
+    def test_cli_does_not_import_tkinter(self):
+        """La ligne de commande fonctionne sans affichage : ni tkinter ni matplotlib ne sont chargés"""
+        code = ("import sys, cli; "
+                "sys.exit(any(m.split('.')[0] in ('tkinter', '_tkinter', 'matplotlib') for m in sys.modules))")
+        result = subprocess.run([sys.executable, '-c', code], cwd=os.path.dirname(os.path.abspath(cli.__file__)))
+        self.assertEqual(result.returncode, 0)
+
+    def test_reports_over_glob(self):
+        """Les rapports portent sur tous les fichiers du motif, lus en parallèle"""
+        code, out = self.run_cli('eur-totals', self.pattern, '--rewards', '-j', '2')
+        self.assertEqual(code, 0)
+        self.assertIn("EUR spent on Buy orders: 2000.00 EUR", out)
+        self.assertIn("=== 2024 ===", out)
+        self.assertIn("ETH: 2.00000000", out)
+        # Seconde exécution depuis le cache de chargement, puis vidage
+        self.assertEqual(self.run_cli('eur-totals', self.pattern, '-j', '1')[1].count("=== 2024 ==="), 1)
+        code, out = self.run_cli('clear-cache')
+        self.assertEqual(code, 0)
+        self.assertIn("2 fichier(s) supprimé(s)", out)
+
+    def test_validate_and_selection_csv(self):
+        """validate échoue sur un doublon d'ID ; export écrit la sélection demandée"""
+        code, out = self.run_cli('validate', self.pattern, '-j', '1')
+        self.assertEqual(code, 1)
+        self.assertIn("Nombre de transactions en double : 2", out)
+        self.assertEqual(self.run_cli('validate', self.pattern, '--stream', '--max-memory', '1M'), (code, out))
+        output = os.path.join(self.temp_dir, 'rewards.csv')
+        code, _ = self.run_cli('export', 'rewards', self.pattern, '-o', output)
+        self.assertEqual(code, 0)
+        self.assertEqual(len(pd.read_csv(output)), 2)
+        self.assertEqual(self.run_cli('income', os.path.join(self.temp_dir, 'absent_*.csv'))[0], 2)
+
+    def test_enrich_files_in_worker_processes(self):
+        """Chaque fichier est enrichi dans un processus, depuis le cache local en mode hors ligne"""
+        store_path = os.path.join(self.temp_dir, 'prices.sqlite')
+        store = PriceStore(store_path)
+        for year in (2023, 2024):
+            ts = int(pd.Timestamp(f'{year}-01-01 10:00', tz='Europe/Paris').timestamp() * 1000)
+            store.put('BTCEUR', ts, 20000.0)
+        store.close()
+        code, out = self.run_cli('enrich', self.pattern, '--offline', '--store', store_path, '-j', '2')
+        self.assertEqual(code, 0)
+        for year in (2023, 2024):
+            df = pd.read_csv(os.path.join(self.temp_dir, f'tx_{year}_enriched.csv'))
+            self.assertEqual(df.loc[0, 'Received Value EUR'], 1000.0)
+
+    def test_correct_reports_written_file(self):
+        """correct annonce le fichier réellement écrit, quelle que soit la casse de l'extension"""
+        path = os.path.join(self.temp_dir, 'tx.CSV')
+        shutil.copy(os.path.join(self.temp_dir, 'tx_2023.csv'), path)
+        store_path = os.path.join(self.temp_dir, 'prices.sqlite')
+        code, out = self.run_cli('correct', path, '--offline', '--store', store_path, '-j', '1')
+        self.assertEqual(code, 0)
+        output = os.path.join(self.temp_dir, 'tx_corrected.CSV')
+        self.assertTrue(os.path.exists(output))
+        self.assertIn(f"{path} -> {output} (2 lignes)", out)
+
 if __name__ == '__main__':
-    unittest.main() 
\ No newline at end of file
+    unittest.main() 
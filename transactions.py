@@ -1,5 +1,9 @@
 import os
 import pandas as pd
+from normalize import normalize_dates
+from loader import BackgroundLoader
+from schema import apply_schema, concat_frames
+from streaming import aggregate_frames, eur_totals_aggregator, rewards_aggregator
 import tkinter as tk
 from tkinter import filedialog, messagebox, ttk
 from pathlib import Path
@@ -7,12 +11,16 @@ from transactions_graph import show_graph_window
 from tax_calculator import show_tax_calculator
 from update_csv import CSVTableViewer
 from update_csv import App as UpdateCSVApp
+from update_csv import MultiFileApp as MultiFileUpdateApp
+from reports import (read_export_csv, detect_decimal, eur_transactions,
+                     sorted_reward_transactions, uniqueness_report)
 
 class TransactionsViewer:
     def __init__(self, parent_frame, summary_widget):
         self.parent_frame = parent_frame
         self.summary = summary_widget  # Référence à la zone de résumé globale
         self.dataframes = {}
+        self.filepaths = {}  # nom affiché -> chemin complet
         self.check_vars = {}
         self.current_directory = str(Path.home())
         
@@ -76,6 +84,12 @@ class TransactionsViewer:
         btn_deselect_all = ttk.Button(list_buttons, text="✗ Tout désélectionner", command=self.deselect_all_files)
         btn_deselect_all.pack(side=tk.LEFT, padx=2)
 
+        # Progression du chargement en arrière-plan
+        self.load_status = ttk.Label(list_buttons, text="")
+        self.load_status.pack(side=tk.LEFT, padx=5)
+        self.loader = BackgroundLoader(self.parent_frame, read_export_csv, self._add_file, self._files_loaded,
+                                       self._show_load_progress)
+
         # Liste des fichiers avec cases à cocher
         self.files_listbox = tk.Listbox(left_frame, selectmode=tk.EXTENDED)
         self.files_listbox.pack(fill=tk.BOTH, expand=True, side=tk.LEFT)
@@ -138,9 +152,7 @@ class TransactionsViewer:
         return lb
 
     def detect_decimal(self, filepath):
-        with open(filepath, 'r') as f:
-            sample = f.read(2048)
-            return ',' if sample.count(',') > sample.count('.') else '.'
+        return detect_decimal(filepath)
 
     def load_csv(self):
         """Ouvre la boîte de dialogue pour charger des fichiers CSV"""
@@ -149,26 +161,42 @@ class TransactionsViewer:
             filetypes=[("CSV files", "*.csv")],
             title="Sélectionner des fichiers CSV"
         )
-        for path in filepaths:
-            self.load_single_file(path)
+        self.load_files(filepaths)
+
+    def load_files(self, filepaths):
+        """Charge des fichiers CSV en parallèle, hors du thread Tk ; filtres et résumé mis à jour une fois le lot chargé"""
+        self.loader.load([path for path in filepaths if os.path.basename(path) not in self.dataframes])
 
     def load_single_file(self, filepath):
         """Charge un seul fichier CSV"""
-        if filepath not in self.dataframes:
+        if os.path.basename(filepath) not in self.dataframes:
             try:
-                decimal = self.detect_decimal(filepath)
-                df = pd.read_csv(filepath, decimal=decimal)
-                name = os.path.basename(filepath)
-                self.dataframes[name] = df
-                
-                # Ajouter le fichier à la liste avec une case à cocher
-                self.create_checkbox(self.files_listbox, name)
-                
+                self._add_file(filepath, read_export_csv(filepath))
                 self.populate_filters()
                 self.update_summary()
             except Exception as e:
                 messagebox.showerror("Erreur de chargement", str(e))
 
+    def _add_file(self, filepath, df):
+        # Dates déjà converties au chargement (format fixe), réutilisées par les calculs
+        name = os.path.basename(filepath)
+        self.dataframes[name] = df
+        self.filepaths[name] = filepath
+        # Ajouter le fichier à la liste avec une case à cocher
+        self.create_checkbox(self.files_listbox, name)
+
+    def _show_load_progress(self, done, total, filepath):
+        self.load_status.config(text=f"Chargement {done}/{total} : {os.path.basename(filepath)}")
+
+    def _files_loaded(self, errors):
+        # Filtres et résumé recalculés une seule fois pour tout le lot
+        self.load_status.config(text="")
+        self.populate_filters()
+        self.update_summary()
+        if errors:
+            messagebox.showerror("Erreur de chargement",
+                                 "\n".join(f"{os.path.basename(path)} : {e}" for path, e in errors))
+
     def create_checkbox(self, parent, filename):
         """Crée une case à cocher pour un fichier"""
         frame = ttk.Frame(parent)
@@ -259,61 +287,9 @@ class TransactionsViewer:
             return
 
         try:
-            # Concaténer uniquement les dataframes actifs
-            all_data = pd.concat(self.get_active_dataframes().values(), ignore_index=True)
-            
-            # Convertir les colonnes numériques en float
-            numeric_columns = ['Sent Amount', 'Received Amount']
-            for col in numeric_columns:
-                if col in all_data.columns:
-                    all_data[col] = pd.to_numeric(all_data[col], errors='coerce').fillna(0)
-            
-            # Convertir la colonne Date en datetime si elle existe
-            if 'Date' in all_data.columns:
-                all_data['Date'] = pd.to_datetime(all_data['Date'], errors='coerce')
-                all_data['Year'] = all_data['Date'].dt.year
-
-            # Calculer les totaux globaux
-            buy_mask = (all_data['Type'] == 'Buy') & (all_data['Sent Currency'] == 'EUR')
-            deposit_mask = (all_data['Type'] == 'Deposit') & (all_data['Received Currency'] == 'EUR')
-            sell_mask = (all_data['Type'] == 'Sell') & (all_data['Received Currency'] == 'EUR')
-
-            all_EUR_sent = all_data.loc[buy_mask, 'Sent Amount'].sum()
-            all_EUR_deposit = all_data.loc[deposit_mask, 'Received Amount'].sum()
-            all_EUR_Sell = all_data.loc[sell_mask, 'Received Amount'].sum()
-            all_EUR_to_binance = all_EUR_sent + all_EUR_deposit
-            all_EUR_to_binance_REAL = all_EUR_sent + all_EUR_deposit - all_EUR_Sell
-
-            # Afficher les résultats dans le résumé
-            self.append_to_summary("\n=== EUR Spending Analysis ===\n\n")
-            self.append_to_summary(f"EUR spent on Buy orders: {all_EUR_sent:.2f} EUR\n")
-            self.append_to_summary(f"EUR received from Deposits: {all_EUR_deposit:.2f} EUR\n")
-            self.append_to_summary(f"EUR received from Sells: {all_EUR_Sell:.2f} EUR\n")
-            self.append_to_summary(f"Total EUR to Binance: {all_EUR_to_binance:.2f} EUR\n")
-            self.append_to_summary(f"Real EUR to Binance (minus sells): {all_EUR_to_binance_REAL:.2f} EUR\n\n")
-
-            # Calculer et afficher les totaux par année
-            if 'Year' in all_data.columns:
-                self.append_to_summary("=== Yearly Analysis ===\n\n")
-                for year in sorted(all_data['Year'].unique()):
-                    if pd.isna(year):
-                        continue
-                    
-                    year_data = all_data[all_data['Year'] == year]
-                    
-                    year_buy = year_data.loc[buy_mask, 'Sent Amount'].sum()
-                    year_deposit = year_data.loc[deposit_mask, 'Received Amount'].sum()
-                    year_sell = year_data.loc[sell_mask, 'Received Amount'].sum()
-                    year_total = year_buy + year_deposit
-                    year_real = year_buy + year_deposit - year_sell
-
-                    self.append_to_summary(f"=== {int(year)} ===\n")
-                    self.append_to_summary(f"EUR spent on Buy orders: {year_buy:.2f} EUR\n")
-                    self.append_to_summary(f"EUR received from Deposits: {year_deposit:.2f} EUR\n")
-                    self.append_to_summary(f"EUR received from Sells: {year_sell:.2f} EUR\n")
-                    self.append_to_summary(f"Total EUR to Binance: {year_total:.2f} EUR\n")
-                    self.append_to_summary(f"Real EUR to Binance (minus sells): {year_real:.2f} EUR\n\n")
-
+            # Fichiers actifs agrégés un par un, sans les concaténer
+            text = aggregate_frames(self.get_active_dataframes().values(), [eur_totals_aggregator()])[0]
+            self.append_to_summary(text)
         except Exception as e:
             messagebox.showerror("Erreur de calcul", f"Une erreur est survenue lors du calcul des totaux EUR :\n{str(e)}")
 
@@ -324,46 +300,9 @@ class TransactionsViewer:
             return
 
         try:
-            # Concaténer uniquement les dataframes actifs
-            all_data = pd.concat(self.get_active_dataframes().values(), ignore_index=True)
-            
-            # Convertir les colonnes numériques en float
-            if 'Received Amount' in all_data.columns:
-                all_data['Received Amount'] = pd.to_numeric(all_data['Received Amount'], errors='coerce').fillna(0)
-            
-            # Convertir la colonne Date en datetime si elle existe
-            if 'Date' in all_data.columns:
-                all_data['Date'] = pd.to_datetime(all_data['Date'], errors='coerce')
-                all_data['Year'] = all_data['Date'].dt.year
-
-            # Filtrer les transactions de type "Receive" avec label "Reward"
-            reward_mask = (all_data['Type'] == 'Receive') & (all_data['Label'] == 'Reward')
-            reward_data = all_data[reward_mask]
-
-            if reward_data.empty:
-                self.append_to_summary("Aucune récompense trouvée dans les données.")
-                return
-
-            # Calculer les totaux globaux par devise
-            self.append_to_summary("\n=== Récompenses Globales ===\n")
-            rewards_by_currency = reward_data.groupby('Received Currency')['Received Amount'].sum()
-            for currency, amount in rewards_by_currency.items():
-                self.append_to_summary(f"{currency}: {amount:.8f}\n")
-
-            # Calculer les totaux par année
-            if 'Year' in reward_data.columns:
-                self.append_to_summary("\n=== Récompenses par Année ===\n")
-                for year in sorted(reward_data['Year'].unique()):
-                    if pd.isna(year):
-                        continue
-                    
-                    year_data = reward_data[reward_data['Year'] == year]
-                    year_rewards = year_data.groupby('Received Currency')['Received Amount'].sum()
-                    
-                    self.append_to_summary(f"\n=== {int(year)} ===\n")
-                    for currency, amount in year_rewards.items():
-                        self.append_to_summary(f"{currency}: {amount:.8f}\n")
-
+            # Fichiers actifs agrégés un par un, sans les concaténer
+            text = aggregate_frames(self.get_active_dataframes().values(), [rewards_aggregator()])[0]
+            self.append_to_summary(text)
         except Exception as e:
             messagebox.showerror("Erreur de calcul", f"Une erreur est survenue lors du calcul des récompenses :\n{str(e)}")
 
@@ -379,14 +318,14 @@ class TransactionsViewer:
             for filename in self.dataframes:
                 enriched_path = filename.replace('.csv', '_enriched.csv')
                 if os.path.exists(enriched_path):
-                    df = pd.read_csv(enriched_path)
+                    df = apply_schema(normalize_dates(pd.read_csv(enriched_path), epoch=False))
                 else:
                     df = self.dataframes[filename]
                 dfs.append(df)
             if not dfs:
                 messagebox.showwarning("Calcul des taxes", "Aucun fichier enrichi trouvé ou sélectionné.")
                 return
-            all_data = pd.concat(dfs, ignore_index=True)
+            all_data = concat_frames(dfs)
             show_tax_calculator(self.parent_frame, all_data)
         except Exception as e:
             messagebox.showerror("Erreur de calcul", f"Une erreur est survenue lors du calcul des taxes :\n{str(e)}")
@@ -404,26 +343,15 @@ class TransactionsViewer:
 
         try:
             # Concaténer uniquement les dataframes actifs
-            all_data = pd.concat(self.get_active_dataframes().values(), ignore_index=True)
+            all_data = concat_frames(self.get_active_dataframes().values())
             
-            # Filtrer les transactions EUR
-            eur_mask = (
-                ((all_data['Type'] == 'Buy') & (all_data['Sent Currency'] == 'EUR')) |
-                ((all_data['Type'] == 'Deposit') & (all_data['Received Currency'] == 'EUR')) |
-                ((all_data['Type'] == 'Sell') & (all_data['Received Currency'] == 'EUR'))
-            )
-            eur_transactions = all_data[eur_mask]
+            # Transactions EUR triées par date
+            eur_data = eur_transactions(all_data)
 
-            if eur_transactions.empty:
+            if eur_data.empty:
                 messagebox.showwarning("Export EUR", "Aucune transaction EUR trouvée.")
                 return
 
-            # Convertir la colonne Date en datetime si elle existe
-            if 'Date' in eur_transactions.columns:
-                eur_transactions['Date'] = pd.to_datetime(eur_transactions['Date'], errors='coerce')
-                # Trier par date
-                eur_transactions = eur_transactions.sort_values('Date')
-
             # Demander où sauvegarder le fichier
             filepath = filedialog.asksaveasfilename(
                 defaultextension=".csv",
@@ -435,7 +363,7 @@ class TransactionsViewer:
                 return
 
             # Exporter vers CSV
-            eur_transactions.to_csv(filepath, index=False)
+            eur_data.to_csv(filepath, index=False)
             messagebox.showinfo("Export EUR", f"Transactions EUR exportées avec succès vers :\n{filepath}")
             
         except Exception as e:
@@ -449,22 +377,15 @@ class TransactionsViewer:
 
         try:
             # Concaténer uniquement les dataframes actifs
-            all_data = pd.concat(self.get_active_dataframes().values(), ignore_index=True)
+            all_data = concat_frames(self.get_active_dataframes().values())
             
-            # Filtrer les transactions de type "Receive" avec label "Reward"
-            reward_mask = (all_data['Type'] == 'Receive') & (all_data['Label'] == 'Reward')
-            reward_transactions = all_data[reward_mask]
+            # Transactions de type "Receive" avec label "Reward", triées par date
+            reward_data = sorted_reward_transactions(all_data)
 
-            if reward_transactions.empty:
+            if reward_data.empty:
                 messagebox.showwarning("Export Reward", "Aucune transaction de récompense trouvée.")
                 return
 
-            # Convertir la colonne Date en datetime si elle existe
-            if 'Date' in reward_transactions.columns:
-                reward_transactions['Date'] = pd.to_datetime(reward_transactions['Date'], errors='coerce')
-                # Trier par date
-                reward_transactions = reward_transactions.sort_values('Date')
-
             # Demander où sauvegarder le fichier
             filepath = filedialog.asksaveasfilename(
                 defaultextension=".csv",
@@ -476,7 +397,7 @@ class TransactionsViewer:
                 return
 
             # Exporter vers CSV
-            reward_transactions.to_csv(filepath, index=False)
+            reward_data.to_csv(filepath, index=False)
             messagebox.showinfo("Export Reward", f"Transactions de récompenses exportées avec succès vers :\n{filepath}")
             
         except Exception as e:
@@ -511,7 +432,7 @@ class TransactionsViewer:
                 return
 
             # Concaténer tous les dataframes
-            final_df = pd.concat(filtered_dfs, ignore_index=True)
+            final_df = concat_frames(filtered_dfs)
             
             # Exporter vers CSV
             final_df.to_csv(filepath, index=False)
@@ -539,7 +460,7 @@ class TransactionsViewer:
                 return
 
             # Concaténer tous les dataframes
-            final_df = pd.concat(filtered_dfs, ignore_index=True)
+            final_df = concat_frames(filtered_dfs)
             
             # Créer une nouvelle fenêtre pour afficher les résultats
             result_window = tk.Toplevel(self.parent_frame)
@@ -559,52 +480,9 @@ class TransactionsViewer:
             scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
             result_text.configure(yscrollcommand=scrollbar.set)
             
-            # Vérifier les colonnes d'ID possibles
-            id_columns = ['Transaction ID', 'ID', 'TransactionID', 'txid', 'TxID']
-            found_id_column = None
-            
-            for col in id_columns:
-                if col in final_df.columns:
-                    found_id_column = col
-                    break
-            
-            if not found_id_column:
-                result_text.insert(tk.END, "❌ Aucune colonne d'ID trouvée dans les données.\n")
-                result_text.insert(tk.END, "Colonnes disponibles :\n")
-                for col in final_df.columns:
-                    result_text.insert(tk.END, f"- {col}\n")
-                return
-            
-            # Vérifier les doublons
-            duplicates = final_df[final_df.duplicated(subset=[found_id_column], keep=False)]
-            
-            if duplicates.empty:
-                result_text.insert(tk.END, "✅ Toutes les transactions sont uniques !\n\n")
-                result_text.insert(tk.END, f"Nombre total de transactions : {len(final_df)}\n")
-            else:
-                result_text.insert(tk.END, "⚠️ Des transactions en double ont été trouvées !\n\n")
-                result_text.insert(tk.END, f"Nombre total de transactions : {len(final_df)}\n")
-                result_text.insert(tk.END, f"Nombre de transactions en double : {len(duplicates)}\n\n")
-                
-                # Grouper les doublons par ID
-                grouped_duplicates = duplicates.groupby(found_id_column)
-                
-                result_text.insert(tk.END, "Détail des doublons :\n")
-                result_text.insert(tk.END, "-" * 50 + "\n")
-                
-                for tx_id, group in grouped_duplicates:
-                    result_text.insert(tk.END, f"\nID : {tx_id}\n")
-                    result_text.insert(tk.END, f"Nombre d'occurrences : {len(group)}\n")
-                    result_text.insert(tk.END, "Détails :\n")
-                    
-                    # Afficher les détails pertinents pour chaque doublon
-                    for idx, row in group.iterrows():
-                        result_text.insert(tk.END, f"\n  - Date : {row.get('Date', 'N/A')}\n")
-                        result_text.insert(tk.END, f"    Type : {row.get('Type', 'N/A')}\n")
-                        result_text.insert(tk.END, f"    Montant : {row.get('Amount', 'N/A')}\n")
-                        result_text.insert(tk.END, f"    Devise : {row.get('Currency', 'N/A')}\n")
-                    
-                    result_text.insert(tk.END, "-" * 50 + "\n")
+            # Vérifier les doublons sur la première colonne d'ID trouvée
+            text, _ = uniqueness_report(final_df)
+            result_text.insert(tk.END, text)
             
             # Rendre la zone de texte en lecture seule
             result_text.configure(state='disabled')
@@ -637,7 +515,7 @@ class TransactionsViewer:
     def show_graph_window_action(self):
         """Ouvre la fenêtre de graphes dynamiques pour les données chargées"""
         try:
-            all_data = pd.concat(self.get_active_dataframes().values(), ignore_index=True)
+            all_data = concat_frames(self.get_active_dataframes().values())
             show_graph_window(self.parent_frame, all_data)
         except Exception as e:
             messagebox.showerror("Erreur graphique", f"Impossible d'afficher le graphe :\n{str(e)}")
@@ -671,22 +549,6 @@ class TransactionsViewer:
             UpdateCSVApp(win)
             # (optionnel: pré-remplir le chemin du fichier dans l'App)
         else:
-            # Plusieurs fichiers chargés, proposer de merger
-            answer = messagebox.askyesno(
-                "Fusionner les fichiers ?",
-                "Plusieurs fichiers sont chargés. Voulez-vous les fusionner en un seul fichier temporaire pour l'update ? (Oui = fusionner et update, Non = annuler)"
-            )
-            if answer:
-                # Fusionner tous les fichiers chargés
-                try:
-                    merged_df = pd.concat([self.dataframes[f] for f in loaded_files], ignore_index=True)
-                    merged_path = os.path.join(self.current_directory, "merged_transactions.csv")
-                    merged_df.to_csv(merged_path, index=False)
-                    win = tk.Toplevel(self.parent_frame)
-                    win.title("Update CSV : merged_transactions.csv")
-                    UpdateCSVApp(win)
-                    # (optionnel: pré-remplir le chemin du fichier dans l'App)
-                except Exception as e:
-                    messagebox.showerror("Erreur de fusion", f"Impossible de fusionner les fichiers : {e}")
-            else:
-                messagebox.showinfo("Annulé", "Aucune mise à jour n'a été lancée.") 
\ No newline at end of file
+            # Plusieurs fichiers chargés : enrichissement groupé, chaque prix n'est demandé qu'une fois
+            win = tk.Toplevel(self.parent_frame)
+            MultiFileUpdateApp(win, [self.filepaths.get(name, name) for name in loaded_files])
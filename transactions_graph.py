@@ -3,6 +3,7 @@ from tkinter import ttk
 import matplotlib.pyplot as plt
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
 import pandas as pd
+from normalize import as_datetime
 import numpy as np
 
 class TransactionsGraphWindow(tk.Toplevel):
@@ -20,7 +21,7 @@ class TransactionsGraphWindow(tk.Toplevel):
         # Nettoyage et préparation des données
         if 'Date' not in self.df.columns:
             raise ValueError("Le fichier doit contenir la colonne 'Date'")
-        self.df['Date'] = pd.to_datetime(self.df['Date'], errors='coerce')
+        self.df['Date'] = as_datetime(self.df['Date'])
         self.df = self.df.dropna(subset=['Date'])
         self.df = self.df.sort_values('Date')
         # On va construire un DataFrame avec toutes les opérations par currency
@@ -0,0 +1,110 @@
+import queue
+import threading
+import time
+
+# Vidage de la file toutes les 100 ms, progression affichée 4 fois par seconde au plus
+DEFAULT_TICK_MS = 100
+DEFAULT_PROGRESS_HZ = 4
+# Nombre de lignes conservées dans le widget de log (les plus anciennes sont supprimées)
+DEFAULT_MAX_LOG_LINES = 2000
+
+
+class UIChannel:
+    """
+    Canal entre un thread de traitement et l'interface Tk. Les threads ne touchent jamais aux widgets :
+    les messages passent par une file vidée à intervalle fixe sur le thread Tk, insérés en un seul bloc
+    dans un log limité à max_log_lines lignes ; seule la dernière progression est affichée, quelques fois
+    par seconde ; les compteurs (appels API, échecs...) sont cumulés et affichés avec la progression.
+    """
+    def __init__(self, root, log_widget, progress_fn, tick_ms=DEFAULT_TICK_MS,
+                 progress_hz=DEFAULT_PROGRESS_HZ, max_log_lines=DEFAULT_MAX_LOG_LINES):
+        self.root = root
+        self.log_widget = log_widget
+        self.progress_fn = progress_fn
+        self.tick_ms = tick_ms
+        self.progress_interval = 1.0 / progress_hz
+        self.max_log_lines = max_log_lines
+        self._messages = queue.Queue()
+        self._lock = threading.Lock()
+        self._progress = None
+        self._progress_dirty = False
+        self._last_progress = 0.0
+        self._counters = {}
+        self._running = False
+
+    # --- côté threads de traitement (n'importe quel thread) ---
+
+    def log(self, message):
+        self._messages.put(message)
+
+    def progress(self, current, total):
+        with self._lock:
+            self._progress = (current, total)
+            self._progress_dirty = True
+
+    def count(self, name, n=1):
+        """Ajoute n au compteur `name` (affiché avec la progression plutôt qu'une ligne de log)"""
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + n
+            self._progress_dirty = True
+
+    def touch(self):
+        """Redemande l'affichage de la progression (pour un état tenu par l'appelant, ex : progression par fichier)"""
+        with self._lock:
+            self._progress_dirty = True
+
+    def reset_counters(self):
+        with self._lock:
+            self._counters = {}
+            self._progress_dirty = True
+
+    def counters(self):
+        with self._lock:
+            return dict(self._counters)
+
+    # --- côté thread Tk ---
+
+    def start(self):
+        if not self._running:
+            self._running = True
+            self.root.after(self.tick_ms, self._tick)
+
+    def stop(self):
+        self._running = False
+
+    def _tick(self):
+        if not self._running:
+            return
+        self.drain()
+        self.root.after(self.tick_ms, self._tick)
+
+    def drain(self, force_progress=False):
+        """Insère tous les messages en attente en une fois, puis la dernière progression si elle est due"""
+        lines = []
+        while True:
+            try:
+                lines.append(self._messages.get_nowait())
+            except queue.Empty:
+                break
+        if lines:
+            # Seules les dernières lignes d'une rafale seraient visibles de toute façon
+            lines = lines[-self.max_log_lines:]
+            self.log_widget.insert('end', '\n'.join(lines) + '\n')
+            line_count = int(self.log_widget.index('end-1c').split('.')[0]) - 1
+            if line_count > self.max_log_lines:
+                self.log_widget.delete('1.0', f'{line_count - self.max_log_lines + 1}.0')
+            self.log_widget.see('end')
+        now = time.monotonic()
+        with self._lock:
+            due = self._progress_dirty and (force_progress or now - self._last_progress >= self.progress_interval)
+            if due:
+                self._progress_dirty = False
+                self._last_progress = now
+                progress, counters = self._progress, dict(self._counters)
+        if due:
+            self.progress_fn(progress, counters)
+
+
+def format_counters(counters):
+    """Compteurs sous la forme 'Appels API : 12 | Échecs : 1'"""
+    return ' | '.join(f"{name} : {value}" for name, value in counters.items())
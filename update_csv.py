@@ -1,271 +1,63 @@
 import pandas as pd
-import requests
-import time
-from datetime import datetime
-import pytz
+import numpy as np
 import os
 import tkinter as tk
 from tkinter import filedialog, messagebox
 from tkinter.ttk import Progressbar, Treeview, Scrollbar
 import matplotlib.pyplot as plt
 import threading
+from price_store import get_default_store
+from price_planner import DEFAULT_RESOLUTION, format_estimate, parse_resolution_policy
+from rate_limiter import AdaptiveRateLimiter
+from async_fetcher import DEFAULT_CONCURRENCY
+from price_archive import import_kline_archives
+from ui_channel import UIChannel, format_counters
+from table_index import PrefixIndex, inverse_order, sort_order
+# Traitements sans interface (aussi utilisés par la ligne de commande, cli.py)
+from enrichment import (get_binance_price, fetch_binance_price, get_price_eur_with_intermediate,
+                        enrich_csv_with_eur_prices, correct_csv_prices, enrich_many,
+                        plan_enrichment)
+
+# Aide du champ de résolution des prix (voir price_planner.parse_resolution_policy)
+RESOLUTION_HELP = "Résolution des prix : 1m, 1h, 1d, ou par Type/Label (ex : Reward=1d, default=1m) :"
 
-BINANCE_API_URL = "https://api.binance.com/api/v3/klines"
-
-# Nouvelle fonction pour obtenir le prix EUR d'une crypto à une date donnée
-def get_binance_price(symbol, timestamp_ms):
-    params = {
-        "symbol": symbol,
-        "interval": "1m",
-        "startTime": timestamp_ms,
-        "limit": 1
-    }
-    try:
-        r = requests.get(BINANCE_API_URL, params=params, timeout=10)
-        data = r.json()[0]
-        return float(data[4])  # close price
-    except Exception as e:
-        return None
-
-# Nouvelle fonction utilitaire pour obtenir un prix EUR via intermédiaire USDT
-def get_price_eur_with_intermediate(symbol, timestamp_ms, log_callback=None):
-    # symbol: ex 'FET'
-    # 1. Essayer symbol/EUR direct
-    pair_direct = symbol + 'EUR'
-    price_direct = get_binance_price(pair_direct, timestamp_ms)
-    if price_direct:
-        if log_callback:
-            log_callback(f"{symbol}/EUR direct: {price_direct}")
-        return price_direct
-    # 2. Essayer symbol/USDT et EUR/USDT
-    pair_usdt = symbol + 'USDT'
-    price_usdt = get_binance_price(pair_usdt, timestamp_ms)
-    price_eur_usdt = get_binance_price('EURUSDT', timestamp_ms)
-    if price_usdt and price_eur_usdt:
-        # 1 USDT = 1/price_eur_usdt EUR
-        price_eur = price_usdt * (1/price_eur_usdt)
-        if log_callback:
-            log_callback(f"{symbol}/USDT: {price_usdt}, EUR/USDT: {price_eur_usdt}, {symbol}/EUR via USDT: {price_eur}")
-        return price_eur
-    # 3. Essayer symbol/BTC puis BTC/EUR (optionnel, non implémenté ici)
-    if log_callback:
-        log_callback(f"Impossible de trouver le prix EUR pour {symbol} à {timestamp_ms}")
-    return None
-
-def enrich_csv_with_eur_prices(filepath, requests_per_minute, progress_callback, log_callback, table_viewer=None, stop_flag=None, refresh_every=200, fast_mode=False):
-    base, ext = os.path.splitext(filepath)
-    output_path = f"{base}_enriched{ext}"
-    delay = 60 / max(1, requests_per_minute)
-
-    df = pd.read_csv(filepath)
-    # Trier chronologiquement si la colonne 'Date' existe
-    if 'Date' in df.columns:
-        df['Date'] = pd.to_datetime(df['Date'], errors='coerce')
-        df = df.sort_values('Date').reset_index(drop=True)
-    total_rows = len(df)
-    # Ajouter les colonnes vides si elles n'existent pas
-    for col in ["Sent Price EUR", "Sent Value EUR", "Received Price EUR", "Received Value EUR"]:
-        if col not in df.columns:
-            df[col] = None
-    # Sauvegarder le fichier enrichi initial (avec colonnes vides)
-    df.to_csv(output_path, index=False)
-
-    # Cache des prix (clé = (symbol, minute))
-    price_cache = {}
-
-    for i, row in df.iterrows():
-        if stop_flag and stop_flag['stop']:
-            log_callback(f"Traitement interrompu à la ligne {i+1}.")
-            break
-        date_str = row.get('Date') or row.get('datetime')
-        if not date_str:
-            continue
-        try:
-            dt = pd.to_datetime(date_str)
-        except:
-            dt = datetime.fromisoformat(date_str)
-        dt = pytz.timezone('Europe/Paris').localize(dt) if dt.tzinfo is None else dt
-        timestamp_ms = int(dt.timestamp() * 1000)
-        minute_key = dt.strftime('%Y-%m-%d %H:%M')
-
-        # Sent
-        sent_cur = str(row.get('Sent Currency', '')).upper()
-        sent_amt = row.get('Sent Amount')
-        sent_price_eur = None
-        sent_value_eur = None
-        sent_api_msg = ''
-        if sent_cur and sent_cur != 'EUR' and pd.notna(sent_amt):
-            symbol = sent_cur + 'EUR'
-            cache_key = (symbol, minute_key)
-            if cache_key in price_cache:
-                sent_price_eur = price_cache[cache_key]
-                sent_api_msg = f"CACHE {symbol}={sent_price_eur}"
-            else:
-                sent_price_eur = get_binance_price(symbol, timestamp_ms)
-                price_cache[cache_key] = sent_price_eur
-                if sent_price_eur:
-                    sent_api_msg = f"OK {symbol}={sent_price_eur}"
-                else:
-                    sent_api_msg = f"ERREUR {symbol} (prix non trouvé)"
-            if sent_price_eur:
-                sent_value_eur = float(sent_amt) * sent_price_eur
-        elif sent_cur == 'EUR' and pd.notna(sent_amt):
-            sent_price_eur = 1.0
-            sent_value_eur = float(sent_amt)
-            sent_api_msg = "EUR=1.0"
-
-        # Received
-        recv_cur = str(row.get('Received Currency', '')).upper()
-        recv_amt = row.get('Received Amount')
-        recv_price_eur = None
-        recv_value_eur = None
-        recv_api_msg = ''
-        if recv_cur and recv_cur != 'EUR' and pd.notna(recv_amt):
-            symbol = recv_cur + 'EUR'
-            cache_key = (symbol, minute_key)
-            if cache_key in price_cache:
-                recv_price_eur = price_cache[cache_key]
-                recv_api_msg = f"CACHE {symbol}={recv_price_eur}"
-            else:
-                recv_price_eur = get_binance_price(symbol, timestamp_ms)
-                price_cache[cache_key] = recv_price_eur
-                if recv_price_eur:
-                    recv_api_msg = f"OK {symbol}={recv_price_eur}"
-                else:
-                    recv_api_msg = f"ERREUR {symbol} (prix non trouvé)"
-            if recv_price_eur:
-                recv_value_eur = float(recv_amt) * recv_price_eur
-        elif recv_cur == 'EUR' and pd.notna(recv_amt):
-            recv_price_eur = 1.0
-            recv_value_eur = float(recv_amt)
-            recv_api_msg = "EUR=1.0"
-
-        # Mettre à jour la ligne dans le DataFrame
-        df.at[i, 'Sent Price EUR'] = sent_price_eur
-        df.at[i, 'Sent Value EUR'] = sent_value_eur
-        df.at[i, 'Received Price EUR'] = recv_price_eur
-        df.at[i, 'Received Value EUR'] = recv_value_eur
-
-        # Log détaillé
-        log_callback(f"Ligne {i+1}/{total_rows} : {date_str} | Sent {sent_cur} {sent_api_msg} | Received {recv_cur} {recv_api_msg}")
-        progress_callback(i + 1, total_rows)
-
-        # Mise à jour visuelle de la ligne courante dans le tableau (Treeview)
-        if table_viewer is not None and hasattr(table_viewer, 'tree'):
-            try:
-                # Met à jour la ligne courante dans le Treeview
-                iid = table_viewer.tree.get_children()[i]
-                values = [df.at[i, col] for col in df.columns]
-                table_viewer.tree.item(iid, values=values)
-                table_viewer.tree.selection_remove(table_viewer.tree.selection())
-                table_viewer.tree.see(iid)
-                table_viewer.tree.selection_set(iid)
-            except Exception:
-                pass
-        time.sleep(delay)
-
-    # Sauvegarde finale
-    df.to_csv(output_path, index=False)
-    if table_viewer is not None and hasattr(table_viewer, 'tree'):
-        try:
-            table_viewer.df = pd.read_csv(output_path)
-            table_viewer.tree.delete(*table_viewer.tree.get_children())
-            for _, row2 in table_viewer.df.iterrows():
-                values = [row2[col] for col in table_viewer.df.columns]
-                table_viewer.tree.insert("", "end", values=values)
-        except Exception:
-            pass
-    if stop_flag and stop_flag['stop']:
-        log_callback(f"Traitement interrompu. Le fichier enrichi est à jour jusqu'à la ligne {i+1}.")
-    else:
-        log_callback(f"Fichier enrichi sauvegardé : {output_path}")
-    return df
-
-# Fonction de correction CSV
-def correct_csv_prices(filepath, log_callback, table_viewer=None):
-    base, ext = os.path.splitext(filepath)
-    output_path = f"{base}_corrected{ext}"
-    df = pd.read_csv(filepath)
-    # Trier chronologiquement si la colonne 'Date' existe
-    if 'Date' in df.columns:
-        df['Date'] = pd.to_datetime(df['Date'], errors='coerce')
-        df = df.sort_values('Date').reset_index(drop=True)
-    total_rows = len(df)
-    for i, row in df.iterrows():
-        date_str = row.get('Date') or row.get('datetime')
-        if not date_str:
-            continue
-        try:
-            dt = pd.to_datetime(date_str)
-        except:
-            dt = datetime.fromisoformat(date_str)
-        dt = pytz.timezone('Europe/Paris').localize(dt) if dt.tzinfo is None else dt
-        timestamp_ms = int(dt.timestamp() * 1000)
-        # Sent
-        sent_cur = str(row.get('Sent Currency', '')).upper()
-        sent_amt = row.get('Sent Amount')
-        sent_price_eur = row.get('Sent Price EUR')
-        if (sent_cur and sent_cur != 'EUR' and pd.notna(sent_amt)) and (pd.isna(sent_price_eur) or sent_price_eur == '' or sent_price_eur == 0):
-            price = get_price_eur_with_intermediate(sent_cur, timestamp_ms, log_callback)
-            if price:
-                df.at[i, 'Sent Price EUR'] = price
-                df.at[i, 'Sent Value EUR'] = float(sent_amt) * price
-        # Received
-        recv_cur = str(row.get('Received Currency', '')).upper()
-        recv_amt = row.get('Received Amount')
-        recv_price_eur = row.get('Received Price EUR')
-        if (recv_cur and recv_cur != 'EUR' and pd.notna(recv_amt)) and (pd.isna(recv_price_eur) or recv_price_eur == '' or recv_price_eur == 0):
-            price = get_price_eur_with_intermediate(recv_cur, timestamp_ms, log_callback)
-            if price:
-                df.at[i, 'Received Price EUR'] = price
-                df.at[i, 'Received Value EUR'] = float(recv_amt) * price
-        # Mise à jour visuelle de la ligne courante dans le tableau (Treeview)
-        if table_viewer is not None and hasattr(table_viewer, 'tree'):
-            try:
-                iid = table_viewer.tree.get_children()[i]
-                values = [df.at[i, col] for col in df.columns]
-                table_viewer.tree.item(iid, values=values)
-                table_viewer.tree.selection_remove(table_viewer.tree.selection())
-                table_viewer.tree.see(iid)
-                table_viewer.tree.selection_set(iid)
-            except Exception:
-                pass
-        log_callback(f"Correction {i+1}/{total_rows} : {date_str} | Sent {sent_cur} | Received {recv_cur}")
-    # Sauvegarde finale
-    df.to_csv(output_path, index=False)
-    if table_viewer is not None and hasattr(table_viewer, 'tree'):
-        try:
-            table_viewer.df = pd.read_csv(output_path)
-            table_viewer.tree.delete(*table_viewer.tree.get_children())
-            for _, row2 in table_viewer.df.iterrows():
-                values = [row2[col] for col in table_viewer.df.columns]
-                table_viewer.tree.insert("", "end", values=values)
-        except Exception:
-            pass
-    log_callback(f"Fichier corrigé sauvegardé : {output_path}")
-    return df
-
-# Interface graphique adaptée
 class App:
     def __init__(self, root):
         self.root = root
         root.title("Enrichir CSV avec prix EUR Binance")
 
         self.filepath = None
+        self.base_path = None
         self.csv_viewer = None
         self.stop_flag = {'stop': False}
         self.thread = None
+        self.rate_limiter = None
         self.fast_mode = tk.BooleanVar(value=False)
-        self.refresh_every = 200
+        self.offline = tk.BooleanVar(value=False)
 
         tk.Button(root, text="Sélectionner un fichier CSV", command=self.select_file).pack(pady=10)
-        self.rate_label = tk.Label(root, text="Requêtes/minute (par défaut 500) :")
+        tk.Button(root, text="Fichier enrichi précédent (optionnel)...", command=self.select_base_file).pack(pady=2)
+        self.rate_label = tk.Label(root, text="Requêtes/minute au départ (ajusté automatiquement, par défaut 500) :")
         self.rate_label.pack()
         self.rate_entry = tk.Entry(root)
         self.rate_entry.insert(0, "500")
         self.rate_entry.pack(pady=5)
+        tk.Label(root, text=f"Requêtes simultanées (par défaut {DEFAULT_CONCURRENCY}) :").pack()
+        self.concurrency_entry = tk.Entry(root)
+        self.concurrency_entry.insert(0, str(DEFAULT_CONCURRENCY))
+        self.concurrency_entry.pack(pady=5)
+        tk.Label(root, text=RESOLUTION_HELP).pack()
+        self.resolution_entry = tk.Entry(root, width=40)
+        self.resolution_entry.insert(0, DEFAULT_RESOLUTION)
+        self.resolution_entry.pack(pady=5)
         self.chk_fast = tk.Checkbutton(root, text="Mode rapide (pas de rafraîchissement visuel)", variable=self.fast_mode)
         self.chk_fast.pack(pady=2)
+        self.chk_offline = tk.Checkbutton(root, text="Mode hors ligne (prix du cache local uniquement)", variable=self.offline)
+        self.chk_offline.pack(pady=2)
+        self.btn_import = tk.Button(root, text="Importer des archives klines Binance...", command=self.run_archive_import)
+        self.btn_import.pack(pady=5)
+        self.btn_plan = tk.Button(root, text="Estimer les appels API et la durée", command=self.run_plan)
+        self.btn_plan.pack(pady=5)
         self.btn_start = tk.Button(root, text="Démarrer l'enrichissement", command=self.run_processing)
         self.btn_start.pack(pady=10)
         self.btn_correct = tk.Button(root, text="Correct CSV", command=self.run_correction)
@@ -277,24 +69,44 @@ class App:
         self.progress_label.pack()
         self.log = tk.Text(root, height=15, width=80)
         self.log.pack(pady=10)
+        # Les threads de traitement passent par ce canal, vidé sur le thread Tk à intervalle fixe
+        self.channel = UIChannel(root, self.log, self._show_progress)
+        self.channel.start()
+        self.highlight_progress = False
 
     def select_file(self):
         self.filepath = filedialog.askopenfilename(filetypes=[("CSV files", "*.csv")])
         if self.filepath:
             self.log_message(f"Fichier sélectionné : {self.filepath}")
+            self.run_plan()
+
+    def select_base_file(self):
+        # Export précédent déjà enrichi : ses prix sont repris, seules les nouvelles lignes sont interrogées
+        self.base_path = filedialog.askopenfilename(filetypes=[("CSV files", "*.csv")]) or None
+        if self.base_path:
+            self.log_message(f"Fichier de base : {self.base_path}")
 
     def update_progress(self, current, total):
-        def _update():
-            self.progress['maximum'] = total
-            self.progress['value'] = current
-            self.progress_label.config(text=f"Traitement ligne {current}/{total}...")
-        self.root.after(0, _update)
+        self.channel.progress(current, total)
 
     def log_message(self, message):
-        def _log():
-            self.log.insert(tk.END, message + "\n")
-            self.log.see(tk.END)
-        self.root.after(0, _log)
+        self.channel.log(message)
+
+    def _show_progress(self, progress, counters):
+        # Appelé par le canal sur le thread Tk, quelques fois par seconde au plus
+        text = ""
+        if progress is not None:
+            current, total = progress
+            self.progress['maximum'] = total
+            self.progress['value'] = current
+            text = f"Traitement ligne {current}/{total}..."
+            if self.highlight_progress and self.csv_viewer is not None and self.csv_viewer.winfo_exists():
+                self.csv_viewer.highlight(current - 1)
+        if self.rate_limiter is not None:
+            text += f" ({self.rate_limiter.effective_rate:.0f} req/min)"
+        if counters:
+            text += "\n" + format_counters(counters)
+        self.progress_label.config(text=text)
 
     def show_csv_viewer(self):
         if not self.filepath:
@@ -305,36 +117,54 @@ class App:
             return
         self.csv_viewer = CSVTableViewer(self.root, self.filepath, title="Aperçu CSV")
 
+    def run_plan(self):
+        # Plan à blanc (aucun appel réseau) : prix distincts, cache, appels et durée estimés avant de démarrer
+        if not self.filepath:
+            messagebox.showwarning("Fichier manquant", "Veuillez sélectionner un fichier CSV.")
+            return
+        try:
+            rate = int(self.rate_entry.get())
+            resolution = parse_resolution_policy(self.resolution_entry.get())
+        except ValueError as e:
+            messagebox.showwarning("Entrée invalide", str(e))
+            return
+        filepath = self.filepath
+        self.btn_plan.config(state=tk.DISABLED)
+        def thread_target():
+            try:
+                self.channel.log(format_estimate(plan_enrichment(filepath, rate, resolution=resolution)))
+            except Exception as e:
+                self.channel.log(f"Estimation impossible : {e}")
+            self.root.after(0, lambda: self.btn_plan.config(state=tk.NORMAL))
+        threading.Thread(target=thread_target, daemon=True).start()
+
     def run_processing(self):
         if not self.filepath:
             messagebox.showwarning("Fichier manquant", "Veuillez sélectionner un fichier CSV.")
             return
         try:
             rate = int(self.rate_entry.get())
+            concurrency = int(self.concurrency_entry.get())
         except ValueError:
-            messagebox.showwarning("Entrée invalide", "Le taux de requêtes doit être un entier.")
+            messagebox.showwarning("Entrée invalide", "Le taux et le nombre de requêtes simultanées doivent être des entiers.")
+            return
+        try:
+            resolution = parse_resolution_policy(self.resolution_entry.get())
+        except ValueError as e:
+            messagebox.showwarning("Résolution invalide", str(e))
             return
         self.log_message("Début de l'enrichissement...")
         self.btn_start.config(state=tk.DISABLED)
         self.stop_flag['stop'] = False
+        self.rate_limiter = AdaptiveRateLimiter(rate)
         if self.csv_viewer is None or not self.csv_viewer.winfo_exists():
             self.csv_viewer = CSVTableViewer(self.root, self.filepath, title="Aperçu CSV (avant update)")
         fast_mode = self.fast_mode.get()
-        refresh_every = self.refresh_every
-        def progress_callback(current, total):
-            def _progress():
-                self.update_progress(current, total)
-                if not fast_mode and self.csv_viewer is not None and self.csv_viewer.winfo_exists():
-                    try:
-                        self.csv_viewer.tree.selection_remove(self.csv_viewer.tree.selection())
-                        iid = self.csv_viewer.tree.get_children()[current-1]
-                        self.csv_viewer.tree.see(iid)
-                        self.csv_viewer.tree.selection_set(iid)
-                    except Exception:
-                        pass
-            self.root.after(0, _progress)
-        def log_callback(msg):
-            self.log_message(msg)
+        offline = self.offline.get()
+        self.highlight_progress = not fast_mode
+        self.channel.reset_counters()
+        progress_callback = self.channel.progress
+        log_callback = self.channel.log
         def thread_target():
             enrich_csv_with_eur_prices(
                 self.filepath,
@@ -343,19 +173,15 @@ class App:
                 log_callback,
                 table_viewer=self.csv_viewer,
                 stop_flag=self.stop_flag,
-                refresh_every=refresh_every,
-                fast_mode=fast_mode
+                fast_mode=fast_mode,
+                concurrency=concurrency,
+                rate_limiter=self.rate_limiter,
+                offline=offline,
+                base_path=self.base_path,
+                counter_callback=self.channel.count,
+                resolution=resolution
             )
             def _finish():
-                if self.csv_viewer is not None and self.csv_viewer.winfo_exists():
-                    try:
-                        self.csv_viewer.df = pd.read_csv(self.filepath.replace('.csv', '_enriched.csv'))
-                        self.csv_viewer.tree.delete(*self.csv_viewer.tree.get_children())
-                        for _, row in self.csv_viewer.df.iterrows():
-                            values = [row[col] for col in self.csv_viewer.df.columns]
-                            self.csv_viewer.tree.insert("", "end", values=values)
-                    except Exception:
-                        pass
                 self.btn_start.config(state=tk.NORMAL)
             self.root.after(0, _finish)
         self.thread = threading.Thread(target=thread_target, daemon=True)
@@ -367,24 +193,174 @@ class App:
             return
         self.log_message("Début de la correction des prix EUR...")
         self.btn_correct.config(state=tk.DISABLED)
-        def log_callback(msg):
-            self.log_message(msg)
+        offline = self.offline.get()
+        self.channel.reset_counters()
         def thread_target():
             correct_csv_prices(
                 self.filepath.replace('.csv', '_enriched.csv'),
-                log_callback,
-                table_viewer=self.csv_viewer
+                self.channel.log,
+                table_viewer=self.csv_viewer,
+                offline=offline,
+                counter_callback=self.channel.count
             )
             def _finish():
                 self.btn_correct.config(state=tk.NORMAL)
             self.root.after(0, _finish)
         threading.Thread(target=thread_target, daemon=True).start()
 
+    def run_archive_import(self):
+        directory = filedialog.askdirectory(title="Dossier des archives klines (data.binance.vision)")
+        if not directory:
+            return
+        self.log_message(f"Import des archives de {directory}...")
+        self.highlight_progress = False
+        self.btn_import.config(state=tk.DISABLED)
+        def thread_target():
+            try:
+                result = import_kline_archives(directory, get_default_store(), self.update_progress, self.log_message)
+                self.log_message(f"Import terminé : {result['files']} archives, {result['rows']} bougies")
+            except Exception as e:
+                self.log_message(f"Erreur pendant l'import : {e}")
+            self.root.after(0, lambda: self.btn_import.config(state=tk.NORMAL))
+        threading.Thread(target=thread_target, daemon=True).start()
+
+class MultiFileApp:
+    """
+    Enrichissement de plusieurs fichiers en un seul passage (enrich_many) : chaque prix n'est demandé
+    qu'une fois pour tous les fichiers, sous un seul débit autorisé, puis les fichiers enrichis sont
+    écrits en parallèle. Progression par fichier dans le tableau, progression globale dans la barre.
+    """
+    def __init__(self, root, filepaths):
+        self.root = root
+        self.filepaths = list(filepaths)
+        root.title(f"Enrichir {len(self.filepaths)} fichiers CSV avec prix EUR Binance")
+        self.stop_flag = {'stop': False}
+        self.rate_limiter = None
+        self.offline = tk.BooleanVar(value=False)
+        self._files_lock = threading.Lock()
+        self._file_progress = {}
+
+        tk.Label(root, text="Requêtes/minute au départ, pour tous les fichiers (par défaut 500) :").pack()
+        self.rate_entry = tk.Entry(root)
+        self.rate_entry.insert(0, "500")
+        self.rate_entry.pack(pady=5)
+        tk.Label(root, text=f"Requêtes simultanées (par défaut {DEFAULT_CONCURRENCY}) :").pack()
+        self.concurrency_entry = tk.Entry(root)
+        self.concurrency_entry.insert(0, str(DEFAULT_CONCURRENCY))
+        self.concurrency_entry.pack(pady=5)
+        tk.Label(root, text="Processus d'écriture des fichiers :").pack()
+        self.jobs_entry = tk.Entry(root)
+        self.jobs_entry.insert(0, str(min(len(self.filepaths), os.cpu_count() or 1)))
+        self.jobs_entry.pack(pady=5)
+        tk.Label(root, text=RESOLUTION_HELP).pack()
+        self.resolution_entry = tk.Entry(root, width=40)
+        self.resolution_entry.insert(0, DEFAULT_RESOLUTION)
+        self.resolution_entry.pack(pady=5)
+        tk.Checkbutton(root, text="Mode hors ligne (prix du cache local uniquement)", variable=self.offline).pack(pady=2)
+
+        self.files_tree = Treeview(root, columns=("file", "progress"), show="headings", height=min(len(self.filepaths), 10))
+        self.files_tree.heading("file", text="Fichier")
+        self.files_tree.heading("progress", text="Progression")
+        self.files_tree.column("file", width=350)
+        self.files_tree.column("progress", width=150, anchor="center")
+        for path in self.filepaths:
+            self.files_tree.insert("", "end", iid=os.path.basename(path), values=(os.path.basename(path), "en attente"))
+        self.files_tree.pack(pady=5, fill=tk.X)
+
+        buttons = tk.Frame(root)
+        buttons.pack(pady=5)
+        self.btn_start = tk.Button(buttons, text="Démarrer l'enrichissement", command=self.run_processing)
+        self.btn_start.pack(side=tk.LEFT, padx=5)
+        tk.Button(buttons, text="Arrêter", command=lambda: self.stop_flag.update(stop=True)).pack(side=tk.LEFT, padx=5)
+        self.progress = Progressbar(root, orient="horizontal", mode="determinate", length=300)
+        self.progress.pack(pady=10)
+        self.progress_label = tk.Label(root, text="")
+        self.progress_label.pack()
+        self.log = tk.Text(root, height=15, width=80)
+        self.log.pack(pady=10)
+        self.channel = UIChannel(root, self.log, self._show_progress)
+        self.channel.start()
+
+    def _file_progress_callback(self, name, current, total):
+        # Appelé depuis les threads de traitement : progression globale (name None) ou d'un fichier
+        if name is None:
+            self.channel.progress(current, total)
+        else:
+            with self._files_lock:
+                self._file_progress[name] = (current, total)
+            # Le tableau des fichiers est rafraîchi avec la progression globale
+            self.channel.touch()
+
+    def _show_progress(self, progress, counters):
+        text = ""
+        if progress is not None:
+            current, total = progress
+            self.progress['maximum'] = total
+            self.progress['value'] = current
+            text = f"Progression globale {current}/{total}"
+        if self.rate_limiter is not None:
+            text += f" ({self.rate_limiter.effective_rate:.0f} req/min)"
+        if counters:
+            text += "\n" + format_counters(counters)
+        self.progress_label.config(text=text)
+        with self._files_lock:
+            files, self._file_progress = self._file_progress, {}
+        for name, (current, total) in files.items():
+            percent = 100 * current // total if total else 100
+            self.files_tree.set(name, "progress", f"{percent}% ({current}/{total})")
+
+    def run_processing(self):
+        try:
+            rate = int(self.rate_entry.get())
+            concurrency = int(self.concurrency_entry.get())
+            jobs = int(self.jobs_entry.get())
+        except ValueError:
+            messagebox.showwarning("Entrée invalide", "Le taux, le nombre de requêtes simultanées et de processus doivent être des entiers.")
+            return
+        try:
+            resolution = parse_resolution_policy(self.resolution_entry.get())
+        except ValueError as e:
+            messagebox.showwarning("Résolution invalide", str(e))
+            return
+        self.channel.log(f"Début de l'enrichissement de {len(self.filepaths)} fichiers...")
+        self.btn_start.config(state=tk.DISABLED)
+        self.stop_flag['stop'] = False
+        self.rate_limiter = AdaptiveRateLimiter(rate)
+        offline = self.offline.get()
+        self.channel.reset_counters()
+        def thread_target():
+            try:
+                outputs = enrich_many(
+                    self.filepaths,
+                    rate,
+                    self._file_progress_callback,
+                    self.channel.log,
+                    rate_limiter=self.rate_limiter,
+                    concurrency=concurrency,
+                    jobs=jobs,
+                    offline=offline,
+                    counter_callback=self.channel.count,
+                    stop_flag=self.stop_flag,
+                    resolution=resolution
+                )
+                failed = [path for path, output in outputs.items() if output is None]
+                self.channel.log(f"Terminé : {len(outputs) - len(failed)}/{len(outputs)} fichiers enrichis")
+            except Exception as e:
+                self.channel.log(f"Erreur pendant l'enrichissement : {e}")
+            self.root.after(0, lambda: self.btn_start.config(state=tk.NORMAL))
+        threading.Thread(target=thread_target, daemon=True).start()
+
 class CSVTableViewer(tk.Toplevel):
     """
-    Fenêtre d'affichage d'un DataFrame/CSV en lecture seule, scrollable horizontalement et verticalement.
+    Fenêtre d'affichage d'un DataFrame/CSV en lecture seule, à défilement virtuel : seules les lignes
+    visibles existent dans le Treeview, leurs valeurs sont lues dans le DataFrame à chaque défilement.
+    Tri par colonne (clic sur l'en-tête) et recherche par préfixe s'appuient sur des index calculés
+    une fois par colonne. Les threads de traitement ne touchent pas aux widgets : update_rows() et
+    request_reload() déposent les changements, appliqués par lots sur le thread Tk toutes les refresh_ms.
     """
-    def __init__(self, parent, df_or_path, title="Aperçu CSV"):
+    ROW_HEIGHT = 20
+
+    def __init__(self, parent, df_or_path, title="Aperçu CSV", refresh_ms=200):
         super().__init__(parent)
         self.title(title)
         self.geometry("1200x600")
@@ -392,38 +368,254 @@ class CSVTableViewer(tk.Toplevel):
             self.df = pd.read_csv(df_or_path)
         else:
             self.df = df_or_path.copy()
+        self.df = self.df.reset_index(drop=True)
+        self.refresh_ms = refresh_ms
+        self._pending_lock = threading.Lock()
+        self._pending_rows = []
+        self._pending_reload = None
+        self._pending_highlight = None
+        self.top = 0
+        self.slots = 1
+        self.selected = None
+        self._reset_indexes()
         self._setup_table()
+        self.after(self.refresh_ms, self._apply_pending)
+
+    def _reset_indexes(self):
+        # Ordre d'affichage (positions) et son inverse ; index de tri et de recherche par colonne
+        self.order = np.arange(len(self.df), dtype='int64')
+        self.ranks = self.order
+        self.sort_column = None
+        self.sort_ascending = True
+        self._sort_indexes = {}
+        self._prefix_indexes = {}
+        self._last_match = None
 
     def _setup_table(self):
+        # Barre de recherche
+        search = tk.Frame(self)
+        search.pack(fill=tk.X)
+        tk.Label(search, text="Rechercher dans").pack(side=tk.LEFT, padx=5)
+        self.search_column = tk.StringVar(value=self.df.columns[0] if len(self.df.columns) else '')
+        self.search_menu = tk.OptionMenu(search, self.search_column, '')
+        self.search_menu.pack(side=tk.LEFT)
+        self.search_text = tk.StringVar()
+        entry = tk.Entry(search, textvariable=self.search_text, width=30)
+        entry.pack(side=tk.LEFT, padx=5)
+        entry.bind('<KeyRelease>', self._on_search_key)
+        self.status = tk.Label(search, text="")
+        self.status.pack(side=tk.RIGHT, padx=5)
+
         frame = tk.Frame(self)
         frame.pack(fill=tk.BOTH, expand=True)
 
-        # Table
-        self.tree = Treeview(frame, columns=list(self.df.columns), show="headings")
-        for col in self.df.columns:
-            self.tree.heading(col, text=col)
-            self.tree.column(col, width=120, anchor="center")
-
-        # Scrollbars
-        vsb = Scrollbar(frame, orient="vertical", command=self.tree.yview)
+        # Table : le défilement vertical est géré ici, pas par le Treeview
+        self.tree = Treeview(frame, show="headings", selectmode="browse")
+        self.vsb = Scrollbar(frame, orient="vertical", command=self._yview)
         hsb = Scrollbar(frame, orient="horizontal", command=self.tree.xview)
-        self.tree.configure(yscrollcommand=vsb.set, xscrollcommand=hsb.set)
+        self.tree.configure(xscrollcommand=hsb.set)
         self.tree.grid(row=0, column=0, sticky="nsew")
-        vsb.grid(row=0, column=1, sticky="ns")
+        self.vsb.grid(row=0, column=1, sticky="ns")
         hsb.grid(row=1, column=0, sticky="ew")
         frame.grid_rowconfigure(0, weight=1)
         frame.grid_columnconfigure(0, weight=1)
+        self._setup_columns()
 
-        # Remplir la table
-        for _, row in self.df.iterrows():
-            values = [row[col] for col in self.df.columns]
-            self.tree.insert("", "end", values=values)
+        self.tree.bind('<Configure>', self._on_resize)
+        self.tree.bind('<MouseWheel>', lambda e: self.scroll(-3 if e.delta > 0 else 3))
+        self.tree.bind('<Button-4>', lambda e: self.scroll(-3))
+        self.tree.bind('<Button-5>', lambda e: self.scroll(3))
+        self.tree.bind('<<TreeviewSelect>>', self._on_select)
 
-        # Lecture seule : pas d'édition par l'utilisateur
-        def block_edit(event):
+        # Lecture seule : pas d'édition par l'utilisateur, seules les touches de navigation sont gérées
+        keys = {'Up': -1, 'Down': 1, 'Prior': 'page_up', 'Next': 'page_down', 'Home': 'home', 'End': 'end'}
+        def on_key(event):
+            step = keys.get(event.keysym)
+            if step == 'page_up':
+                self.scroll(-self.slots)
+            elif step == 'page_down':
+                self.scroll(self.slots)
+            elif step == 'home':
+                self.scroll_to(0)
+            elif step == 'end':
+                self.scroll_to(len(self.df))
+            elif step is not None:
+                self.scroll(step)
             return "break"
-        self.tree.bind('<Double-1>', block_edit)
-        self.tree.bind('<Key>', block_edit)
+        self.tree.bind('<Double-1>', lambda e: "break")
+        self.tree.bind('<Key>', on_key)
+        self.refresh()
+
+    def _setup_columns(self):
+        columns = list(self.df.columns)
+        self.tree.configure(columns=columns)
+        for col in columns:
+            self.tree.heading(col, text=col, command=lambda c=col: self.sort_by(c))
+            self.tree.column(col, width=120, anchor="center")
+        menu = self.search_menu['menu']
+        menu.delete(0, 'end')
+        for col in columns:
+            menu.add_command(label=col, command=lambda c=col: self.search_column.set(c))
+        if self.search_column.get() not in columns:
+            self.search_column.set(columns[0] if columns else '')
+
+    def _on_resize(self, event):
+        # En-tête compris : nombre de lignes affichables dans la hauteur du widget
+        slots = max(1, event.height // self.ROW_HEIGHT - 1)
+        if slots != self.slots:
+            self.slots = slots
+            self.refresh()
+
+    def _yview(self, *args):
+        if args[0] == 'moveto':
+            self.scroll_to(int(float(args[1]) * len(self.df)))
+        elif args[0] == 'scroll':
+            step = int(args[1]) * (self.slots if args[2] == 'pages' else 1)
+            self.scroll(step)
+
+    def scroll(self, step):
+        self.scroll_to(self.top + step)
+
+    def scroll_to(self, rank):
+        self.top = max(0, min(rank, len(self.df) - self.slots))
+        self.refresh()
+
+    def refresh(self):
+        """Affiche les lignes [top, top + slots) de l'ordre courant"""
+        n = len(self.df)
+        positions = self.order[self.top:self.top + self.slots]
+        window = self.df.iloc[positions]
+        rows = window.astype(object).where(window.notna(), '').values.tolist()
+        existing = self.tree.get_children()
+        for slot, values in enumerate(rows):
+            iid = f"slot{slot}"
+            if slot < len(existing):
+                self.tree.item(iid, values=values)
+            else:
+                self.tree.insert("", "end", iid=iid, values=values)
+        if len(existing) > len(rows):
+            self.tree.delete(*existing[len(rows):])
+        # Sélection conservée sur la ligne (position) et non sur l'emplacement
+        self.tree.selection_set(())
+        if self.selected is not None and n:
+            slot = int(self.ranks[self.selected]) - self.top
+            if 0 <= slot < len(rows):
+                self.tree.selection_set(f"slot{slot}")
+        if n:
+            self.vsb.set(self.top / n, min(1.0, (self.top + self.slots) / n))
+            self.status.config(text=f"Lignes {self.top + 1}-{self.top + len(rows)} / {n}")
+        else:
+            self.vsb.set(0, 1)
+            self.status.config(text="Aucune ligne")
+
+    def _on_select(self, event):
+        selection = self.tree.selection()
+        if selection:
+            rank = self.top + int(selection[0][len("slot"):])
+            if rank < len(self.order):
+                self.selected = int(self.order[rank])
+
+    def show_position(self, position):
+        """Sélectionne la ligne `position` du DataFrame et la rend visible"""
+        rank = int(self.ranks[position])
+        self.selected = position
+        if not self.top <= rank < self.top + self.slots:
+            self.top = max(0, min(rank - self.slots // 2, len(self.df) - self.slots))
+        self.refresh()
+
+    def sort_by(self, column):
+        """Trie l'affichage selon `column` ; un second clic inverse l'ordre"""
+        ascending = not (self.sort_column == column and self.sort_ascending)
+        key = (column, ascending)
+        if key not in self._sort_indexes:
+            self._sort_indexes[key] = sort_order(self.df[column], ascending)
+        order = self._sort_indexes[key]
+        self.order = order
+        self.ranks = inverse_order(order)
+        self.sort_column, self.sort_ascending = column, ascending
+        for col in self.df.columns:
+            arrow = (' ▲' if ascending else ' ▼') if col == column else ''
+            self.tree.heading(col, text=f"{col}{arrow}")
+        self.top = 0
+        self.refresh()
+
+    def _on_search_key(self, event):
+        # Entrée : correspondance suivante ; autre touche : première correspondance du préfixe
+        self.find(self.search_text.get(), next_match=event.keysym == 'Return')
+
+    def find(self, text, next_match=False):
+        column = self.search_column.get()
+        if not text or column not in self.df.columns:
+            return None
+        if column not in self._prefix_indexes:
+            self._prefix_indexes[column] = PrefixIndex(self.df[column])
+        after = self._last_match if next_match else None
+        match = self._prefix_indexes[column].find(text, after=after)
+        if match is None:
+            self._last_match = None
+            self.status.config(text=f"« {text} » introuvable dans {column}")
+            return None
+        self._last_match, position = match
+        self.show_position(position)
+        return position
+
+    def update_rows(self, start, df_rows):
+        """Dépose les nouvelles valeurs des lignes [start, start + len(df_rows)) (appelable depuis un thread)"""
+        rows = df_rows.reindex(columns=self.df.columns).copy()
+        with self._pending_lock:
+            self._pending_rows.append((start, rows))
+
+    def request_reload(self, df):
+        """Remplace toutes les données au prochain rafraîchissement (appelable depuis un thread)"""
+        df = df.reset_index(drop=True).copy()
+        with self._pending_lock:
+            self._pending_reload = df
+            self._pending_rows = []
+
+    def highlight(self, position):
+        """Sélectionne et rend visible la ligne `position` au prochain rafraîchissement"""
+        with self._pending_lock:
+            self._pending_highlight = position
+
+    def _apply_pending(self):
+        if not self.winfo_exists():
+            return
+        with self._pending_lock:
+            chunks, self._pending_rows = self._pending_rows, []
+            reload, self._pending_reload = self._pending_reload, None
+            highlight, self._pending_highlight = self._pending_highlight, None
+        changed = False
+        if reload is not None:
+            columns_changed = list(reload.columns) != list(self.df.columns)
+            self.df = reload
+            if len(reload) != len(self.order) or columns_changed:
+                self.selected = None
+                self._reset_indexes()
+                self._setup_columns()
+            else:
+                # Mêmes lignes : l'ordre d'affichage est conservé, les index de colonnes sont à refaire
+                self._sort_indexes, self._prefix_indexes = {}, {}
+            changed = True
+        for start, rows in chunks:
+            end = min(start + len(rows), len(self.df))
+            if start >= end:
+                continue
+            for j, col in enumerate(self.df.columns):
+                values = rows[col].to_numpy()[:end - start]
+                try:
+                    self.df.iloc[start:end, j] = values
+                except (TypeError, ValueError):
+                    # Type de colonne incompatible (ex : texte dans une colonne numérique)
+                    self.df[col] = self.df[col].astype(object)
+                    self.df.iloc[start:end, j] = values
+            self._sort_indexes, self._prefix_indexes = {}, {}
+            changed = True
+        if highlight is not None and 0 <= highlight < len(self.df):
+            self.show_position(highlight)
+        elif changed:
+            self.top = max(0, min(self.top, len(self.df) - self.slots))
+            self.refresh()
+        self.after(self.refresh_ms, self._apply_pending)
 
 if __name__ == "__main__":
     root = tk.Tk()